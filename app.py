@@ -5,6 +5,7 @@ from flask_cors import CORS
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -17,9 +18,123 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://root:@localhost/real_estate_crm')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Database engine: connections are pinged on checkout and recycled before MySQL's
+# wait_timeout closes them; the pool is per worker process (pool size + overflow
+# per gunicorn worker must stay under the server's max_connections)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() in ['true', '1', 'yes'],
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280))
+}
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30))
+    })
+
+# Optional read replica: SELECTs inside database.use_replica() go here (e.g. the website feed)
+if os.getenv('DATABASE_REPLICA_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {'replica': os.getenv('DATABASE_REPLICA_URL')}
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
+# Public website feed cache (seconds)
+app.config['FEED_CACHE_TTL'] = int(os.getenv('FEED_CACHE_TTL', 30))
+app.config['FEED_CACHE_MAX_AGE'] = int(os.getenv('FEED_CACHE_MAX_AGE', 60))
+app.config['FEED_CACHE_MAX_ENTRIES'] = int(os.getenv('FEED_CACHE_MAX_ENTRIES', 256))  # feed pages kept in memory
+
+# Search backend: 'like' or 'fulltext' (run `flask search reindex` first)
+app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'like')
+
+# Daily rollups: days before the last watermark recomputed by `flask rollups compact`
+app.config['ROLLUP_LOOKBACK_DAYS'] = int(os.getenv('ROLLUP_LOOKBACK_DAYS', 3))
+
+# Activity log: queue and batch-insert off the request path (spooled to disk until written)
+app.config['ACTIVITY_LOG_ASYNC'] = os.getenv('ACTIVITY_LOG_ASYNC', 'True').lower() in ['true', '1', 'yes']
+app.config['ACTIVITY_LOG_BATCH_SIZE'] = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+app.config['ACTIVITY_LOG_FLUSH_INTERVAL'] = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0))
+app.config['ACTIVITY_LOG_SPOOL_DIR'] = os.getenv('ACTIVITY_LOG_SPOOL_DIR')  # defaults to instance/activity_spool
+
+# Notification fan-out: admin/manager recipient cache (seconds) and delivery through the job queue
+app.config['NOTIFY_RECIPIENT_TTL'] = int(os.getenv('NOTIFY_RECIPIENT_TTL', 300))
+app.config['NOTIFY_ASYNC'] = os.getenv('NOTIFY_ASYNC', 'False').lower() in ['true', '1', 'yes']
+
+# Periodic jobs: run in-process (first request starts them) or via `flask scheduler run`
+app.config['SCHEDULER_ENABLED'] = os.getenv('SCHEDULER_ENABLED', 'False').lower() in ['true', '1', 'yes']
+app.config['FOLLOW_UP_CHECK_INTERVAL'] = int(os.getenv('FOLLOW_UP_CHECK_INTERVAL', 3600))
+app.config['FOLLOW_UP_BATCH_SIZE'] = int(os.getenv('FOLLOW_UP_BATCH_SIZE', 1000))
+app.config['ROLLUP_COMPACT_INTERVAL'] = int(os.getenv('ROLLUP_COMPACT_INTERVAL', 3600))
+
+# Authenticated user snapshot cache (seconds; 0 disables). Writes in this process invalidate it at once
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+
+# Streaming exports: rows fetched per server-side cursor batch
+app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+# Streaming property import: uploads and reject files, and rows inserted/committed per chunk
+app.config['IMPORT_DIR'] = os.getenv('IMPORT_DIR') or os.path.join(app.instance_path, 'imports')
+app.config['IMPORT_CHUNK_SIZE'] = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+
+# Upload storage: 'local' (UPLOAD_LOCAL_DIR, default uploads/images) or 's3' (any
+# S3-compatible endpoint; needs boto3). Local files can be handed to the web server
+# with UPLOAD_SERVE_MODE=x-accel (nginx internal location UPLOAD_ACCEL_PREFIX) or x-sendfile
+app.config['UPLOAD_STORAGE'] = os.getenv('UPLOAD_STORAGE', 'local')
+app.config['UPLOAD_LOCAL_DIR'] = os.getenv('UPLOAD_LOCAL_DIR')
+app.config['UPLOAD_SERVE_MODE'] = os.getenv('UPLOAD_SERVE_MODE')
+app.config['UPLOAD_ACCEL_PREFIX'] = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+# Uploads are named by content hash and never change: browsers and CDNs may cache them this long
+app.config['UPLOAD_CACHE_MAX_AGE'] = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 31536000))
+# Streaming multi-file uploads (POST /api/upload/stream): request body limit,
+# files per request and threads verifying/storing received files
+app.config['UPLOAD_MAX_CONTENT_LENGTH'] = int(os.getenv('UPLOAD_MAX_CONTENT_LENGTH', 640 * 1024 * 1024))
+app.config['UPLOAD_MAX_FILES'] = int(os.getenv('UPLOAD_MAX_FILES', 60))
+app.config['UPLOAD_WORKERS'] = int(os.getenv('UPLOAD_WORKERS', 4))
+app.config['S3_BUCKET'] = os.getenv('S3_BUCKET')
+app.config['S3_PREFIX'] = os.getenv('S3_PREFIX', 'uploads/images/')
+app.config['S3_ENDPOINT_URL'] = os.getenv('S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+app.config['S3_REGION'] = os.getenv('S3_REGION')
+app.config['S3_ACCESS_KEY_ID'] = os.getenv('S3_ACCESS_KEY_ID')
+app.config['S3_SECRET_ACCESS_KEY'] = os.getenv('S3_SECRET_ACCESS_KEY')
+app.config['S3_PUBLIC_URL'] = os.getenv('S3_PUBLIC_URL')  # CDN/public bucket URL; otherwise presigned GETs
+app.config['S3_PRESIGN_EXPIRES'] = int(os.getenv('S3_PRESIGN_EXPIRES', 900))
+
+# Resized image variants (thumb/card/full, WebP and JPEG): encoder quality 1-95
+app.config['IMAGE_VARIANT_QUALITY'] = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+# Stored uploads: unreferenced files younger than the grace period are kept by `flask uploads gc`
+# (they may belong to an unsaved form); it is the only thing that deletes them, daily by default (0 = CLI only)
+app.config['UPLOAD_GC_GRACE_HOURS'] = int(os.getenv('UPLOAD_GC_GRACE_HOURS', 24))
+app.config['UPLOAD_GC_INTERVAL'] = int(os.getenv('UPLOAD_GC_INTERVAL', 86400))
+
+# Background job queue (jobs table): a worker thread per web process, or run `flask jobs worker`.
+# Failed attempts are retried after JOB_RETRY_BACKOFF * 2^(attempt - 1) seconds; a running job's
+# lock is refreshed every JOB_HEARTBEAT_INTERVAL seconds and taken over by another worker only
+# when it hasn't been for JOB_LOCK_TIMEOUT seconds (its worker died)
+app.config['JOBS_IN_PROCESS'] = os.getenv('JOBS_IN_PROCESS', 'True').lower() in ['true', '1', 'yes']
+app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 5))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+app.config['JOB_RETRY_BACKOFF'] = int(os.getenv('JOB_RETRY_BACKOFF', 30))
+app.config['JOB_LOCK_TIMEOUT'] = int(os.getenv('JOB_LOCK_TIMEOUT', 600))
+app.config['JOB_HEARTBEAT_INTERVAL'] = int(os.getenv('JOB_HEARTBEAT_INTERVAL', 60))
+app.config['JOB_RETENTION_DAYS'] = int(os.getenv('JOB_RETENTION_DAYS', 7))
+app.config['JOB_PRUNE_INTERVAL'] = int(os.getenv('JOB_PRUNE_INTERVAL', 86400))
+
+# Logging: JSON lines written off the request thread. Fast 2xx-4xx requests are
+# sampled; errors and slow requests are always logged
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO' if os.getenv('FLASK_ENV') == 'production' else 'DEBUG').upper()
+app.config['LOG_SAMPLE_RATE'] = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+app.config['LOG_SLOW_REQUEST_MS'] = int(os.getenv('LOG_SLOW_REQUEST_MS', 1000))
+
+# SQL profiling: X-DB-Queries/X-DB-Time-Ms headers (always on in debug), share of
+# requests aggregated for GET /api/debug/profile, and the slow-statement log threshold
+app.config['QUERY_PROFILE_HEADERS'] = os.getenv('QUERY_PROFILE_HEADERS', 'False').lower() in ['true', '1', 'yes']
+app.config['QUERY_PROFILE_SAMPLE_RATE'] = float(os.getenv('QUERY_PROFILE_SAMPLE_RATE', 0.1))
+app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 500))
+
+# Prometheus metrics at /metrics; set a token to require `Authorization: Bearer <token>`
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
 # Email configuration
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
@@ -27,6 +142,8 @@ app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() in ['true
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME', '')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD', '')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@realestatecrm.com')
+# Lifetime (seconds) of the one-time set-password links in welcome emails
+app.config['SET_PASSWORD_TOKEN_MAX_AGE'] = int(os.getenv('SET_PASSWORD_TOKEN_MAX_AGE', 259200))
 
 # Initialize database
 from database import db
@@ -36,6 +153,19 @@ db.init_app(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
 mail = Mail(app)
+
+from utils.query_profiler import profiler
+profiler.init_app(app)
+from utils.request_log import request_log
+request_log.init_app(app)
+from utils.metrics import metrics
+metrics.init_app(app)
+logger = logging.getLogger(__name__)
+
+from utils.activity_sink import activity_sink
+activity_sink.init_app(app)
+from utils.storage import init_storage
+init_storage(app)
 # Get allowed origins from environment or use defaults
 allowed_origins_env = os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000')
 allowed_origins_list = allowed_origins_env.split(',') if allowed_origins_env else ['http://localhost:3000']
@@ -65,17 +195,17 @@ CORS(app,
 # JWT error handlers
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
-    print(f"Token expired: {jwt_payload}")  # Debug log
+    logger.info('Rejected expired token', extra={'path': request.path})
     return jsonify({'error': 'Token has expired'}), 401
 
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    print(f"Invalid token: {error}")  # Debug log
+    logger.info('Rejected invalid token: %s', error, extra={'path': request.path})
     return jsonify({'error': 'Invalid token'}), 401
 
 @jwt.unauthorized_loader
 def missing_token_callback(error):
-    print(f"Missing token: {error}")  # Debug log
+    logger.info('Missing token: %s', error, extra={'path': request.path})
     return jsonify({'error': 'Authorization token is required'}), 401
 
 # Import models
@@ -94,6 +224,9 @@ from routes.upload import upload_bp
 from routes.favorites import favorites_bp
 from routes.shortcodes import shortcodes_bp
 from routes.notifications import notifications_bp
+from routes.debug import debug_bp
+from routes.export import export_bp
+from routes.jobs import jobs_bp
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -108,6 +241,31 @@ app.register_blueprint(upload_bp, url_prefix='/api/upload')
 app.register_blueprint(favorites_bp, url_prefix='/api')
 app.register_blueprint(shortcodes_bp, url_prefix='/api')
 app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+app.register_blueprint(debug_bp, url_prefix='/api/debug')
+app.register_blueprint(export_bp, url_prefix='/api/export')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+
+# CLI commands
+from utils.search import search_cli
+app.cli.add_command(search_cli)
+from utils.rollups import rollups_cli
+app.cli.add_command(rollups_cli)
+from utils.scheduler import scheduler, scheduler_cli
+app.cli.add_command(scheduler_cli)
+from utils.jobs import worker as job_worker, jobs_cli, prune as prune_jobs
+app.cli.add_command(jobs_cli)
+from utils.stored_files import uploads_cli, collect_garbage
+app.cli.add_command(uploads_cli)
+job_worker.init_app(app)
+
+# Periodic jobs
+from routes.notifications import check_follow_up_reminders
+from utils.rollups import compact as compact_rollups
+scheduler.init_app(app)
+scheduler.add_job('follow_up_reminders', check_follow_up_reminders, app.config['FOLLOW_UP_CHECK_INTERVAL'])
+scheduler.add_job('rollup_compaction', compact_rollups, app.config['ROLLUP_COMPACT_INTERVAL'])
+scheduler.add_job('job_pruning', prune_jobs, app.config['JOB_PRUNE_INTERVAL'])
+scheduler.add_job('upload_gc', collect_garbage, app.config['UPLOAD_GC_INTERVAL'])
 
 @app.before_request
 def handle_request():
@@ -123,12 +281,6 @@ def handle_request():
         response.headers.add('Access-Control-Allow-Methods', "GET,PUT,POST,DELETE,OPTIONS")
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
-    
-    # Log request info for debugging
-    print(f"Request: {request.method} {request.url}")
-    print(f"Headers: {dict(request.headers)}")
-    if request.headers.get('Authorization'):
-        print(f"Auth token: {request.headers.get('Authorization')[:20]}...")
 
 @app.route('/')
 def index():
@@ -145,12 +297,24 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     })
 
-# Serve uploaded images
+# Serve uploaded images (from disk, via nginx/X-Sendfile, or a redirect to object storage)
 @app.route('/uploads/images/<filename>')
 def uploaded_file(filename):
-    from flask import send_from_directory
-    upload_dir = os.path.join(app.root_path, 'uploads', 'images')
-    return send_from_directory(upload_dir, filename)
+    from utils.storage import get_storage
+    try:
+        return get_storage().send(filename)
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Image not found'}), 404
+
+# Resized variants of uploaded images (rendered on first request if the upload job hasn't yet)
+@app.route('/uploads/images/<any(thumb, card, full):size>/<name>')
+def uploaded_variant(size, name):
+    from utils.images import variant_key
+    from utils.storage import get_storage
+    try:
+        return get_storage().send(variant_key(size, name))
+    except (LookupError, OSError, ValueError):
+        return jsonify({'error': 'Image not found'}), 404
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Bytes served per listing page, before and after the upload caching headers
+
+A simulated browser loads the website listing page (the card feed plus each
+listing's card image) several times. It keeps an HTTP cache: fresh entries are
+reused without a request, stale ones are revalidated with If-None-Match /
+If-Modified-Since. "before" serves uploads the way utils/storage.py did before
+the caching change (Flask's send_file defaults: validators but no lifetime);
+"after" is the current code. Runs against throwaway SQLite and upload dirs:
+
+    python benchmarks/listing_page_bytes.py --listings 12 --views 10
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix='crm-bench-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}",
+    'ACTIVITY_LOG_ASYNC': 'False',
+    'ACTIVITY_LOG_SPOOL_DIR': os.path.join(TMP_DIR, 'activity_spool'),
+    'JOBS_IN_PROCESS': 'False',
+    'SCHEDULER_ENABLED': 'False',
+    'LOG_LEVEL': 'WARNING',
+    'LOG_SAMPLE_RATE': '0',
+    'UPLOAD_LOCAL_DIR': os.path.join(TMP_DIR, 'uploads'),
+})
+
+from flask import send_file  # noqa: E402
+from PIL import Image  # noqa: E402
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from models import Property  # noqa: E402
+from utils.storage import LocalStorage  # noqa: E402
+from utils.stored_files import store_upload  # noqa: E402
+
+FEED_URL = '/api/properties/website-visible?fields=card'
+
+
+def legacy_send(self, key, mimetype=None):
+    # LocalStorage.send before the caching change
+    return send_file(self.path(key), mimetype=mimetype)
+
+
+class BrowserCache:
+    """Just enough of an HTTP cache: max-age freshness plus revalidation"""
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = {}  # url -> (validators, stored at, max-age)
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, url, now):
+        entry = self.entries.get(url)
+        if entry and now - entry[1] < entry[2]:
+            return None
+        headers = {}
+        if entry:
+            validators = entry[0]
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
+        response = self.client.get(url, headers=headers)
+        body = response.get_data()
+        self.requests += 1
+        self.bytes += len(body) + len(f'HTTP/1.1 {response.status}\r\n\r\n')
+        self.bytes += sum(len(name) + len(value) + 4 for name, value in response.headers)
+        if response.status_code in (200, 304):
+            cache_control = response.cache_control
+            max_age = 0 if cache_control.no_cache or cache_control.max_age is None else cache_control.max_age
+            validators = {name: response.headers.get(name) for name in ('ETag', 'Last-Modified')}
+            if response.status_code == 304 and entry:
+                validators = {name: validators[name] or entry[0][name] for name in validators}
+            self.entries[url] = (validators, now, max_age)
+        return body if response.status_code == 200 else None
+
+
+def seed(listings):
+    db.drop_all()
+    db.create_all()
+    for i in range(listings):
+        photo = io.BytesIO()
+        # Noise compresses about as badly as a photo, so the card sizes are realistic
+        Image.effect_noise((1600, 1200), 24 + i).convert('RGB').save(photo, 'JPEG', quality=85)
+        photo.seek(0)
+        stored, _ = store_upload(photo, 'jpg', 'image/jpeg')
+        db.session.add(Property(title=f'Villa {i}', property_type='residential', location='Pune', price=1000000 + i,
+                                status='available', is_website_visible=True,
+                                images=[f'/uploads/images/{stored.filename}']))
+    db.session.commit()
+
+
+def load_listing_page(browser, now):
+    body = browser.get(FEED_URL, now)
+    if body is not None:
+        browser.image_urls = [
+            listing['cover_image']['card'] for listing in app.json.loads(body)['properties'] if listing['cover_image']
+        ]
+    for url in browser.image_urls:
+        browser.get(url, now)
+
+
+def run(mode, listings, views, gap):
+    original_send = LocalStorage.send
+    if mode == 'before':
+        LocalStorage.send = legacy_send
+    try:
+        with app.app_context():
+            seed(listings)
+            browser = BrowserCache(app.test_client())
+            results = []
+            for view in range(views):
+                requests, sent = browser.requests, browser.bytes
+                load_listing_page(browser, now=view * gap)
+                results.append((browser.requests - requests, browser.bytes - sent))
+            db.session.remove()
+            return results
+    finally:
+        LocalStorage.send = original_send
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--listings', type=int, default=12, help='listings (and card images) on the page')
+    parser.add_argument('--views', type=int, default=10, help='page views by the same browser')
+    parser.add_argument('--gap', type=int, default=3600, help='seconds between views')
+    args = parser.parse_args()
+
+    print(f'{args.listings} listings, {args.views} views {args.gap}s apart')
+    print(f"{'':8}{'first view':>22}{'repeat view (avg)':>26}{'total bytes':>14}")
+    for mode in ('before', 'after'):
+        results = run(mode, args.listings, args.views, args.gap)
+        first_requests, first_bytes = results[0]
+        repeats = results[1:] or [(0, 0)]
+        repeat_requests = sum(r for r, _ in repeats) / len(repeats)
+        repeat_bytes = sum(b for _, b in repeats) / len(repeats)
+        print(f'{mode:8}{first_requests:>6} req {first_bytes:>10,} B'
+              f'{repeat_requests:>10.1f} req {repeat_bytes:>10,.0f} B'
+              f'{sum(b for _, b in results):>14,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,50 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()
+REPLICA_BIND = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs issued inside use_replica() to the 'replica'
+    bind (SQLALCHEMY_BINDS, from DATABASE_REPLICA_URL). Writes, flushes and
+    everything outside use_replica() use the primary, as does every query
+    when no replica is configured.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _replica_reads.get() and not self._flushing and getattr(clause, 'is_select', False):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def use_replica():
+    """Run the block's SELECTs against the read replica (if one is configured)"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_only(view):
+    """
+    Route decorator for SELECT-only endpoints (reports, charts): their queries
+    run on the read replica so analytics load stays off the primary
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
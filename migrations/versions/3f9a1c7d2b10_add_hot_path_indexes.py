@@ -0,0 +1,51 @@
+"""add indexes for the hot list filters
+
+Revision ID: 3f9a1c7d2b10
+Revises: 
+Create Date: 2026-10-18 14:00:00.000000
+
+The schema itself is still created by db.create_all(), which already builds
+these indexes on a fresh database, so each index is only created if missing.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7d2b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('leads', 'ix_leads_employee_status_created', ['assigned_employee_id', 'status', 'created_at']),
+    ('leads', 'ix_leads_next_follow_up', ['next_follow_up']),
+    ('properties', 'ix_properties_status_website_visible', ['status', 'is_website_visible']),
+    ('properties', 'ix_properties_property_type', ['property_type']),
+    ('properties', 'ix_properties_price', ['price']),
+    ('notifications', 'ix_notifications_user_read_created', ['user_id', 'is_read', 'created_at']),
+    ('activities', 'ix_activities_created_type', ['created_at', 'activity_type']),
+    ('payments', 'ix_payments_status', ['status']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
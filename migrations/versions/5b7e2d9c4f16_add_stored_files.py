@@ -0,0 +1,44 @@
+"""add stored_files for content-addressed uploads
+
+Revision ID: 5b7e2d9c4f16
+Revises: d51f0a6e3c28
+Create Date: 2026-10-18 18:00:00.000000
+
+Skipped when db.create_all() has already created the table. Run
+`flask uploads recount` afterwards to register files uploaded before it.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2d9c4f16'
+down_revision = 'd51f0a6e3c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('stored_files'):
+        return
+    op.create_table(
+        'stored_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=100), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('filename')
+    )
+    op.create_index('ix_stored_files_sha256', 'stored_files', ['sha256'])
+
+
+def downgrade():
+    op.drop_index('ix_stored_files_sha256', table_name='stored_files')
+    op.drop_table('stored_files')
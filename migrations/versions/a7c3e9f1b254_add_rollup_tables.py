@@ -0,0 +1,93 @@
+"""add daily rollup tables, watermarks and dirty days
+
+Revision ID: a7c3e9f1b254
+Revises: 5b7e2d9c4f16
+Create Date: 2026-10-18 20:00:00.000000
+
+Tables db.create_all() has already created are skipped. Run
+`flask rollups compact --full` afterwards to fill the rollups.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b254'
+down_revision = '5b7e2d9c4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('daily_sales_rollups'):
+        op.create_table(
+            'daily_sales_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=True),
+            sa.Column('property_type', sa.String(length=50), nullable=True),
+            sa.Column('sales_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.DECIMAL(precision=18, scale=2), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_daily_sales_rollups_day_employee', 'daily_sales_rollups', ['day', 'employee_id'])
+
+    if not inspector.has_table('daily_lead_rollups'):
+        op.create_table(
+            'daily_lead_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=True),
+            sa.Column('source', sa.String(length=100), nullable=True),
+            sa.Column('status', sa.String(length=30), nullable=True),
+            sa.Column('lead_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_daily_lead_rollups_day_employee', 'daily_lead_rollups', ['day', 'employee_id'])
+
+    if not inspector.has_table('daily_activity_rollups'):
+        op.create_table(
+            'daily_activity_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('activity_type', sa.String(length=50), nullable=True),
+            sa.Column('activity_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_daily_activity_rollups_day_user', 'daily_activity_rollups', ['day', 'user_id'])
+
+    if not inspector.has_table('rollup_watermarks'):
+        op.create_table(
+            'rollup_watermarks',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('through_day', sa.Date(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+    if not inspector.has_table('rollup_dirty_days'):
+        op.create_table(
+            'rollup_dirty_days',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('marked_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_rollup_dirty_days_name_day', 'rollup_dirty_days', ['name', 'day'])
+
+
+def downgrade():
+    op.drop_index('ix_rollup_dirty_days_name_day', table_name='rollup_dirty_days')
+    op.drop_table('rollup_dirty_days')
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_daily_activity_rollups_day_user', table_name='daily_activity_rollups')
+    op.drop_table('daily_activity_rollups')
+    op.drop_index('ix_daily_lead_rollups_day_employee', table_name='daily_lead_rollups')
+    op.drop_table('daily_lead_rollups')
+    op.drop_index('ix_daily_sales_rollups_day_employee', table_name='daily_sales_rollups')
+    op.drop_table('daily_sales_rollups')
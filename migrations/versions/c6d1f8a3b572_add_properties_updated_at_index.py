@@ -0,0 +1,45 @@
+"""add properties.updated_at index for the feed cache version probe
+
+Revision ID: c6d1f8a3b572
+Revises: e4b8d2a6f913
+Create Date: 2026-10-18 22:00:00.000000
+
+The website feed cache checks count(id), max(id) and max(updated_at) on every
+request; with this index that reads a narrow index instead of the whole table.
+Created only if missing.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d1f8a3b572'
+down_revision = 'e4b8d2a6f913'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('properties', 'ix_properties_updated_at', ['updated_at']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
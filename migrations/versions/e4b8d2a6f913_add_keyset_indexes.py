@@ -0,0 +1,47 @@
+"""add (created_at, id) indexes for keyset pagination
+
+Revision ID: e4b8d2a6f913
+Revises: a7c3e9f1b254
+Create Date: 2026-10-18 21:00:00.000000
+
+The lead, property and post-sale lists page by (created_at DESC, id DESC);
+these indexes let the cursor seek instead of sorting the table. As with the
+hot path indexes, each one is only created if missing.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d2a6f913'
+down_revision = 'a7c3e9f1b254'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('leads', 'ix_leads_created_id', ['created_at', 'id']),
+    ('properties', 'ix_properties_created_id', ['created_at', 'id']),
+    ('post_sales', 'ix_post_sales_created_id', ['created_at', 'id']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
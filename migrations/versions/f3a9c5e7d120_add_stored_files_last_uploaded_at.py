@@ -0,0 +1,37 @@
+"""add stored_files.last_uploaded_at for the gc grace period
+
+Revision ID: f3a9c5e7d120
+Revises: c6d1f8a3b572
+Create Date: 2026-10-19 09:00:00.000000
+
+A deduplicated upload reuses an existing row; its grace period now runs
+from the latest upload instead of the first. Existing rows start from
+created_at. Skipped when db.create_all() has already added the column.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c5e7d120'
+down_revision = 'c6d1f8a3b572'
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('stored_files')}
+
+
+def upgrade():
+    if 'last_uploaded_at' in _columns():
+        return
+    op.add_column('stored_files', sa.Column('last_uploaded_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE stored_files SET last_uploaded_at = created_at')
+
+
+def downgrade():
+    if 'last_uploaded_at' in _columns():
+        with op.batch_alter_table('stored_files') as batch_op:
+            batch_op.drop_column('last_uploaded_at')
@@ -4,6 +4,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 # Import db from database.py
 from database import db
+from utils.serializers import ModelSerializer, to_float, to_isoformat, or_empty_list
+from utils.uploads import cover_image
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -144,92 +146,121 @@ class Property(db.Model):
     leads = db.relationship('Lead', backref='property', lazy=True)
     post_sales = db.relationship('PostSale', backref='property', lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            # Basic Information
-            'title': self.title,
-            'description': self.description,
-            'property_type': self.property_type,
-            'sub_type': self.sub_type,
-            'location': self.location,
-            'address': self.address,
-            'city': self.city,
-            'state': self.state,
-            'pincode': self.pincode,
-            'landmark': self.landmark,
-            
-            # Pricing & Financial
-            'price': float(self.price) if self.price else None,
-            'price_per_sqft': float(self.price_per_sqft) if self.price_per_sqft else None,
-            'maintenance_charges': float(self.maintenance_charges) if self.maintenance_charges else None,
-            'booking_amount': float(self.booking_amount) if self.booking_amount else None,
-            'registration_charges': float(self.registration_charges) if self.registration_charges else None,
-            'stamp_duty': float(self.stamp_duty) if self.stamp_duty else None,
-            'gst': float(self.gst) if self.gst else None,
-            'possession_date': self.possession_date.isoformat() if self.possession_date else None,
-            
-            # Property Specifications
-            'area': float(self.area) if self.area else None,
-            'built_up_area': float(self.built_up_area) if self.built_up_area else None,
-            'carpet_area': float(self.carpet_area) if self.carpet_area else None,
-            'super_built_up_area': float(self.super_built_up_area) if self.super_built_up_area else None,
-            'bedrooms': self.bedrooms,
-            'bathrooms': self.bathrooms,
-            'balconies': self.balconies,
-            'floors': self.floors,
-            'total_floors': self.total_floors,
-            'floor_number': self.floor_number,
-            'direction': self.direction,
-            'age_of_property': self.age_of_property,
-            'furnishing_status': self.furnishing_status,
-            
-            # Legal & Documentation
-            'ownership_type': self.ownership_type,
-            'property_documents': self.property_documents or [],
-            'legal_status': self.legal_status,
-            'rera_registration': self.rera_registration,
-            'khata_certificate': self.khata_certificate,
-            'encumbrance_certificate': self.encumbrance_certificate,
-            
-            # Amenities & Features
-            'amenities': self.amenities or [],
-            'parking': self.parking,
-            'power_backup': self.power_backup,
-            'water_supply': self.water_supply,
-            'security': self.security,
-            'internet_connectivity': self.internet_connectivity,
-            
-            # Location & Connectivity
-            'nearby_schools': self.nearby_schools,
-            'nearby_hospitals': self.nearby_hospitals,
-            'nearby_malls': self.nearby_malls,
-            'nearby_metro': self.nearby_metro,
-            'nearby_bus_stop': self.nearby_bus_stop,
-            'distance_to_airport': self.distance_to_airport,
-            'distance_to_railway': self.distance_to_railway,
-            
-            # Status & Visibility
-            'status': self.status,
-            'listing_type': self.listing_type,
-            'priority': self.priority,
-            'featured': self.featured,
-            'images': self.images or [],
-            'floor_plans': self.floor_plans or [],
-            'virtual_tour': self.virtual_tour,
-            'assigned_agent_id': self.assigned_agent_id,
-            'is_website_visible': self.is_website_visible,
-            
-            # Additional Information
-            'highlights': self.highlights,
-            'additional_info': self.additional_info,
-            'contact_person': self.contact_person,
-            'contact_phone': self.contact_phone,
-            'contact_email': self.contact_email,
-            
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # Indexes for the listing filters (public feed, status, type and price range)
+    __table_args__ = (
+        db.Index('ix_properties_status_website_visible', 'status', 'is_website_visible'),
+        db.Index('ix_properties_property_type', 'property_type'),
+        db.Index('ix_properties_price', 'price'),
+        db.Index('ix_properties_created_id', 'created_at', 'id'),
+        db.Index('ix_properties_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self, fields=None):
+        return property_serializer.serialize(self, fields)
+    
+    @classmethod
+    def resolve_fields(cls, spec):
+        """Resolve a `fields=` query parameter (see PROPERTY_PROJECTIONS)"""
+        return property_serializer.resolve_fields(spec)
+    
+    @classmethod
+    def field_columns(cls, fields):
+        """Column attributes backing the selected fields"""
+        return property_serializer.columns(cls, fields)
+    
+    @classmethod
+    def load_options(cls, fields):
+        """Loader options restricting a query to the selected fields"""
+        return property_serializer.load_options(cls, fields)
+
+# Serializable Property fields, in to_dict() output order
+PROPERTY_FIELDS = (
+    'id',
+    # Basic Information
+    'title', 'description', 'property_type', 'sub_type', 'location', 'address',
+    'city', 'state', 'pincode', 'landmark',
+    # Pricing & Financial
+    'price', 'price_per_sqft', 'maintenance_charges', 'booking_amount',
+    'registration_charges', 'stamp_duty', 'gst', 'possession_date',
+    # Property Specifications
+    'area', 'built_up_area', 'carpet_area', 'super_built_up_area', 'bedrooms',
+    'bathrooms', 'balconies', 'floors', 'total_floors', 'floor_number',
+    'direction', 'age_of_property', 'furnishing_status',
+    # Legal & Documentation
+    'ownership_type', 'property_documents', 'legal_status', 'rera_registration',
+    'khata_certificate', 'encumbrance_certificate',
+    # Amenities & Features
+    'amenities', 'parking', 'power_backup', 'water_supply', 'security',
+    'internet_connectivity',
+    # Location & Connectivity
+    'nearby_schools', 'nearby_hospitals', 'nearby_malls', 'nearby_metro',
+    'nearby_bus_stop', 'distance_to_airport', 'distance_to_railway',
+    # Status & Visibility
+    'status', 'listing_type', 'priority', 'featured', 'images', 'cover_image',
+    'floor_plans', 'virtual_tour', 'assigned_agent_id', 'is_website_visible',
+    # Additional Information
+    'highlights', 'additional_info', 'contact_person', 'contact_phone',
+    'contact_email',
+    'created_at', 'updated_at'
+)
+
+PROPERTY_CONVERTERS = {
+    'price': to_float,
+    'price_per_sqft': to_float,
+    'maintenance_charges': to_float,
+    'booking_amount': to_float,
+    'registration_charges': to_float,
+    'stamp_duty': to_float,
+    'gst': to_float,
+    'possession_date': to_isoformat,
+    'area': to_float,
+    'built_up_area': to_float,
+    'carpet_area': to_float,
+    'super_built_up_area': to_float,
+    'property_documents': or_empty_list,
+    'amenities': or_empty_list,
+    'images': or_empty_list,
+    'cover_image': cover_image,
+    'floor_plans': or_empty_list,
+    'created_at': to_isoformat,
+    'updated_at': to_isoformat
+}
+
+# Named projections for `?fields=`; 'full' (the default) returns every field
+PROPERTY_PROJECTIONS = {
+    # Listing cards: enough to render a tile, no large Text columns
+    'card': (
+        'id', 'title', 'property_type', 'location', 'city', 'price', 'area',
+        'bedrooms', 'bathrooms', 'status', 'listing_type', 'featured', 'images',
+        'cover_image'
+    ),
+    # Property detail page: everything except internal legal/ops fields
+    'detail': (
+        'id', 'title', 'description', 'property_type', 'sub_type', 'location',
+        'address', 'city', 'state', 'pincode', 'landmark', 'price',
+        'price_per_sqft', 'maintenance_charges', 'booking_amount',
+        'possession_date', 'area', 'built_up_area', 'carpet_area',
+        'super_built_up_area', 'bedrooms', 'bathrooms', 'balconies', 'floors',
+        'total_floors', 'floor_number', 'direction', 'age_of_property',
+        'furnishing_status', 'rera_registration', 'amenities', 'parking',
+        'power_backup', 'water_supply', 'security', 'internet_connectivity',
+        'nearby_schools', 'nearby_hospitals', 'nearby_malls', 'nearby_metro',
+        'nearby_bus_stop', 'distance_to_airport', 'distance_to_railway',
+        'status', 'listing_type', 'featured', 'images', 'cover_image',
+        'floor_plans', 'virtual_tour', 'highlights', 'contact_person', 'contact_phone',
+        'contact_email', 'created_at', 'updated_at'
+    ),
+    'full': PROPERTY_FIELDS
+}
+
+# Fields computed from another column: field -> source column
+PROPERTY_DERIVED = {
+    # Thumb/card/full WebP URLs of the first image, for list cards and widgets
+    'cover_image': 'images'
+}
+
+property_serializer = ModelSerializer(PROPERTY_FIELDS, PROPERTY_CONVERTERS, PROPERTY_PROJECTIONS,
+                                      derived=PROPERTY_DERIVED)
 
 class Lead(db.Model):
     __tablename__ = 'leads'
@@ -251,6 +282,13 @@ class Lead(db.Model):
     # Relationships
     communications = db.relationship('Communication', backref='lead', lazy=True, cascade='all, delete-orphan')
     
+    # Indexes for per-employee lead lists/stats and follow-up scans
+    __table_args__ = (
+        db.Index('ix_leads_employee_status_created', 'assigned_employee_id', 'status', 'created_at'),
+        db.Index('ix_leads_next_follow_up', 'next_follow_up'),
+        db.Index('ix_leads_created_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -314,6 +352,8 @@ class PostSale(db.Model):
     payments = db.relationship('Payment', backref='post_sale', lazy=True, cascade='all, delete-orphan')
     support_tickets = db.relationship('SupportTicket', backref='post_sale', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (db.Index('ix_post_sales_created_id', 'created_at', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -348,6 +388,9 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Index for pending/overdue payment counts
+    __table_args__ = (db.Index('ix_payments_status', 'status'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -427,6 +470,9 @@ class Activity(db.Model):
     # Relationships
     user = db.relationship('User', backref='activities')
 
+    # Index for the activity feed and stats (time window, then type)
+    __table_args__ = (db.Index('ix_activities_created_type', 'created_at', 'activity_type'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -455,13 +501,13 @@ class Favorite(db.Model):
     # Unique constraint to prevent duplicate favorites
     __table_args__ = (db.UniqueConstraint('user_id', 'property_id', name='unique_user_property_favorite'),)
     
-    def to_dict(self):
+    def to_dict(self, property_fields=None):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'property_id': self.property_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'property': self.property.to_dict() if self.property else None
+            'property': self.property.to_dict(property_fields) if self.property else None
         }
 
 class PropertyShortcode(db.Model):
@@ -517,6 +563,9 @@ class Notification(db.Model):
     # Relationships
     user = db.relationship('User', backref='notifications', lazy=True)
     
+    # Index for a user's notification list and unread count
+    __table_args__ = (db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -529,3 +578,151 @@ class Notification(db.Model):
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat() + 'Z' if self.created_at else None
         }
+
+class DailySalesRollup(db.Model):
+    __tablename__ = 'daily_sales_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    employee_id = db.Column(db.Integer)  # Lead's assigned employee at compaction time
+    property_type = db.Column(db.String(50))
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(DECIMAL(18, 2), nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_daily_sales_rollups_day_employee', 'day', 'employee_id'),)
+
+class DailyLeadRollup(db.Model):
+    __tablename__ = 'daily_lead_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # Day the lead was created
+    employee_id = db.Column(db.Integer)
+    source = db.Column(db.String(100))
+    status = db.Column(db.String(30))
+    lead_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_daily_lead_rollups_day_employee', 'day', 'employee_id'),)
+
+class DailyActivityRollup(db.Model):
+    __tablename__ = 'daily_activity_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer)
+    activity_type = db.Column(db.String(50))
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_daily_activity_rollups_day_user', 'day', 'user_id'),)
+
+class RollupWatermark(db.Model):
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)  # sales, leads, activities
+    through_day = db.Column(db.Date, nullable=False)  # Last day fully compacted into the rollup
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RollupDirtyDay(db.Model):
+    __tablename__ = 'rollup_dirty_days'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # Rollup whose compacted day was written to
+    day = db.Column(db.Date, nullable=False)
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_rollup_dirty_days_name_day', 'name', 'day'),)
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)  # properties
+    format = db.Column(db.String(10), nullable=False)  # csv, ndjson
+    filename = db.Column(db.String(255))  # Name of the uploaded file
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    inserted_rows = db.Column(db.Integer, nullable=False, default=0)
+    rejected_rows = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)  # Set when the whole job failed
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'format': self.format,
+            'filename': self.filename,
+            'status': self.status,
+            'processed_rows': self.processed_rows,
+            'inserted_rows': self.inserted_rows,
+            'rejected_rows': self.rejected_rows,
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Registered handler (see utils/jobs.py)
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not picked up before this time
+    locked_by = db.Column(db.String(100))  # Worker running the job
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Index for the worker's "next due job" lookup
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class StoredFile(db.Model):
+    __tablename__ = 'stored_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(100), unique=True, nullable=False)  # <sha256>.<ext> under uploads/images
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Properties listing it in images/floor_plans
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)  # Latest upload of this content (dedup hits included)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'sha256': self.sha256,
+            'size': self.size,
+            'content_type': self.content_type,
+            'ref_count': self.ref_count,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_uploaded_at': self.last_uploaded_at.isoformat() if self.last_uploaded_at else None
+        }
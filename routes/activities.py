@@ -4,6 +4,10 @@ from database import db
 from models import Activity, User
 from datetime import datetime, timedelta
 from sqlalchemy import desc
+from utils.search import search_condition
+from utils.rollups import daily_totals
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.user_cache import get_current_user
 
 activities_bp = Blueprint('activities', __name__)
 
@@ -12,7 +16,7 @@ activities_bp = Blueprint('activities', __name__)
 def get_activities():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -33,7 +37,7 @@ def get_activities():
         # Filter by search term if provided
         if search:
             query = query.filter(
-                Activity.description.contains(search) |
+                search_condition(Activity, search) |
                 Activity.user.has(User.first_name.contains(search)) |
                 Activity.user.has(User.last_name.contains(search))
             )
@@ -41,6 +45,17 @@ def get_activities():
         # Order by most recent first
         query = query.order_by(desc(Activity.created_at))
         
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(Activity.created_at, True), (Activity.id, True)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'activities': [activity.to_dict() for activity in results.items],
+                **results.meta()
+            }), 200
+        
         # Paginate results
         paginated_activities = query.paginate(
             page=page, 
@@ -71,7 +86,7 @@ def get_activities():
 def get_activity_stats():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -88,15 +103,8 @@ def get_activity_stats():
             Activity.created_at >= start_date
         ).group_by(Activity.activity_type).all()
         
-        # Get daily activity counts
-        daily_counts = db.session.query(
-            db.func.date(Activity.created_at).label('date'),
-            db.func.count(Activity.id).label('count')
-        ).filter(
-            Activity.created_at >= start_date
-        ).group_by(
-            db.func.date(Activity.created_at)
-        ).order_by('date').all()
+        # Get daily activity counts from the daily activity rollup
+        daily_counts = daily_totals('activities', start_date)
         
         # Get most active users
         user_counts = db.session.query(
@@ -115,8 +123,8 @@ def get_activity_stats():
                 for count in activity_counts
             ],
             'daily_counts': [
-                {'date': str(count.date), 'count': count.count} 
-                for count in daily_counts
+                {'date': str(day), 'count': int(totals['activity_count'])} 
+                for day, totals in daily_counts
             ],
             'top_users': [
                 {'name': f"{user.first_name} {user.last_name}", 'count': user.count} 
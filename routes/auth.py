@@ -1,11 +1,15 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from database import db
 from models import User
 from datetime import datetime
 from utils.activity_logger import log_profile_update
+from utils.password_tokens import load_set_password_token
+from utils.user_cache import get_current_user
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -66,7 +70,7 @@ def login():
         
         # Create access token (identity must be a string)
         access_token = create_access_token(identity=str(user.id))
-        print(f"Login successful for user {user.id}, token: {access_token[:20]}...")  # Debug log
+        logger.info('Login successful', extra={'user_id': user.id})
         
         return jsonify({
             'message': 'Login successful',
@@ -82,8 +86,6 @@ def login():
 def get_profile():
     try:
         user_id = get_jwt_identity()
-        print(f"Profile request - User ID: {user_id}")  # Debug log
-        print(f"Authorization header: {request.headers.get('Authorization')}")  # Debug log
         user = User.query.get(int(user_id))
         
         if not user:
@@ -175,12 +177,43 @@ def change_password():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.route('/set-password', methods=['POST'])
+def set_password():
+    """Set a password with the one-time token from the welcome email"""
+    try:
+        data = request.get_json() or {}
+        
+        if not data.get('token') or not data.get('password'):
+            return jsonify({'error': 'Token and password are required'}), 400
+        
+        if len(data['password']) < 6:
+            return jsonify({'error': 'Password must be at least 6 characters'}), 400
+        
+        user = load_set_password_token(data['token'])
+        if not user:
+            return jsonify({'error': 'This link is invalid, expired or has already been used'}), 400
+        
+        # Changing the hash also invalidates the token
+        user.set_password(data['password'])
+        user.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Password set successfully',
+            'email': user.email
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @auth_bp.route('/users', methods=['GET'])
 @jwt_required()
 def get_users():
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin and manager can view all users
         if current_user.role not in ['admin', 'manager']:
@@ -200,7 +233,7 @@ def get_users():
 def update_user(user_id):
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can update users
         if current_user.role != 'admin':
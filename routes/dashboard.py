@@ -1,22 +1,28 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from database import db
-from models import User, Property, Lead, PostSale, Payment, SupportTicket, Activity
+from database import db, read_only
+from models import User, Property, Lead, Payment, SupportTicket, Activity
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from utils.employee_stats import employee_productivity
+from utils.kpis import dashboard_kpis
+from utils.rollups import monthly_totals
+from utils.user_cache import get_current_user
 
 dashboard_bp = Blueprint('dashboard', __name__)
+logger = logging.getLogger(__name__)
 
 @dashboard_bp.route('/overview', methods=['GET'])
 @jwt_required()
+@read_only
 def get_dashboard_overview():
     try:
         current_user_id = int(get_jwt_identity())
-        print(f"Dashboard overview - User ID: {current_user_id}")  # Debug log
-        current_user = User.query.get(int(current_user_id))
+        current_user = get_current_user()
         
         if not current_user:
-            print(f"User not found for ID: {current_user_id}")  # Debug log
+            logger.warning('Dashboard requested for unknown user', extra={'user_id': current_user_id})
             return jsonify({'error': 'User not found'}), 404
         
         # Get date range (default to current month)
@@ -33,43 +39,23 @@ def get_dashboard_overview():
         else:
             end_date = datetime.fromisoformat(end_date)
         
-        # Build base queries
+        # Sparse fieldset for the recent properties list
+        try:
+            property_fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Base queries for the recent-activity lists
         leads_query = Lead.query
         properties_query = Property.query
-        post_sales_query = PostSale.query
         
         # Filter by assigned employee if not admin/manager
         if current_user.role not in ['admin', 'manager']:
             leads_query = leads_query.filter(Lead.assigned_employee_id == current_user_id)
             properties_query = properties_query.filter(Property.assigned_agent_id == current_user_id)
-            # Filter post sales by user's leads
-            user_leads = db.session.query(Lead.id).filter_by(assigned_employee_id=current_user_id).subquery()
-            post_sales_query = post_sales_query.filter(PostSale.lead_id.in_(user_leads))
-        
-        # KPIs
-        total_leads = leads_query.count()
-        active_listings = properties_query.filter(Property.status == 'available').count()
-        
-        # Inventory stats
-        total_properties = Property.query.count()
-        sold_properties = Property.query.filter(Property.status == 'sold').count()
-        available_properties = Property.query.filter(Property.status == 'available').count()
-        
-        # Revenue this month
-        current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        revenue_this_month = db.session.query(func.sum(PostSale.sale_price)).filter(
-            PostSale.sale_date >= current_month_start
-        ).scalar() or 0
-        
-        # Pending tasks
-        pending_payments = Payment.query.filter(Payment.status == 'pending').count()
-        open_support_tickets = SupportTicket.query.filter(SupportTicket.status == 'open').count()
-        pending_tasks = pending_payments + open_support_tickets
-        
-        # Lead conversion rate
-        total_closed_leads = leads_query.filter(Lead.stage.in_(['closed_won', 'closed_lost'])).count()
-        won_leads = leads_query.filter(Lead.stage == 'closed_won').count()
-        conversion_rate = (won_leads / total_closed_leads * 100) if total_closed_leads > 0 else 0
+        
+        # KPIs (one conditional-aggregation query per table)
+        kpis = dashboard_kpis(current_user_id, current_user.role)
         
         # Recent activity - get from Activity table
         recent_activities = Activity.query.filter(
@@ -81,7 +67,7 @@ def get_dashboard_overview():
             Lead.created_at >= start_date
         ).order_by(Lead.created_at.desc()).limit(5).all()
         
-        recent_properties = properties_query.filter(
+        recent_properties = properties_query.options(*Property.load_options(property_fields)).filter(
             Property.created_at >= start_date
         ).order_by(Property.created_at.desc()).limit(5).all()
         
@@ -93,19 +79,11 @@ def get_dashboard_overview():
         ).order_by(Lead.next_follow_up.asc()).limit(5).all()
         
         return jsonify({
-            'kpis': {
-                'total_leads': total_leads,
-                'active_listings': active_listings,
-                'inventory_sold': sold_properties,
-                'inventory_available': available_properties,
-                'revenue_this_month': float(revenue_this_month),
-                'pending_tasks': pending_tasks,
-                'conversion_rate': round(conversion_rate, 2)
-            },
+            'kpis': kpis,
             'recent_activity': {
                 'activities': [activity.to_dict() for activity in recent_activities],
                 'leads': [lead.to_dict() for lead in recent_leads],
-                'properties': [property.to_dict() for property in recent_properties]
+                'properties': [property.to_dict(property_fields) for property in recent_properties]
             },
             'upcoming_follow_ups': [lead.to_dict() for lead in upcoming_follow_ups]
         }), 200
@@ -118,7 +96,7 @@ def get_dashboard_overview():
 def get_notifications():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         notifications = []
         
@@ -184,10 +162,11 @@ def get_notifications():
 
 @dashboard_bp.route('/charts/sales-performance', methods=['GET'])
 @jwt_required()
+@read_only
 def get_sales_performance_chart():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Get months parameter (default to 6)
         months = request.args.get('months', 6, type=int)
@@ -195,30 +174,18 @@ def get_sales_performance_chart():
         # Calculate start date
         start_date = datetime.utcnow() - timedelta(days=months * 30)
         
-        # Build base query
-        query = PostSale.query.filter(PostSale.sale_date >= start_date)
-        
         # Filter by assigned employee if not admin/manager
+        filters = {}
         if current_user.role not in ['admin', 'manager']:
-            user_leads = db.session.query(Lead.id).filter_by(assigned_employee_id=current_user_id).subquery()
-            query = query.filter(PostSale.lead_id.in_(user_leads))
-        
-        # Group by month
-        monthly_sales = db.session.query(
-            func.date_format(PostSale.sale_date, '%Y-%m').label('month'),
-            func.count(PostSale.id).label('count'),
-            func.sum(PostSale.sale_price).label('total')
-        ).filter(PostSale.sale_date >= start_date).group_by(
-            func.date_format(PostSale.sale_date, '%Y-%m')
-        ).order_by('month').all()
-        
-        # Format data for charts
+            filters['employee_id'] = current_user_id
+        
+        # Monthly totals from the daily sales rollup
         chart_data = []
-        for sale in monthly_sales:
+        for (year, month), totals in monthly_totals('sales', start_date, **filters):
             chart_data.append({
-                'month': sale.month,
-                'sales_count': int(sale.count),
-                'revenue': float(sale.total)
+                'month': f"{year}-{month:02d}",
+                'sales_count': int(totals['sales_count']),
+                'revenue': float(totals['revenue'])
             })
         
         return jsonify({
@@ -230,10 +197,11 @@ def get_sales_performance_chart():
 
 @dashboard_bp.route('/charts/lead-sources', methods=['GET'])
 @jwt_required()
+@read_only
 def get_lead_sources_chart():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Build base query
         query = Lead.query
@@ -265,10 +233,11 @@ def get_lead_sources_chart():
 
 @dashboard_bp.route('/charts/employee-productivity', methods=['GET'])
 @jwt_required()
+@read_only
 def get_employee_productivity_chart():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin and manager can view employee productivity
         if current_user.role not in ['admin', 'manager']:
@@ -288,40 +257,14 @@ def get_employee_productivity_chart():
         else:
             end_date = datetime.fromisoformat(end_date)
         
-        # Get employee productivity data
-        employees = User.query.filter(User.role.in_(['sales_agent', 'manager'])).all()
-        
+        # Get employee productivity data (single grouped query for all employees)
         chart_data = []
-        for employee in employees:
-            # Get leads handled
-            leads_handled = Lead.query.filter(
-                Lead.assigned_employee_id == employee.id,
-                Lead.created_at >= start_date,
-                Lead.created_at <= end_date
-            ).count()
-            
-            # Get conversions
-            conversions = Lead.query.filter(
-                Lead.assigned_employee_id == employee.id,
-                Lead.stage == 'closed_won',
-                Lead.updated_at >= start_date,
-                Lead.updated_at <= end_date
-            ).count()
-            
-            # Get sales value
-            sales_value = db.session.query(func.sum(PostSale.sale_price)).filter(
-                PostSale.lead_id.in_(
-                    db.session.query(Lead.id).filter_by(assigned_employee_id=employee.id)
-                ),
-                PostSale.sale_date >= start_date,
-                PostSale.sale_date <= end_date
-            ).scalar() or 0
-            
+        for stats in employee_productivity(roles=['sales_agent', 'manager'], start_date=start_date, end_date=end_date):
             chart_data.append({
-                'employee_name': f"{employee.first_name} {employee.last_name}",
-                'leads_handled': leads_handled,
-                'conversions': conversions,
-                'sales_value': float(sales_value)
+                'employee_name': stats['employee_name'],
+                'leads_handled': stats['leads_handled'],
+                'conversions': stats['conversions'],
+                'sales_value': stats['sales_value']
             })
         
         return jsonify({
@@ -336,7 +279,7 @@ def get_employee_productivity_chart():
 def get_quick_actions():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         actions = []
         
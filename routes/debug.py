@@ -0,0 +1,38 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from utils.query_profiler import profiler
+from utils.user_cache import get_current_user
+
+debug_bp = Blueprint('debug', __name__)
+
+@debug_bp.route('/profile', methods=['GET'])
+@jwt_required()
+def get_query_profile():
+    try:
+        current_user = get_current_user()
+
+        # Only admins can see SQL statements
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Insufficient permissions'}), 403
+
+        # ?route= filters on a substring of "METHOD /rule"
+        return jsonify(profiler.report(request.args.get('route'))), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@debug_bp.route('/profile', methods=['DELETE'])
+@jwt_required()
+def reset_query_profile():
+    try:
+        current_user = get_current_user()
+
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Insufficient permissions'}), 403
+
+        profiler.reset()
+
+        return jsonify({'message': 'Query profile reset'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import db
-from models import User, Lead, Property, PostSale
+from models import User, Lead, Property
 from datetime import datetime
-from sqlalchemy import func
 from utils.activity_logger import log_activity
 from utils.email_service import send_employee_welcome_email
+from utils.employee_stats import employee_productivity
+from utils.jobs import enqueue, job_handler
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.password_tokens import make_set_password_token
+from utils.user_cache import get_current_user
 
 employees_bp = Blueprint('employees', __name__)
 
@@ -14,7 +18,7 @@ employees_bp = Blueprint('employees', __name__)
 def get_employees():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin and manager can view all employees
         if current_user.role not in ['admin', 'manager']:
@@ -34,6 +38,17 @@ def get_employees():
         if is_active is not None and is_active != '':
             query = query.filter(User.is_active == (is_active.lower() == 'true'))
         
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(User.id, False)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'employees': [employee.to_dict() for employee in results.items],
+                **results.meta()
+            }), 200
+        
         # Paginate results
         employees = query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -55,7 +70,7 @@ def get_employees():
 def get_employee(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Check permissions
         if current_user.role not in ['admin', 'manager'] and current_user_id != employee_id:
@@ -78,7 +93,7 @@ def get_employee(employee_id):
 def create_employee():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can create employees
         if current_user.role != 'admin':
@@ -109,6 +124,14 @@ def create_employee():
         employee.set_password(data['password'])
         
         db.session.add(employee)
+        db.session.flush()
+        
+        # Send the welcome email from the job queue; the job commits with the employee
+        admin_name = f"{current_user.first_name} {current_user.last_name}"
+        email_job = enqueue('send_welcome_email', {
+            'employee_id': employee.id,
+            'admin_name': admin_name
+        }, created_by=current_user_id)
         db.session.commit()
         
         # Log the employee creation activity
@@ -125,43 +148,44 @@ def create_employee():
             }
         )
         
-        # Send welcome email to the new employee
-        try:
-            employee_name = f"{employee.first_name} {employee.last_name}"
-            admin_name = f"{current_user.first_name} {current_user.last_name}"
-            email_sent = send_employee_welcome_email(
-                employee_email=employee.email,
-                employee_name=employee_name,
-                username=employee.email,
-                password=data['password'],  # Send the plain password for first login
-                admin_name=admin_name
-            )
-            
-            if email_sent:
-                print(f"Welcome email sent successfully to {employee.email}")
-            else:
-                print(f"Failed to send welcome email to {employee.email}")
-                
-        except Exception as email_error:
-            print(f"Error sending welcome email: {str(email_error)}")
-            # Don't fail the employee creation if email fails
-        
         return jsonify({
             'message': 'Employee created successfully',
             'employee': employee.to_dict(),
-            'email_sent': email_sent if 'email_sent' in locals() else False
+            'email_queued': True,
+            'email_job_id': email_job.id
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@job_handler('send_welcome_email', sensitive=('password',))
+def send_welcome_email_job(employee_id, admin_name='Admin', password=None):
+    """Job handler: email a new employee a one-time link to set their password (retried on failure)"""
+    # password is ignored: jobs queued by older releases carried it and are scrubbed when done
+    employee = db.session.get(User, employee_id)
+    if employee is None:
+        return {'skipped': 'Employee no longer exists'}
+    
+    # Issued when the email is sent, so a retry or a later password change gets a fresh link
+    token = make_set_password_token(employee)
+    email_sent = send_employee_welcome_email(
+        employee_email=employee.email,
+        employee_name=f"{employee.first_name} {employee.last_name}",
+        username=employee.email,
+        set_password_token=token,
+        admin_name=admin_name
+    )
+    if not email_sent:
+        raise RuntimeError(f'Could not send the welcome email to {employee.email}')
+    return {'sent_to': employee.email}
+
 @employees_bp.route('/<int:employee_id>', methods=['PUT'])
 @jwt_required()
 def update_employee(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can update employees
         if current_user.role != 'admin':
@@ -206,7 +230,7 @@ def update_employee(employee_id):
 def delete_employee(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can delete employees
         if current_user.role != 'admin':
@@ -257,7 +281,7 @@ def delete_employee(employee_id):
 def get_employee_performance(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Check permissions
         if current_user.role not in ['admin', 'manager'] and current_user_id != employee_id:
@@ -269,20 +293,17 @@ def get_employee_performance(employee_id):
             return jsonify({'error': 'Employee not found'}), 404
         
         # Get performance metrics
-        total_leads = Lead.query.filter_by(assigned_employee_id=employee_id).count()
-        closed_won_leads = Lead.query.filter_by(assigned_employee_id=employee_id, stage='closed_won').count()
-        closed_lost_leads = Lead.query.filter_by(assigned_employee_id=employee_id, stage='closed_lost').count()
+        stats = employee_productivity(employee_ids=[employee_id])[0]
+        total_leads = stats['total_leads']
+        closed_won_leads = stats['closed_won']
+        closed_lost_leads = stats['closed_lost']
         
         # Calculate conversion rate
         total_closed = closed_won_leads + closed_lost_leads
         conversion_rate = (closed_won_leads / total_closed * 100) if total_closed > 0 else 0
         
         # Get total sales value
-        total_sales_value = db.session.query(func.sum(PostSale.sale_price)).filter(
-            PostSale.lead_id.in_(
-                db.session.query(Lead.id).filter_by(assigned_employee_id=employee_id, stage='closed_won')
-            )
-        ).scalar() or 0
+        total_sales_value = stats['sales_value']
         
         # Get properties assigned
         assigned_properties = Property.query.filter_by(assigned_agent_id=employee_id).count()
@@ -317,7 +338,7 @@ def get_employee_performance(employee_id):
 def get_employee_roles():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin and manager can view roles
         if current_user.role not in ['admin', 'manager']:
@@ -342,7 +363,7 @@ def get_employee_roles():
 def get_employee_leads(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Check permissions
         if current_user.role not in ['admin', 'manager'] and current_user_id != employee_id:
@@ -385,7 +406,7 @@ def get_employee_leads(employee_id):
 def get_employee_properties(employee_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Check permissions
         if current_user.role not in ['admin', 'manager'] and current_user_id != employee_id:
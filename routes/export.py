@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from database import use_replica
+from models import Property, Lead, PostSale
+from routes.properties import filter_properties
+from routes.leads import filter_leads
+from routes.post_sales import filter_post_sales
+from utils.activity_logger import log_activity
+from utils.user_cache import get_current_user
+
+export_bp = Blueprint('export', __name__)
+
+# entity -> (model, function applying the list endpoint's filters and role scoping)
+EXPORTS = {
+    'properties': (Property, lambda query, args, user_id, role: filter_properties(query, args)),
+    'leads': (Lead, filter_leads),
+    'post-sales': (PostSale, filter_post_sales)
+}
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _stream_rows(query, names, fmt, batch_size):
+    """Yield the export body in chunks of batch_size rows, reading through a server-side cursor"""
+    # The body is generated after the view returns, so the replica is selected here
+    with use_replica():
+        rows = query.yield_per(batch_size)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        if fmt == 'csv':
+            writer.writerow(names)
+        
+        for count, row in enumerate(rows, 1):
+            if fmt == 'csv':
+                writer.writerow([_csv_value(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(names, (_json_value(value) for value in row))), default=str))
+                buffer.write('\n')
+            
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
+
+@export_bp.route('/<entity>.<any(csv, ndjson):fmt>', methods=['GET'])
+@jwt_required()
+def export_entities(entity, fmt):
+    """
+    Stream every row matching the list endpoint's filters as CSV or NDJSON
+    
+    Takes the same query parameters (and applies the same role scoping) as
+    GET /api/<entity>/, plus ?columns=a,b,c to pick columns. Rows are read
+    with yield_per, so memory use does not grow with the table.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        current_user = get_current_user()
+        
+        if entity not in EXPORTS:
+            return jsonify({'error': f'Unknown export: {entity}'}), 404
+        model, apply_filters = EXPORTS[entity]
+        
+        # Columns to export (default: all)
+        table_columns = model.__table__.columns
+        requested = request.args.get('columns')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = [name for name in names if name not in table_columns]
+            if unknown:
+                return jsonify({'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+        else:
+            names = [column.name for column in table_columns]
+        
+        # Build query: plain column tuples, no ORM objects or relationship loads
+        query = apply_filters(model.query, request.args, current_user_id, current_user.role)
+        query = query.with_entities(*[table_columns[name] for name in names]).order_by(model.id)
+        
+        log_activity(
+            user_id=current_user_id,
+            activity_type='data_exported',
+            description=f'Exported {entity} as {fmt.upper()}',
+            entity_type=entity,
+            metadata={'format': fmt, 'filters': request.args.to_dict()}
+        )
+        
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+        filename = f"{entity}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+        return Response(
+            stream_with_context(_stream_rows(query, names, fmt, batch_size)),
+            mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
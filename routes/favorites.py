@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import contains_eager
 from models import Favorite, Property, User, db
 from utils.activity_logger import log_activity
+from utils.search import apply_search
+from utils.pagination import keyset_requested, keyset_page_from_request
 
 favorites_bp = Blueprint('favorites', __name__)
 
@@ -19,36 +22,51 @@ def get_favorites():
         property_type = request.args.get('type', '', type=str)
         sort_by = request.args.get('sort_by', 'created_at', type=str)
         
+        # Sparse fieldset for the embedded property
+        try:
+            fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Build query
         query = Favorite.query.filter_by(user_id=current_user_id)
         
-        # Join with Property for filtering and searching
-        query = query.join(Property)
+        # Join with Property for filtering and searching, and populate
+        # favorite.property from the same join instead of one query per row
+        property_loader = contains_eager(Favorite.property)
+        if fields:
+            property_loader = property_loader.load_only(*Property.field_columns(fields))
+        query = query.join(Property).options(property_loader)
         
         # Apply search filter
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (Property.title.ilike(search_term)) |
-                (Property.location.ilike(search_term)) |
-                (Property.description.ilike(search_term))
-            )
+            query = apply_search(query, Property, search, rank=False)
         
         # Apply property type filter
         if property_type and property_type != 'all':
             query = query.filter(Property.property_type.ilike(f"%{property_type}%"))
         
-        # Apply sorting
+        # Apply sorting (Favorite.id breaks ties so cursors are stable)
         if sort_by == 'price_asc':
-            query = query.order_by(Property.price.asc())
+            order = [(Property.price, False, lambda favorite: favorite.property.price), (Favorite.id, False)]
         elif sort_by == 'price_desc':
-            query = query.order_by(Property.price.desc())
+            order = [(Property.price, True, lambda favorite: favorite.property.price), (Favorite.id, True)]
         elif sort_by == 'area':
-            query = query.order_by(Property.area.desc())
-        elif sort_by == 'created_at':
-            query = query.order_by(Favorite.created_at.desc())
+            order = [(Property.area, True, lambda favorite: favorite.property.area), (Favorite.id, True)]
         else:
-            query = query.order_by(Favorite.created_at.desc())
+            order = [(Favorite.created_at, True), (Favorite.id, True)]
+        query = query.order_by(*[column.desc() if descending else column.asc() for column, descending, *_ in order])
+        
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, order, per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'favorites': [favorite.to_dict(fields) for favorite in results.items],
+                'pagination': results.meta()
+            }), 200
         
         # Paginate results
         pagination = query.paginate(
@@ -59,7 +77,7 @@ def get_favorites():
         
         favorites = []
         for favorite in pagination.items:
-            favorite_data = favorite.to_dict()
+            favorite_data = favorite.to_dict(fields)
             favorites.append(favorite_data)
         
         return jsonify({
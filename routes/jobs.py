@@ -0,0 +1,98 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from database import db
+from models import Job
+from utils.jobs import STATUSES, retry
+from utils.user_cache import get_current_user
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_jobs():
+    try:
+        current_user = get_current_user()
+        
+        # Only admin and manager can see the queue
+        if current_user.role not in ['admin', 'manager']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+        
+        # Get query parameters
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        status = request.args.get('status')
+        name = request.args.get('name')
+        
+        if status and status not in STATUSES:
+            return jsonify({'error': f"status must be one of: {', '.join(STATUSES)}"}), 400
+        
+        # Build query
+        query = Job.query
+        if status:
+            query = query.filter(Job.status == status)
+        if name:
+            query = query.filter(Job.name == name)
+        
+        jobs = query.order_by(Job.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        return jsonify({
+            'jobs': [job.to_dict() for job in jobs.items],
+            'total': jobs.total,
+            'pages': jobs.pages,
+            'current_page': page,
+            'per_page': per_page
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    try:
+        current_user_id = int(get_jwt_identity())
+        current_user = get_current_user()
+        
+        job = db.session.get(Job, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        # Users can follow the jobs they started; admins and managers see all
+        if current_user.role not in ['admin', 'manager'] and job.created_by != current_user_id:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>/retry', methods=['POST'])
+@jwt_required()
+def retry_job(job_id):
+    try:
+        current_user = get_current_user()
+        
+        # Only admin can requeue jobs
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Insufficient permissions'}), 403
+        
+        job = db.session.get(Job, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        try:
+            retry(job)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Job queued',
+            'job': job.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
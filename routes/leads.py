@@ -5,95 +5,109 @@ from models import Lead, Communication, User, Property, Notification
 from datetime import datetime
 from decimal import Decimal
 from utils.activity_logger import log_activity
+from utils.notifier import notify_staff
+from utils.search import apply_lead_search
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.user_cache import get_current_user
 
 leads_bp = Blueprint('leads', __name__)
 
+def filter_leads(query, args, current_user_id, role):
+    """Apply the lead list filters in args and the role scoping (shared by the list and export endpoints)"""
+    search = args.get('search')
+    stage = args.get('stage')
+    source = args.get('source')
+    assigned_employee_id = args.get('assigned_employee_id', type=int)
+    property_id = args.get('property_id', type=int)
+    date_range = args.get('date_range')
+    budget_min = args.get('budget_min', type=float)
+    budget_max = args.get('budget_max', type=float)
+    location = args.get('location')
+    
+    # Filter by assigned employee if not admin/manager
+    if role not in ['admin', 'manager']:
+        query = query.filter(Lead.assigned_employee_id == current_user_id)
+    
+    # Search filter
+    if search:
+        query = apply_lead_search(query, Lead, search)
+    
+    if stage:
+        query = query.filter(Lead.status == stage)
+    if source:
+        query = query.filter(Lead.source == source)
+    if assigned_employee_id:
+        query = query.filter(Lead.assigned_employee_id == assigned_employee_id)
+    if property_id:
+        query = query.filter(Lead.property_id == property_id)
+    if location:
+        query = query.filter(Lead.notes.ilike(f'%{location}%'))
+    if budget_min:
+        query = query.filter(Lead.budget >= budget_min)
+    if budget_max:
+        query = query.filter(Lead.budget <= budget_max)
+    
+    # Date range filter
+    if date_range:
+        from datetime import datetime, timedelta
+        now = datetime.utcnow()
+        
+        if date_range == 'today':
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Lead.created_at >= start_date)
+        elif date_range == 'yesterday':
+            yesterday = now - timedelta(days=1)
+            start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
+            query = query.filter(Lead.created_at >= start_date, Lead.created_at <= end_date)
+        elif date_range == 'this_week':
+            start_date = now - timedelta(days=now.weekday())
+            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Lead.created_at >= start_date)
+        elif date_range == 'last_week':
+            end_date = now - timedelta(days=now.weekday())
+            start_date = end_date - timedelta(days=7)
+            query = query.filter(Lead.created_at >= start_date, Lead.created_at < end_date)
+        elif date_range == 'this_month':
+            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Lead.created_at >= start_date)
+        elif date_range == 'last_month':
+            if now.month == 1:
+                start_date = now.replace(year=now.year-1, month=12, day=1, hour=0, minute=0, second=0, microsecond=0)
+            else:
+                start_date = now.replace(month=now.month-1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            end_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Lead.created_at >= start_date, Lead.created_at < end_date)
+        elif date_range == 'this_year':
+            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Lead.created_at >= start_date)
+    
+    return query
+
 @leads_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_leads():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
-        search = request.args.get('search')
-        stage = request.args.get('stage')
-        source = request.args.get('source')
-        lead_score = request.args.get('lead_score')
-        assigned_employee_id = request.args.get('assigned_employee_id', type=int)
-        property_id = request.args.get('property_id', type=int)
-        date_range = request.args.get('date_range')
-        budget_min = request.args.get('budget_min', type=float)
-        budget_max = request.args.get('budget_max', type=float)
-        location = request.args.get('location')
         
         # Build query
-        query = Lead.query
-        
-        # Filter by assigned employee if not admin/manager
-        if current_user.role not in ['admin', 'manager']:
-            query = query.filter(Lead.assigned_employee_id == current_user_id)
-        
-        # Search filter
-        if search:
-            query = query.filter(
-                (Lead.name.ilike(f'%{search}%')) |
-                (Lead.email.ilike(f'%{search}%')) |
-                (Lead.phone.ilike(f'%{search}%')) |
-                (Lead.notes.ilike(f'%{search}%'))
-            )
-        
-        if stage:
-            query = query.filter(Lead.status == stage)
-        if source:
-            query = query.filter(Lead.source == source)
-        if assigned_employee_id:
-            query = query.filter(Lead.assigned_employee_id == assigned_employee_id)
-        if property_id:
-            query = query.filter(Lead.property_id == property_id)
-        if location:
-            query = query.filter(Lead.notes.ilike(f'%{location}%'))
-        if budget_min:
-            query = query.filter(Lead.budget >= budget_min)
-        if budget_max:
-            query = query.filter(Lead.budget <= budget_max)
-        
-        # Date range filter
-        if date_range:
-            from datetime import datetime, timedelta
-            now = datetime.utcnow()
-            
-            if date_range == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Lead.created_at >= start_date)
-            elif date_range == 'yesterday':
-                yesterday = now - timedelta(days=1)
-                start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-                query = query.filter(Lead.created_at >= start_date, Lead.created_at <= end_date)
-            elif date_range == 'this_week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Lead.created_at >= start_date)
-            elif date_range == 'last_week':
-                end_date = now - timedelta(days=now.weekday())
-                start_date = end_date - timedelta(days=7)
-                query = query.filter(Lead.created_at >= start_date, Lead.created_at < end_date)
-            elif date_range == 'this_month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Lead.created_at >= start_date)
-            elif date_range == 'last_month':
-                if now.month == 1:
-                    start_date = now.replace(year=now.year-1, month=12, day=1, hour=0, minute=0, second=0, microsecond=0)
-                else:
-                    start_date = now.replace(month=now.month-1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                end_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Lead.created_at >= start_date, Lead.created_at < end_date)
-            elif date_range == 'this_year':
-                start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Lead.created_at >= start_date)
+        query = filter_leads(Lead.query, request.args, current_user_id, current_user.role)
+        
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(Lead.created_at, True), (Lead.id, True)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'leads': [lead.to_dict() for lead in results.items],
+                **results.meta()
+            }), 200
         
         # Paginate results
         leads = query.paginate(
@@ -116,7 +130,7 @@ def get_leads():
 def get_lead(lead_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         lead = Lead.query.get(lead_id)
         
@@ -143,7 +157,7 @@ def get_lead(lead_id):
 def create_lead():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin, manager, and sales_agent can create leads
         if current_user.role not in ['admin', 'manager', 'sales_agent']:
@@ -204,21 +218,12 @@ def create_lead():
                 db.session.add(notification)
         
         # Create notification for admins and managers about new lead
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager']),
-            User.id != current_user_id
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='New Lead Created',
-                message=f'New lead created: {lead.first_name} {lead.last_name} from {lead.source}',
-                type='lead',
-                entity_type='lead',
-                entity_id=lead.id
-            )
-            db.session.add(notification)
+        notify_staff(
+            'New Lead Created',
+            f'New lead created: {lead.first_name} {lead.last_name} from {lead.source}',
+            'lead', 'lead', lead.id,
+            exclude=current_user_id
+        )
         
         # Commit all notifications
         db.session.commit()
@@ -237,7 +242,7 @@ def create_lead():
 def update_lead(lead_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         lead = Lead.query.get(lead_id)
         
@@ -361,7 +366,7 @@ def update_lead(lead_id):
 def delete_lead(lead_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can delete leads
         if current_user.role != 'admin':
@@ -410,7 +415,7 @@ def delete_lead(lead_id):
 def add_communication(lead_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         lead = Lead.query.get(lead_id)
         
@@ -506,7 +511,7 @@ def get_lead_sources():
 def get_lead_pipeline():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Build query
         query = Lead.query
@@ -560,21 +565,12 @@ def create_lead_from_website():
         db.session.commit()
         
         # Create notifications for website form submissions
-        # Get all admins and managers to notify them about new website leads
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='New Website Lead',
-                message=f'New lead from website: {lead.first_name} {lead.last_name} ({lead.email})',
-                type='lead',
-                entity_type='lead',
-                entity_id=lead.id
-            )
-            db.session.add(notification)
+        # Notify all admins and managers about new website leads
+        notify_staff(
+            'New Website Lead',
+            f'New lead from website: {lead.first_name} {lead.last_name} ({lead.email})',
+            'lead', 'lead', lead.id
+        )
         
         # Commit notifications
         db.session.commit()
@@ -593,7 +589,7 @@ def create_lead_from_website():
 def get_leads_for_property(property_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Get query parameters
         page = request.args.get('page', 1, type=int)
@@ -1,12 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import db
-from models import Notification, User, Lead
+from models import Notification, Lead
 from datetime import datetime, timedelta
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func, insert, select, text
+from utils.jobs import enqueue, job_handler
+from utils.notifier import notify
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.user_cache import get_current_user
 
 notifications_bp = Blueprint('notifications', __name__)
 
+# Follow-ups are reminded once, when they come within this window
+FOLLOW_UP_WINDOW = timedelta(hours=24)
+
+def _window_opened(next_follow_up):
+    """SQL for next_follow_up - FOLLOW_UP_WINDOW in the database's own date arithmetic"""
+    hours = int(FOLLOW_UP_WINDOW.total_seconds() // 3600)
+    if db.engine.dialect.name == 'sqlite':
+        return func.datetime(next_follow_up, f'-{hours} hours')
+    return func.date_sub(next_follow_up, text(f'INTERVAL {hours} HOUR'))
+
 @notifications_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_notifications():
@@ -27,11 +41,6 @@ def get_notifications():
         # Order by created_at descending (newest first)
         query = query.order_by(Notification.created_at.desc())
         
-        # Paginate results
-        notifications = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
         # Count unread notifications
         unread_count = Notification.query.filter(
             and_(
@@ -40,6 +49,23 @@ def get_notifications():
             )
         ).count()
         
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(Notification.created_at, True), (Notification.id, True)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'notifications': [notification.to_dict() for notification in results.items],
+                'unread_count': unread_count,
+                **results.meta()
+            }), 200
+        
+        # Paginate results
+        notifications = query.paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
         return jsonify({
             'notifications': [notification.to_dict() for notification in notifications.items],
             'total': notifications.total,
@@ -132,7 +158,7 @@ def delete_notification(notification_id):
 def get_follow_up_reminders():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Get leads with follow-up dates in the next 24 hours
         tomorrow = datetime.utcnow() + timedelta(days=1)
@@ -184,20 +210,23 @@ def get_follow_up_reminders():
 def trigger_follow_up_check():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admins can trigger this manually
         if current_user.role != 'admin':
             return jsonify({'error': 'Insufficient permissions'}), 403
         
-        notifications_created = check_follow_up_reminders()
+        # Runs on the job queue; poll GET /api/jobs/<id> for the result
+        job = enqueue('follow_up_reminders', created_by=current_user_id)
+        db.session.commit()
         
         return jsonify({
-            'message': f'Follow-up check completed. Created {notifications_created} notifications.',
-            'notifications_created': notifications_created
-        }), 200
+            'message': 'Follow-up check queued',
+            'job': job.to_dict()
+        }), 202
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Helper function to create notifications
@@ -222,67 +251,84 @@ def create_notification(user_id, title, message, notification_type, entity_type=
 
 # Helper function to create notifications for multiple users
 def create_notification_for_users(user_ids, title, message, notification_type, entity_type=None, entity_id=None):
-    """Helper function to create notifications for multiple users"""
-    notifications = []
-    for user_id in user_ids:
-        notification = create_notification(
-            user_id, title, message, notification_type, entity_type, entity_id
-        )
-        if notification:
-            notifications.append(notification)
-    return notifications
+    """Helper function to create notifications for multiple users (one bulk insert, one commit)"""
+    try:
+        created = notify(user_ids, title, message, notification_type, entity_type, entity_id)
+        db.session.commit()
+        return created
+    except Exception as e:
+        db.session.rollback()
+        print(f"Failed to create notifications: {e}")
+        return 0
 
 # Scheduled task to check for upcoming follow-ups
 def check_follow_up_reminders():
-    """Check for leads with follow-ups due in the next 24 hours and create notifications"""
+    """
+    Create notifications for follow-ups due in the next 24 hours
+    
+    Each follow-up is reminded once: a lead is skipped when its assignee got
+    a follow_up notification for it after the reminder window for the lead's
+    current next_follow_up opened (24 hours before it), however often the
+    job runs. A rescheduled follow-up gets a new reminder once its own
+    window opens. The check is a correlated NOT EXISTS in the same SELECT
+    that finds the due leads, so the job costs one SELECT plus one INSERT
+    per FOLLOW_UP_BATCH_SIZE reminders. Runs from the scheduler
+    (`flask scheduler run`) and, queued by POST /check-follow-ups, on the
+    job queue.
+    """
     try:
-        from datetime import datetime, timedelta
-        
         # Get leads with follow-ups in the next 24 hours
         now = datetime.utcnow()
-        tomorrow = now + timedelta(hours=24)
-        
-        upcoming_follow_ups = Lead.query.filter(
-            and_(
-                Lead.next_follow_up.isnot(None),
-                Lead.next_follow_up <= tomorrow,
-                Lead.next_follow_up >= now,
-                Lead.stage.notin_(['closed_won', 'closed_lost'])
-            )
+        tomorrow = now + FOLLOW_UP_WINDOW
+        
+        # A reminder sent since this follow-up's window opened already covers it
+        reminded = select(Notification.id).where(
+            Notification.type == 'follow_up',
+            Notification.entity_type == 'lead',
+            Notification.entity_id == Lead.id,
+            Notification.user_id == Lead.assigned_employee_id,
+            Notification.created_at >= _window_opened(Lead.next_follow_up)
+        ).exists()
+        
+        due_follow_ups = db.session.query(
+            Lead.id, Lead.name, Lead.assigned_employee_id, Lead.next_follow_up
+        ).filter(
+            Lead.assigned_employee_id.isnot(None),
+            Lead.next_follow_up.isnot(None),
+            Lead.next_follow_up <= tomorrow,
+            Lead.next_follow_up >= now,
+            Lead.status.notin_(['closed_won', 'closed_lost']),
+            ~reminded
         ).all()
         
-        notifications_created = 0
-        for lead in upcoming_follow_ups:
-            # Check if notification already exists for this follow-up
-            existing_notification = Notification.query.filter(
-                and_(
-                    Notification.user_id == lead.assigned_employee_id,
-                    Notification.entity_type == 'lead',
-                    Notification.entity_id == lead.id,
-                    Notification.type == 'follow_up',
-                    Notification.created_at >= now - timedelta(hours=1)  # Within last hour
-                )
-            ).first()
-            
-            if not existing_notification:
-                time_until = lead.next_follow_up - now
-                hours_until = int(time_until.total_seconds() / 3600)
-                
-                if hours_until <= 24:  # Only create notifications for next 24 hours
-                    notification = create_notification(
-                        user_id=lead.assigned_employee_id,
-                        title='Follow-up Due Soon',
-                        message=f'Follow-up with {lead.first_name} {lead.last_name} is due in {hours_until} hours',
-                        notification_type='follow_up',
-                        entity_type='lead',
-                        entity_id=lead.id
-                    )
-                    if notification:
-                        notifications_created += 1
-        
-        print(f"Created {notifications_created} follow-up reminder notifications")
-        return notifications_created
+        rows = []
+        for lead in due_follow_ups:
+            hours_until = int((lead.next_follow_up - now).total_seconds() / 3600)
+            rows.append({
+                'user_id': lead.assigned_employee_id,
+                'title': 'Follow-up Due Soon',
+                'message': f'Follow-up with {lead.name} is due in {hours_until} hours',
+                'type': 'follow_up',
+                'entity_type': 'lead',
+                'entity_id': lead.id,
+                'is_read': False,
+                'created_at': now
+            })
+        
+        batch_size = current_app.config.get('FOLLOW_UP_BATCH_SIZE', 1000)
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(insert(Notification).values(rows[start:start + batch_size]))
+        db.session.commit()
         
-    except Exception as e:
-        print(f"Error checking follow-up reminders: {e}")
-        return 0
+        print(f"Created {len(rows)} follow-up reminder notifications")
+        return len(rows)
+        
+    except Exception:
+        # Re-raised so the scheduler logs it and a queued run is marked failed
+        db.session.rollback()
+        raise
+
+@job_handler('follow_up_reminders')
+def follow_up_reminders_job():
+    """Job handler for POST /check-follow-ups"""
+    return {'notifications_created': check_follow_up_reminders()}
@@ -1,36 +1,55 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import db
-from models import PostSale, Payment, SupportTicket, Lead, Property, User, Notification
+from models import PostSale, Payment, SupportTicket, Lead, Property
 from datetime import datetime
 from decimal import Decimal
 from utils.activity_logger import log_activity
+from utils.notifier import notify_staff
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.user_cache import get_current_user
 
 post_sales_bp = Blueprint('post_sales', __name__)
 
+def filter_post_sales(query, args, current_user_id, role):
+    """Apply the post-sale list filters in args and the role scoping (shared by the list and export endpoints)"""
+    payment_status = args.get('payment_status')
+    
+    # Filter by assigned employee if not admin/manager
+    if role not in ['admin', 'manager']:
+        # Get leads assigned to current user
+        user_leads = db.session.query(Lead.id).filter_by(assigned_employee_id=current_user_id).subquery()
+        query = query.filter(PostSale.lead_id.in_(user_leads))
+    
+    if payment_status:
+        query = query.filter(PostSale.payment_status == payment_status)
+    
+    return query
+
 @post_sales_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_post_sales():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
-        payment_status = request.args.get('payment_status')
         
         # Build query
-        query = PostSale.query
-        
-        # Filter by assigned employee if not admin/manager
-        if current_user.role not in ['admin', 'manager']:
-            # Get leads assigned to current user
-            user_leads = db.session.query(Lead.id).filter_by(assigned_employee_id=current_user_id).subquery()
-            query = query.filter(PostSale.lead_id.in_(user_leads))
-        
-        if payment_status:
-            query = query.filter(PostSale.payment_status == payment_status)
+        query = filter_post_sales(PostSale.query, request.args, current_user_id, current_user.role)
+        
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(PostSale.created_at, True), (PostSale.id, True)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'post_sales': [post_sale.to_dict() for post_sale in results.items],
+                **results.meta()
+            }), 200
         
         # Paginate results
         post_sales = query.paginate(
@@ -53,7 +72,7 @@ def get_post_sales():
 def get_post_sale(post_sale_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         post_sale = PostSale.query.get(post_sale_id)
         
@@ -84,7 +103,7 @@ def get_post_sale(post_sale_id):
 def create_post_sale():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin, manager, and sales_agent can create post-sales
         if current_user.role not in ['admin', 'manager', 'sales_agent']:
@@ -155,21 +174,11 @@ def create_post_sale():
         )
         
         # Create notifications for sale completion
-        # Get all admins and managers
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='Sale Completed',
-                message=f'Property "{property_title}" sold for ₹{post_sale.sale_price:,.0f} to {lead.first_name} {lead.last_name}',
-                type='payment',
-                entity_type='post_sale',
-                entity_id=post_sale.id
-            )
-            db.session.add(notification)
+        notify_staff(
+            'Sale Completed',
+            f'Property "{property_title}" sold for ₹{post_sale.sale_price:,.0f} to {lead.first_name} {lead.last_name}',
+            'payment', 'post_sale', post_sale.id
+        )
         
         # Commit notifications
         db.session.commit()
@@ -188,7 +197,7 @@ def create_post_sale():
 def update_post_sale(post_sale_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         post_sale = PostSale.query.get(post_sale_id)
         
@@ -241,7 +250,7 @@ def update_post_sale(post_sale_id):
 def add_payment(post_sale_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         post_sale = PostSale.query.get(post_sale_id)
         
@@ -300,21 +309,11 @@ def add_payment(post_sale_id):
         )
         
         # Create notifications for payment
-        # Get all admins and managers
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='Payment Added',
-                message=f'{payment.payment_type} payment of ₹{payment.amount:,.0f} added for {property_title}',
-                type='payment',
-                entity_type='payment',
-                entity_id=payment.id
-            )
-            db.session.add(notification)
+        notify_staff(
+            'Payment Added',
+            f'{payment.payment_type} payment of ₹{payment.amount:,.0f} added for {property_title}',
+            'payment', 'payment', payment.id
+        )
         
         # Commit notifications
         db.session.commit()
@@ -333,7 +332,7 @@ def add_payment(post_sale_id):
 def update_payment(post_sale_id, payment_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         payment = Payment.query.filter_by(id=payment_id, post_sale_id=post_sale_id).first()
         
@@ -376,27 +375,17 @@ def update_payment(post_sale_id, payment_id):
         
         # Create notification for payment status change (especially when marked as paid)
         if old_status != payment.status and payment.status == 'paid':
-            # Get all admins and managers
-            admins_and_managers = User.query.filter(
-                User.role.in_(['admin', 'manager'])
-            ).all()
-            
             # Get property and lead info for notification
             post_sale = PostSale.query.get(post_sale_id)
             property = Property.query.get(post_sale.property_id) if post_sale else None
             lead = Lead.query.get(post_sale.lead_id) if post_sale else None
             property_title = property.title if property else f"Property ID {post_sale.property_id}"
             
-            for admin_manager in admins_and_managers:
-                notification = Notification(
-                    user_id=admin_manager.id,
-                    title='Payment Received',
-                    message=f'Payment of ₹{payment.amount:,.0f} received for {property_title} from {lead.first_name} {lead.last_name}' if lead else f'Payment of ₹{payment.amount:,.0f} received for {property_title}',
-                    type='payment',
-                    entity_type='payment',
-                    entity_id=payment.id
-                )
-                db.session.add(notification)
+            notify_staff(
+                'Payment Received',
+                f'Payment of ₹{payment.amount:,.0f} received for {property_title} from {lead.first_name} {lead.last_name}' if lead else f'Payment of ₹{payment.amount:,.0f} received for {property_title}',
+                'payment', 'payment', payment.id
+            )
             
             # Commit notifications
             db.session.commit()
@@ -415,7 +404,7 @@ def update_payment(post_sale_id, payment_id):
 def create_support_ticket(post_sale_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         post_sale = PostSale.query.get(post_sale_id)
         
@@ -483,7 +472,7 @@ def create_support_ticket(post_sale_id):
 def update_support_ticket(post_sale_id, ticket_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         support_ticket = SupportTicket.query.filter_by(id=ticket_id, post_sale_id=post_sale_id).first()
         
@@ -1,14 +1,112 @@
-from flask import Blueprint, request, jsonify
+import os
+import shutil
+from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from database import db
-from models import Property, User, Notification
+from database import db, use_replica
+from models import Property, ImportJob
 from datetime import datetime
 from decimal import Decimal
 import json
 from utils.activity_logger import log_activity
+from utils.notifier import notify_staff
+from utils.feed_cache import get_feed_page
+from utils.search import apply_search
+from utils.pagination import keyset_requested, keyset_page_from_request
+from utils.user_cache import get_current_user
+from utils.property_import import FORMATS, property_row, reject_path, start_import, upload_path
 
 properties_bp = Blueprint('properties', __name__)
 
+FEED_MAX_PER_PAGE = 100
+
+def filter_properties(query, args):
+    """Apply the property list filters in args (shared by the list and export endpoints)"""
+    search = args.get('search')
+    property_type = args.get('type')
+    location = args.get('location')
+    status = args.get('status')
+    min_price = args.get('min_price', type=float)
+    max_price = args.get('max_price', type=float)
+    price_range = args.get('price_range')
+    date_range = args.get('date_range')
+    bedrooms = args.get('bedrooms')
+    
+    # Search filter
+    if search:
+        query = apply_search(query, Property, search)
+    
+    # Property type filter
+    if property_type:
+        query = query.filter(Property.property_type == property_type)
+    
+    # Location filter
+    if location:
+        query = query.filter(Property.location.ilike(f'%{location}%'))
+    
+    # Status filter
+    if status:
+        query = query.filter(Property.status == status)
+    
+    # Price range filter
+    if price_range:
+        if price_range == '0-500000':
+            query = query.filter(Property.price >= 0, Property.price <= 500000)
+        elif price_range == '500000-1000000':
+            query = query.filter(Property.price >= 500000, Property.price <= 1000000)
+        elif price_range == '1000000-2500000':
+            query = query.filter(Property.price >= 1000000, Property.price <= 2500000)
+        elif price_range == '2500000-5000000':
+            query = query.filter(Property.price >= 2500000, Property.price <= 5000000)
+        elif price_range == '5000000+':
+            query = query.filter(Property.price >= 5000000)
+    
+    # Min/Max price filters (for custom ranges)
+    if min_price:
+        query = query.filter(Property.price >= min_price)
+    if max_price:
+        query = query.filter(Property.price <= max_price)
+    
+    # Bedrooms filter
+    if bedrooms:
+        query = query.filter(Property.bedrooms == bedrooms)
+    
+    # Date range filter
+    if date_range:
+        from datetime import datetime, timedelta
+        now = datetime.utcnow()
+        
+        if date_range == 'today':
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Property.created_at >= start_date)
+        elif date_range == 'yesterday':
+            yesterday = now - timedelta(days=1)
+            start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
+            query = query.filter(Property.created_at >= start_date, Property.created_at <= end_date)
+        elif date_range == 'this_week':
+            start_date = now - timedelta(days=now.weekday())
+            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Property.created_at >= start_date)
+        elif date_range == 'last_week':
+            end_date = now - timedelta(days=now.weekday())
+            start_date = end_date - timedelta(days=7)
+            query = query.filter(Property.created_at >= start_date, Property.created_at < end_date)
+        elif date_range == 'this_month':
+            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Property.created_at >= start_date)
+        elif date_range == 'last_month':
+            if now.month == 1:
+                start_date = now.replace(year=now.year-1, month=12, day=1, hour=0, minute=0, second=0, microsecond=0)
+            else:
+                start_date = now.replace(month=now.month-1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            end_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Property.created_at >= start_date, Property.created_at < end_date)
+        elif date_range == 'this_year':
+            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            query = query.filter(Property.created_at >= start_date)
+    
+    return query
+
 @properties_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_properties():
@@ -16,96 +114,27 @@ def get_properties():
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
-        search = request.args.get('search')
-        property_type = request.args.get('type')
-        location = request.args.get('location')
-        status = request.args.get('status')
-        min_price = request.args.get('min_price', type=float)
-        max_price = request.args.get('max_price', type=float)
-        price_range = request.args.get('price_range')
-        date_range = request.args.get('date_range')
-        bedrooms = request.args.get('bedrooms')
+        
+        # Sparse fieldset (projection name or comma-separated field list)
+        try:
+            fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Build query
-        query = Property.query
-        
-        # Search filter
-        if search:
-            query = query.filter(
-                (Property.title.ilike(f'%{search}%')) |
-                (Property.location.ilike(f'%{search}%')) |
-                (Property.description.ilike(f'%{search}%'))
-            )
+        query = Property.query.options(*Property.load_options(fields))
+        query = filter_properties(query, request.args)
         
-        # Property type filter
-        if property_type:
-            query = query.filter(Property.property_type == property_type)
-        
-        # Location filter
-        if location:
-            query = query.filter(Property.location.ilike(f'%{location}%'))
-        
-        # Status filter
-        if status:
-            query = query.filter(Property.status == status)
-        
-        # Price range filter
-        if price_range:
-            if price_range == '0-500000':
-                query = query.filter(Property.price >= 0, Property.price <= 500000)
-            elif price_range == '500000-1000000':
-                query = query.filter(Property.price >= 500000, Property.price <= 1000000)
-            elif price_range == '1000000-2500000':
-                query = query.filter(Property.price >= 1000000, Property.price <= 2500000)
-            elif price_range == '2500000-5000000':
-                query = query.filter(Property.price >= 2500000, Property.price <= 5000000)
-            elif price_range == '5000000+':
-                query = query.filter(Property.price >= 5000000)
-        
-        # Min/Max price filters (for custom ranges)
-        if min_price:
-            query = query.filter(Property.price >= min_price)
-        if max_price:
-            query = query.filter(Property.price <= max_price)
-        
-        # Bedrooms filter
-        if bedrooms:
-            query = query.filter(Property.bedrooms == bedrooms)
-        
-        # Date range filter
-        if date_range:
-            from datetime import datetime, timedelta
-            now = datetime.utcnow()
-            
-            if date_range == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Property.created_at >= start_date)
-            elif date_range == 'yesterday':
-                yesterday = now - timedelta(days=1)
-                start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-                query = query.filter(Property.created_at >= start_date, Property.created_at <= end_date)
-            elif date_range == 'this_week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Property.created_at >= start_date)
-            elif date_range == 'last_week':
-                end_date = now - timedelta(days=now.weekday())
-                start_date = end_date - timedelta(days=7)
-                query = query.filter(Property.created_at >= start_date, Property.created_at < end_date)
-            elif date_range == 'this_month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Property.created_at >= start_date)
-            elif date_range == 'last_month':
-                if now.month == 1:
-                    start_date = now.replace(year=now.year-1, month=12, day=1, hour=0, minute=0, second=0, microsecond=0)
-                else:
-                    start_date = now.replace(month=now.month-1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                end_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Property.created_at >= start_date, Property.created_at < end_date)
-            elif date_range == 'this_year':
-                start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Property.created_at >= start_date)
+        # Cursor pagination (?after=<cursor>): no OFFSET scan, total only with ?count=true
+        if keyset_requested():
+            try:
+                results = keyset_page_from_request(query, [(Property.created_at, True), (Property.id, True)], per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'properties': [property.to_dict(fields) for property in results.items],
+                **results.meta()
+            }), 200
         
         # Paginate results
         properties = query.paginate(
@@ -113,7 +142,7 @@ def get_properties():
         )
         
         return jsonify({
-            'properties': [property.to_dict() for property in properties.items],
+            'properties': [property.to_dict(fields) for property in properties.items],
             'total': properties.total,
             'pages': properties.pages,
             'current_page': page,
@@ -127,13 +156,18 @@ def get_properties():
 @jwt_required()
 def get_property(property_id):
     try:
-        property = Property.query.get(property_id)
+        try:
+            fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        property = Property.query.options(*Property.load_options(fields)).get(property_id)
         
         if not property:
             return jsonify({'error': 'Property not found'}), 404
         
         return jsonify({
-            'property': property.to_dict()
+            'property': property.to_dict(fields)
         }), 200
         
     except Exception as e:
@@ -144,7 +178,7 @@ def get_property(property_id):
 def create_property():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin, manager, and sales_agent can create properties
         if current_user.role not in ['admin', 'manager', 'sales_agent']:
@@ -198,21 +232,12 @@ def create_property():
         )
         
         # Create notifications for new property
-        # Get all admins and managers to notify them about new property
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='New Property Added',
-                message=f'New property listed: {property.title} in {property.location} (₹{property.price:,.0f})',
-                type='property',
-                entity_type='property',
-                entity_id=property.id
-            )
-            db.session.add(notification)
+        # Notify all admins and managers about the new property
+        notify_staff(
+            'New Property Added',
+            f'New property listed: {property.title} in {property.location} (₹{property.price:,.0f})',
+            'property', 'property', property.id
+        )
         
         # Commit notifications
         db.session.commit()
@@ -231,7 +256,7 @@ def create_property():
 def update_property(property_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin, manager, and sales_agent can update properties
         if current_user.role not in ['admin', 'manager', 'sales_agent']:
@@ -290,36 +315,21 @@ def update_property(property_id):
         db.session.commit()
         
         # Create notifications for important property changes
-        # Get all admins and managers
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
         # Check for status change
         if old_status != property.status:
-            for admin_manager in admins_and_managers:
-                notification = Notification(
-                    user_id=admin_manager.id,
-                    title='Property Status Changed',
-                    message=f'Property "{property.title}" status changed from {old_status} to {property.status}',
-                    type='property',
-                    entity_type='property',
-                    entity_id=property.id
-                )
-                db.session.add(notification)
+            notify_staff(
+                'Property Status Changed',
+                f'Property "{property.title}" status changed from {old_status} to {property.status}',
+                'property', 'property', property.id
+            )
         
         # Check for price change
         if old_price != property.price:
-            for admin_manager in admins_and_managers:
-                notification = Notification(
-                    user_id=admin_manager.id,
-                    title='Property Price Updated',
-                    message=f'Property "{property.title}" price updated from ₹{old_price:,.0f} to ₹{property.price:,.0f}',
-                    type='property',
-                    entity_type='property',
-                    entity_id=property.id
-                )
-                db.session.add(notification)
+            notify_staff(
+                'Property Price Updated',
+                f'Property "{property.title}" price updated from ₹{old_price:,.0f} to ₹{property.price:,.0f}',
+                'property', 'property', property.id
+            )
         
         # Check for other important changes (title, location, etc.)
         important_fields = ['title', 'location', 'property_type']
@@ -328,16 +338,11 @@ def update_property(property_id):
                 changes_made.append(field)
         
         if changes_made:
-            for admin_manager in admins_and_managers:
-                notification = Notification(
-                    user_id=admin_manager.id,
-                    title='Property Details Updated',
-                    message=f'Property "{property.title}" details updated by {current_user.first_name} {current_user.last_name}',
-                    type='property',
-                    entity_type='property',
-                    entity_id=property.id
-                )
-                db.session.add(notification)
+            notify_staff(
+                'Property Details Updated',
+                f'Property "{property.title}" details updated by {current_user.first_name} {current_user.last_name}',
+                'property', 'property', property.id
+            )
         
         # Commit notifications
         db.session.commit()
@@ -356,7 +361,7 @@ def update_property(property_id):
 def delete_property(property_id):
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin can delete properties
         if current_user.role != 'admin':
@@ -432,11 +437,49 @@ def get_locations():
 def get_website_visible_properties():
     try:
         # This endpoint doesn't require authentication as it's for website integration
-        properties = Property.query.filter_by(is_website_visible=True, status='available').all()
-        
-        return jsonify({
-            'properties': [property.to_dict() for property in properties]
-        }), 200
+        try:
+            fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Pagination is optional; without page/per_page the whole feed is returned
+        page = request.args.get('page', type=int)
+        if page is not None and page < 1:
+            return jsonify({'error': 'page must be 1 or more'}), 400
+        per_page = request.args.get('per_page', 50, type=int) if page else None
+        if per_page is not None:
+            # Every (page, per_page) is a cache entry: keep the key space small
+            per_page = max(1, min(per_page, FEED_MAX_PER_PAGE))
+        
+        def build_feed():
+            query = Property.query.options(*Property.load_options(fields)).filter_by(
+                is_website_visible=True, status='available'
+            ).order_by(Property.id)
+            
+            if page:
+                properties = query.paginate(page=page, per_page=per_page, error_out=False)
+                payload = {
+                    'properties': [property.to_dict(fields) for property in properties.items],
+                    'total': properties.total,
+                    'pages': properties.pages,
+                    'current_page': page,
+                    'per_page': per_page
+                }
+            else:
+                payload = {
+                    'properties': [property.to_dict(fields) for property in query.all()]
+                }
+            return jsonify(payload).get_data()
+        
+        # Served from the read replica when one is configured
+        with use_replica():
+            feed = get_feed_page((fields, page, per_page), build_feed)
+        
+        response = current_app.response_class(feed.body, mimetype='application/json')
+        response.set_etag(feed.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('FEED_CACHE_MAX_AGE', 60)
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -446,7 +489,7 @@ def get_website_visible_properties():
 def bulk_upload_properties():
     try:
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         # Only admin and manager can bulk upload
         if current_user.role not in ['admin', 'manager']:
@@ -462,30 +505,8 @@ def bulk_upload_properties():
         
         for i, property_data in enumerate(data['properties']):
             try:
-                # Validate required fields
-                required_fields = ['title', 'property_type', 'location', 'price']
-                for field in required_fields:
-                    if not property_data.get(field):
-                        errors.append(f'Row {i+1}: {field} is required')
-                        continue
-                
-                # Create property
-                property = Property(
-                    title=property_data['title'],
-                    description=property_data.get('description'),
-                    property_type=property_data['property_type'],
-                    location=property_data['location'],
-                    address=property_data.get('address'),
-                    price=Decimal(str(property_data['price'])),
-                    area=Decimal(str(property_data['area'])) if property_data.get('area') else None,
-                    bedrooms=property_data.get('bedrooms'),
-                    bathrooms=property_data.get('bathrooms'),
-                    floors=property_data.get('floors'),
-                    direction=property_data.get('direction'),
-                    status=property_data.get('status', 'available'),
-                    assigned_agent_id=property_data.get('assigned_agent_id'),
-                    is_website_visible=property_data.get('is_website_visible', True)
-                )
+                # Validate and convert the row (rows with errors are not created)
+                property = Property(**property_row(property_data))
                 
                 db.session.add(property)
                 created_properties.append(property)
@@ -510,3 +531,117 @@ def bulk_upload_properties():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_properties():
+    """
+    Start a background import of a CSV or NDJSON listing feed
+    
+    Accepts a multipart upload (field 'file') or the raw file as the request
+    body; the format comes from ?format=, the file extension or the
+    Content-Type. Returns 202 with the import job to poll.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        current_user = get_current_user()
+        
+        # Only admin and manager can import properties
+        if current_user.role not in ['admin', 'manager']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+        
+        upload = request.files.get('file')
+        filename = upload.filename if upload else request.args.get('filename')
+        
+        # Work out the format
+        fmt = request.args.get('format')
+        if not fmt and filename and '.' in filename:
+            fmt = filename.rsplit('.', 1)[1].lower()
+        if not fmt:
+            content_type = upload.mimetype if upload else request.mimetype
+            fmt = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}.get(content_type)
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Upload a .csv or .ndjson file (or pass ?format=csv|ndjson)'}), 400
+        
+        job = ImportJob(entity='properties', format=fmt, filename=filename, created_by=current_user_id)
+        db.session.add(job)
+        db.session.commit()
+        
+        # Save the upload to disk without reading it into memory
+        os.makedirs(current_app.config['IMPORT_DIR'], exist_ok=True)
+        if upload:
+            upload.save(upload_path(job))
+        else:
+            with open(upload_path(job), 'wb') as destination:
+                shutil.copyfileobj(request.stream, destination, 1024 * 1024)
+        
+        start_import(job)
+        db.session.commit()
+        
+        log_activity(
+            user_id=current_user_id,
+            activity_type='properties_imported',
+            description=f'Started property import #{job.id}' + (f' from {filename}' if filename else ''),
+            entity_type='import_job',
+            entity_id=job.id
+        )
+        
+        return jsonify({
+            'message': 'Import started',
+            'job': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _get_import_job(job_id):
+    """Import job visible to the current user, or an error response"""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_current_user()
+    
+    if current_user.role not in ['admin', 'manager']:
+        return None, (jsonify({'error': 'Insufficient permissions'}), 403)
+    
+    job = db.session.get(ImportJob, job_id)
+    if not job or (current_user.role != 'admin' and job.created_by != current_user_id):
+        return None, (jsonify({'error': 'Import job not found'}), 404)
+    return job, None
+
+@properties_bp.route('/import/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_import_job(job_id):
+    try:
+        job, error = _get_import_job(job_id)
+        if error:
+            return error
+        
+        job_data = job.to_dict()
+        if job.rejected_rows:
+            job_data['rejects_url'] = f'/api/properties/import/{job.id}/rejects'
+        
+        return jsonify({'job': job_data}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/import/<int:job_id>/rejects', methods=['GET'])
+@jwt_required()
+def download_import_rejects(job_id):
+    try:
+        job, error = _get_import_job(job_id)
+        if error:
+            return error
+        
+        if not os.path.exists(reject_path(job)):
+            return jsonify({'error': 'No reject file for this import'}), 404
+        
+        return send_file(
+            reject_path(job),
+            mimetype='text/csv',
+            as_attachment=True,
+            download_name=f'import-{job.id}-rejects.csv'
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
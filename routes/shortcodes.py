@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, PropertyShortcode, Property, User
 from utils.activity_logger import log_activity
+from utils.notifier import notify_staff
 import random
 import string
 from datetime import datetime
@@ -168,8 +169,14 @@ def get_embed_data(shortcode):
         # Get filters
         filters = shortcode_obj.filters or {}
         
+        # Sparse fieldset requested by the widget
+        try:
+            fields = Property.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Build query
-        query = Property.query
+        query = Property.query.options(*Property.load_options(fields))
         
         # Apply filters
         if filters.get('status'):
@@ -210,7 +217,7 @@ def get_embed_data(shortcode):
             'success': True,
             'shortcode': shortcode_obj.shortcode,
             'name': shortcode_obj.name,
-            'properties': [property.to_dict() for property in properties],
+            'properties': [property.to_dict(fields) for property in properties],
             'display_options': display_options,
             'total_count': len(properties)
         })
@@ -292,21 +299,11 @@ def track_embed_lead(shortcode):
         db.session.commit()
         
         # Create notifications for embed widget leads
-        from models import Notification, User
-        admins_and_managers = User.query.filter(
-            User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        for admin_manager in admins_and_managers:
-            notification = Notification(
-                user_id=admin_manager.id,
-                title='New Website Lead',
-                message=f'New lead from website embed: {first_name} {last_name} ({lead_email})',
-                type='lead',
-                entity_type='lead',
-                entity_id=new_lead.id
-            )
-            db.session.add(notification)
+        notify_staff(
+            'New Website Lead',
+            f'New lead from website embed: {first_name} {last_name} ({lead_email})',
+            'lead', 'lead', new_lead.id
+        )
         
         # Commit notifications
         db.session.commit()
@@ -396,7 +393,7 @@ def get_embed_widget(shortcode):
                 }}
                 
                 // Load properties
-                fetch('http://localhost:5000/api/embed/{shortcode}')
+                fetch('http://localhost:5000/api/embed/{shortcode}?fields=card,description')
                     .then(response => response.json())
                     .then(data => {{
                         if (data.success) {{
@@ -436,8 +433,9 @@ def get_embed_widget(shortcode):
                     card.className = 'property-card bg-white/80 backdrop-blur-sm rounded-2xl shadow-sm border border-gray-200/50 overflow-hidden';
                     
                     // Handle image with fallback
-                    const imageHtml = property.images && property.images.length > 0 
-                        ? `<img src="${{property.images[0].startsWith('http') ? property.images[0] : 'http://localhost:5000' + property.images[0]}}" 
+                    const imageUrl = property.cover_image ? property.cover_image.card : (property.images && property.images[0]);
+                    const imageHtml = imageUrl 
+                        ? `<img src="${{imageUrl.startsWith('http') ? imageUrl : 'http://localhost:5000' + imageUrl}}" 
                                  alt="${{property.title}}" 
                                  class="h-full w-full object-cover"
                                  onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
@@ -531,7 +529,7 @@ def get_embed_widget(shortcode):
                 function showPropertyDetails(propertyId) {{
                     // Create a modal or redirect to property details
                     // For now, we'll show an alert with property info
-                    fetch('http://localhost:5000/api/embed/{shortcode}')
+                    fetch('http://localhost:5000/api/embed/{shortcode}?fields=card,description')
                         .then(response => response.json())
                         .then(data => {{
                             if (data.success) {{
@@ -549,7 +547,7 @@ def get_embed_widget(shortcode):
                 
                 function contactProperty(propertyId, contactType) {{
                     // Get property details for contact info
-                    fetch('http://localhost:5000/api/embed/{shortcode}')
+                    fetch('http://localhost:5000/api/embed/{shortcode}?fields=card,description')
                         .then(response => response.json())
                         .then(data => {{
                             if (data.success) {{
@@ -671,7 +669,7 @@ def get_embed_widget(shortcode):
                 
                 function showLeadForm(propertyId) {{
                     // Get property details
-                    fetch('http://localhost:5000/api/embed/{shortcode}')
+                    fetch('http://localhost:5000/api/embed/{shortcode}?fields=card,description')
                         .then(response => response.json())
                         .then(data => {{
                             if (data.success) {{
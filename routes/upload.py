@@ -1,17 +1,22 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-import os
-import uuid
+from werkzeug.wsgi import get_input_stream
+import re
 from datetime import datetime
+from database import db
+from models import StoredFile
+from utils.images import image_error
+from utils.jobs import enqueue
+from utils.storage import get_storage
+from utils.stored_files import register_file, store_upload
+from utils.upload_stream import receive_files
+from utils.uploads import ALLOWED_EXTENSIONS, MAX_UPLOAD_SIZE, RASTER_EXTENSIONS, URL_PREFIX, allowed_file, image_variants
 
 upload_bp = Blueprint('upload', __name__)
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'svg'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
 
 @upload_bp.route('/image', methods=['POST'])
 @jwt_required()
@@ -38,28 +43,28 @@ def upload_image():
         file_size = file.tell()
         file.seek(0)  # Reset to beginning
         
-        if file_size > 10 * 1024 * 1024:  # 10MB
+        if file_size > MAX_UPLOAD_SIZE:
             return jsonify({'error': 'File too large. Maximum size is 10MB'}), 400
         
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.root_path, 'uploads', 'images')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
+        # Save file under its content hash (an identical upload reuses the stored file)
         file_extension = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        stored, deduplicated = store_upload(file.stream, file_extension, file.mimetype, current_user_id)
         
-        # Save file
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
+        # Render the resized variants in the background
+        if not deduplicated:
+            enqueue('image_variants', {'filename': stored.filename}, created_by=current_user_id)
+        db.session.commit()
         
         # Generate URL
-        image_url = f"/uploads/images/{unique_filename}"
+        image_url = f"{URL_PREFIX}{stored.filename}"
         
         return jsonify({
             'message': 'Image uploaded successfully',
             'url': image_url,
-            'filename': unique_filename
+            'filename': stored.filename,
+            'sha256': stored.sha256,
+            'deduplicated': deduplicated,
+            'variants': image_variants(image_url)
         }), 200
         
     except Exception as e:
@@ -82,10 +87,6 @@ def upload_multiple_images():
         
         uploaded_urls = []
         
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.root_path, 'uploads', 'images')
-        os.makedirs(upload_dir, exist_ok=True)
-        
         for file in files:
             # Check if file is allowed
             if not allowed_file(file.filename):
@@ -96,21 +97,21 @@ def upload_multiple_images():
             file_size = file.tell()
             file.seek(0)  # Reset to beginning
             
-            if file_size > 10 * 1024 * 1024:  # 10MB
+            if file_size > MAX_UPLOAD_SIZE:
                 continue  # Skip large files
             
-            # Generate unique filename
+            # Save file under its content hash (an identical upload reuses the stored file)
             file_extension = file.filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            
-            # Save file
-            file_path = os.path.join(upload_dir, unique_filename)
-            file.save(file_path)
+            stored, deduplicated = store_upload(file.stream, file_extension, file.mimetype, current_user_id)
+            if not deduplicated:
+                enqueue('image_variants', {'filename': stored.filename}, created_by=current_user_id)
             
             # Generate URL
-            image_url = f"/uploads/images/{unique_filename}"
+            image_url = f"{URL_PREFIX}{stored.filename}"
             uploaded_urls.append(image_url)
         
+        db.session.commit()
+        
         return jsonify({
             'message': f'{len(uploaded_urls)} images uploaded successfully',
             'urls': uploaded_urls
@@ -119,12 +120,85 @@ def upload_multiple_images():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@upload_bp.route('/delete', methods=['DELETE'])
+@upload_bp.route('/stream', methods=['POST'])
 @jwt_required()
-def delete_image():
+def upload_stream():
+    """
+    Upload many images in one multipart request, streamed to storage
+    
+    Files ('files' field) are written to storage as they arrive instead of
+    being buffered with the rest of the form, and each one gets its own
+    status: uploaded, deduplicated or rejected (with the reason).
+    """
     try:
         current_user_id = int(get_jwt_identity())
         
+        # Refuse oversized bodies before reading any of it (chunked bodies
+        # are cut off at the same limit while they are read)
+        max_length = current_app.config['UPLOAD_MAX_CONTENT_LENGTH']
+        if request.content_length is not None and request.content_length > max_length:
+            return jsonify({'error': f'Upload too large. Maximum is {max_length // (1024 * 1024)}MB per request'}), 413
+        body = get_input_stream(request.environ, max_content_length=max_length)
+        
+        boundary = request.mimetype_params.get('boundary')
+        if request.mimetype != 'multipart/form-data' or not boundary:
+            return jsonify({'error': 'Send the files as multipart/form-data'}), 400
+        
+        try:
+            received = receive_files(
+                body,
+                boundary,
+                get_storage(),
+                max_files=current_app.config['UPLOAD_MAX_FILES'],
+                workers=current_app.config['UPLOAD_WORKERS']
+            )
+        except ValueError:
+            return jsonify({'error': 'Malformed multipart body'}), 400
+        except RequestEntityTooLarge:
+            return jsonify({
+                'error': f"Upload too large. At most {current_app.config['UPLOAD_MAX_FILES']} files "
+                         f"and {max_length // (1024 * 1024)}MB per request"
+            }), 413
+        
+        if not received:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        # Register the stored files (one transaction for the whole batch)
+        results = []
+        for item in received:
+            if item.error:
+                results.append({'filename': item.filename, 'status': 'rejected', 'error': item.error})
+                continue
+            saved = item.saved
+            stored = register_file(saved.filename, saved.sha256, saved.size, item.content_type, current_user_id)
+            if not saved.deduplicated:
+                enqueue('image_variants', {'filename': stored.filename}, created_by=current_user_id)
+            image_url = f"{URL_PREFIX}{stored.filename}"
+            results.append({
+                'filename': item.filename,
+                'status': 'deduplicated' if saved.deduplicated else 'uploaded',
+                'url': image_url,
+                'sha256': stored.sha256,
+                'size': stored.size,
+                'variants': image_variants(image_url)
+            })
+        db.session.commit()
+        
+        urls = [result['url'] for result in results if 'url' in result]
+        return jsonify({
+            'message': f'{len(urls)} of {len(results)} images uploaded successfully',
+            'urls': urls,
+            'files': results
+        }), 200 if urls else 400
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/delete', methods=['DELETE'])
+@jwt_required()
+def delete_image():
+    try:
         data = request.get_json()
         image_url = data.get('url')
         
@@ -138,15 +212,125 @@ def delete_image():
         if not filename or '..' in filename:
             return jsonify({'error': 'Invalid filename'}), 400
         
-        # Delete file
-        upload_dir = os.path.join(current_app.root_path, 'uploads', 'images')
-        file_path = os.path.join(upload_dir, filename)
-        
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return jsonify({'message': 'Image deleted successfully'}), 200
-        else:
+        if not get_storage().exists(filename):
             return jsonify({'error': 'File not found'}), 404
         
+        # Identical uploads share one file, possibly with another user's unsaved
+        # form, so nothing is deleted here: `flask uploads gc` removes the file
+        # (and its variants) once no property references it and its grace period is over
+        return jsonify({'message': 'Image removed successfully'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/presign', methods=['POST'])
+@jwt_required()
+def presign_upload():
+    """
+    Start a direct upload to object storage
+    
+    The client sends the file's name, MIME type, size and SHA-256 (hex) and
+    gets back a presigned PUT it sends the bytes to; S3 rejects any body
+    that doesn't match the checksum. Content that is already stored needs no
+    upload at all (deduplicated). Finish with POST /complete.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        data = request.get_json() or {}
+        filename = data.get('filename', '')
+        sha256 = str(data.get('sha256', '')).lower()
+        size = data.get('size')
+        
+        if not allowed_file(filename):
+            return jsonify({'error': 'File type not allowed. Allowed types: PNG, JPG, JPEG, GIF, WEBP, SVG'}), 400
+        if not SHA256_PATTERN.match(sha256):
+            return jsonify({'error': 'sha256 must be the hex SHA-256 of the file'}), 400
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'size is required'}), 400
+        if size > MAX_UPLOAD_SIZE:
+            return jsonify({'error': 'File too large. Maximum size is 10MB'}), 400
+        
+        storage = get_storage()
+        if not storage.supports_presigned_uploads:
+            return jsonify({
+                'error': 'Direct uploads need S3 storage; POST the file to /api/upload/image instead'
+            }), 400
+        
+        file_extension = filename.rsplit('.', 1)[1].lower()
+        key = f'{sha256}.{file_extension}'
+        image_url = f"{URL_PREFIX}{key}"
+        
+        # Already stored: nothing to upload (registering it restarts gc's grace period)
+        if storage.exists(key):
+            register_file(key, sha256, storage.size(key), data.get('content_type'), current_user_id)
+            db.session.commit()
+            return jsonify({
+                'key': key,
+                'url': image_url,
+                'deduplicated': True
+            }), 200
+        
+        content_type = data.get('content_type') or 'application/octet-stream'
+        return jsonify({
+            'key': key,
+            'url': image_url,
+            'deduplicated': False,
+            'upload': storage.presign_upload(key, content_type, size, sha256)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/complete', methods=['POST'])
+@jwt_required()
+def complete_upload():
+    """Register a file uploaded with a presigned PUT and queue its variants"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        data = request.get_json() or {}
+        key = data.get('key', '')
+        
+        sha256, _, file_extension = key.partition('.')
+        if not SHA256_PATTERN.match(sha256) or file_extension not in ALLOWED_EXTENSIONS:
+            return jsonify({'error': 'Invalid key'}), 400
+        
+        storage = get_storage()
+        size = storage.size(key)
+        if size is None:
+            return jsonify({'error': 'The file has not been uploaded'}), 400
+        if size > MAX_UPLOAD_SIZE:
+            storage.delete(key)
+            return jsonify({'error': 'File too large. Maximum size is 10MB'}), 400
+        
+        existing = StoredFile.query.filter_by(filename=key).first()
+        
+        # Check what the client PUT, as the other upload paths do (a
+        # registered key was checked when it was first uploaded)
+        if existing is None and file_extension in RASTER_EXTENSIONS:
+            with storage.open(key) as uploaded:
+                error = image_error(uploaded)
+            if error:
+                storage.delete(key)
+                return jsonify({'error': error}), 400
+        
+        stored = register_file(key, sha256, size, data.get('content_type'), current_user_id)
+        if existing is None:
+            enqueue('image_variants', {'filename': key}, created_by=current_user_id)
+        db.session.commit()
+        
+        image_url = f"{URL_PREFIX}{key}"
+        return jsonify({
+            'message': 'Image uploaded successfully',
+            'url': image_url,
+            'filename': key,
+            'sha256': stored.sha256,
+            'deduplicated': existing is not None,
+            'variants': image_variants(image_url)
+        }), 200
+        
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
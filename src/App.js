@@ -6,6 +6,7 @@ import { NotificationProvider } from './contexts/NotificationContext';
 import Layout from './components/Layout/Layout';
 import ProtectedRoute from './components/Common/ProtectedRoute';
 import Login from './pages/Auth/Login';
+import SetPassword from './pages/Auth/SetPassword';
 import Properties from './pages/Properties/Properties';
 import PropertyForm from './pages/Properties/PropertyForm';
 import PropertyEditForm from './pages/Properties/PropertyEditForm';
@@ -68,6 +69,8 @@ function App() {
               } 
             />
             
+            <Route path="/set-password" element={<SetPassword />} />
+            
             {/* Protected Routes */}
             <Route 
               path="/" 
@@ -44,7 +44,7 @@ const ImageUpload = ({
       });
 
       const token = localStorage.getItem('token');
-      const response = await fetch('http://localhost:5000/api/upload/multiple', {
+      const response = await fetch('http://localhost:5000/api/upload/stream', {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`
@@ -54,11 +54,15 @@ const ImageUpload = ({
 
       const result = await response.json();
 
-      if (response.ok) {
+      if (result.urls && result.urls.length > 0) {
         const newImages = [...images, ...result.urls];
         onImagesChange(newImages);
         toast.success(`${result.urls.length} images uploaded successfully`);
-      } else {
+      }
+      (result.files || [])
+        .filter(file => file.status === 'rejected')
+        .forEach(file => toast.error(`${file.filename}: ${file.error}`));
+      if (!response.ok && !result.files) {
         toast.error(result.error || 'Upload failed');
       }
     } catch (error) {
@@ -125,8 +125,8 @@ const EmployeeForm = () => {
         toast.success('Employee updated successfully');
       } else {
         const response = await employeesAPI.createEmployee(submitData);
-        if (response.data.email_sent) {
-          toast.success('Employee created successfully! Welcome email sent to ' + formData.email);
+        if (response.data.email_queued) {
+          toast.success('Employee created successfully! Welcome email is on its way to ' + formData.email);
         } else {
           toast.success('Employee created successfully! (Email notification could not be sent)');
         }
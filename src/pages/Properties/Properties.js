@@ -1178,7 +1178,7 @@ const Properties = () => {
                       <img
                         src={property.images[0].startsWith('blob:') 
                           ? property.images[0] 
-                          : `http://localhost:5000${property.images[0]}`
+                          : `http://localhost:5000${property.cover_image ? property.cover_image.card : property.images[0]}`
                         }
                         alt={property.title}
                         className="h-full w-full object-cover"
@@ -1287,7 +1287,7 @@ const Properties = () => {
                         <img
                           src={property.images[0].startsWith('blob:') 
                             ? property.images[0] 
-                            : `http://localhost:5000${property.images[0]}`
+                            : `http://localhost:5000${property.cover_image ? property.cover_image.thumb : property.images[0]}`
                           }
                           alt={property.title}
                           className="w-full h-full object-cover rounded-lg"
@@ -1487,7 +1487,7 @@ const Properties = () => {
                         <img
                           src={property.images[0].startsWith('blob:') 
                             ? property.images[0] 
-                            : `http://localhost:5000${property.images[0]}`
+                            : `http://localhost:5000${property.cover_image ? property.cover_image.card : property.images[0]}`
                           }
                           alt={property.title}
                           className="h-full w-full object-cover"
@@ -45,6 +45,7 @@ export const authAPI = {
   getProfile: () => api.get('/auth/profile'),
   updateProfile: (profileData) => api.put('/auth/profile', profileData),
   changePassword: (passwordData) => api.post('/auth/change-password', passwordData),
+  setPassword: (data) => api.post('/auth/set-password', data),
   getUsers: () => api.get('/auth/users'),
   updateUser: (userId, userData) => api.put(`/auth/users/${userId}`, userData),
 };
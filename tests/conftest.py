@@ -0,0 +1,90 @@
+"""
+Shared fixtures for the test suite
+The app runs against throwaway SQLite files (a primary and a read-replica
+stand-in), so the configured database is never touched. The environment is set
+before `app` is imported because app.py reads its configuration at import time.
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix='crm-tests-')
+PRIMARY_DB = os.path.join(TMP_DIR, 'primary.db')
+REPLICA_DB = os.path.join(TMP_DIR, 'replica.db')
+
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{PRIMARY_DB}',
+    'DATABASE_REPLICA_URL': f'sqlite:///{REPLICA_DB}',
+    'ACTIVITY_LOG_ASYNC': 'False',
+    'ACTIVITY_LOG_SPOOL_DIR': os.path.join(TMP_DIR, 'activity_spool'),
+    'JOBS_IN_PROCESS': 'False',
+    'SCHEDULER_ENABLED': 'False',
+    'LOG_SAMPLE_RATE': '0',
+    'UPLOAD_LOCAL_DIR': os.path.join(TMP_DIR, 'uploads'),
+    'IMPORT_DIR': os.path.join(TMP_DIR, 'imports'),
+})
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from database import db, REPLICA_BIND  # noqa: E402
+from models import User  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """The app with empty tables on both the primary and the replica"""
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        engines = [db.engine, db.engines[REPLICA_BIND]]
+        for engine in engines:
+            db.metadata.drop_all(engine)
+            db.metadata.create_all(engine)
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(email, role):
+    user = User(email=email, first_name=role.title(), last_name='User', role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def auth_headers(user):
+    return {'Authorization': 'Bearer ' + create_access_token(identity=str(user.id))}
+
+
+@pytest.fixture
+def admin(app):
+    return make_user('admin@example.com', 'admin')
+
+
+@pytest.fixture
+def agent(app):
+    return make_user('agent@example.com', 'sales_agent')
+
+
+@pytest.fixture
+def foreign_keys(app):
+    # SQLite only enforces foreign keys (e.g. rejects an unknown user id) when switched on
+    def enable(connection, record):
+        connection.execute('PRAGMA foreign_keys=ON')
+
+    db.engine.dispose()
+    event.listen(db.engine, 'connect', enable)
+    yield
+    db.session.remove()
+    event.remove(db.engine, 'connect', enable)
+    db.engine.dispose()
@@ -0,0 +1,55 @@
+"""
+The employee-productivity reports cost the same handful of queries whatever
+the headcount (one grouped aggregation, not three queries per employee).
+"""
+
+from datetime import datetime
+import pytest
+from sqlalchemy import insert
+from database import db, REPLICA_BIND
+from models import Lead, PostSale, Property, User
+from utils.query_profiler import assert_max_queries
+from conftest import auth_headers
+
+ENDPOINTS = ['/api/reports/employee-productivity', '/api/dashboard/charts/employee-productivity']
+
+
+def seed_team(employees):
+    """An admin plus employees with a lead, a conversion and a sale each, on both databases"""
+    now = datetime.utcnow()
+    users = [{'id': 1, 'email': 'admin@example.com', 'password_hash': 'x', 'first_name': 'Admin',
+              'last_name': 'User', 'role': 'admin'}]
+    leads, sales = [], []
+    for i in range(employees):
+        user_id = i + 2
+        users.append({'id': user_id, 'email': f'agent{i}@example.com', 'password_hash': 'x',
+                      'first_name': 'Agent', 'last_name': str(i), 'role': 'sales_agent' if i % 2 else 'manager'})
+        leads.append({'id': 2 * i + 1, 'name': 'Lead', 'phone': '1', 'source': 'website', 'status': 'new',
+                      'assigned_employee_id': user_id, 'created_at': now})
+        leads.append({'id': 2 * i + 2, 'name': 'Lead', 'phone': '1', 'source': 'website', 'status': 'closed_won',
+                      'assigned_employee_id': user_id, 'created_at': now})
+        sales.append({'lead_id': 2 * i + 2, 'property_id': 1, 'sale_price': 1000000, 'sale_date': now})
+    for engine in (db.engine, db.engines[REPLICA_BIND]):
+        with engine.begin() as connection:
+            connection.execute(insert(User.__table__), users)
+            connection.execute(insert(Property.__table__), [
+                {'id': 1, 'title': 'Villa', 'property_type': 'residential', 'location': 'Pune', 'price': 1000000}
+            ])
+            connection.execute(insert(Lead.__table__), leads)
+            connection.execute(insert(PostSale.__table__), sales)
+    return db.session.get(User, 1)
+
+
+@pytest.mark.parametrize('url', ENDPOINTS)
+@pytest.mark.parametrize('employees', [2, 40])
+def test_productivity_query_count_does_not_grow_with_headcount(client, url, employees):
+    admin = seed_team(employees)
+    headers = auth_headers(admin)
+
+    with assert_max_queries(2):
+        response = client.get(url, headers=headers)
+
+    assert response.status_code == 200, response.get_json()
+    rows = next(iter(response.get_json().values()))
+    assert len(rows) == employees
+    assert all((row['leads_handled'], row['conversions']) == (2, 1) for row in rows)
@@ -0,0 +1,39 @@
+"""
+Follow-up reminders: one per follow-up however often the job runs, and a new
+one once a rescheduled follow-up's own window opens.
+"""
+
+from datetime import datetime, timedelta
+from database import db
+from models import Lead, Notification
+from routes.notifications import check_follow_up_reminders
+
+
+def add_lead(agent, due_in):
+    lead = Lead(name='Asha Rao', phone='9000000000', source='website', status='new',
+                assigned_employee_id=agent.id, next_follow_up=datetime.utcnow() + due_in)
+    db.session.add(lead)
+    db.session.commit()
+    return lead
+
+
+def test_each_follow_up_is_reminded_once(app, agent):
+    add_lead(agent, timedelta(hours=5))
+    add_lead(agent, timedelta(hours=30))
+
+    assert check_follow_up_reminders() == 1
+    assert check_follow_up_reminders() == 0
+    assert Notification.query.filter_by(type='follow_up').count() == 1
+
+
+def test_a_rescheduled_follow_up_is_reminded_again(app, agent):
+    lead = add_lead(agent, timedelta(hours=5))
+    assert check_follow_up_reminders() == 1
+
+    # The first reminder went out two days ago, before the new window opened
+    Notification.query.update({'created_at': datetime.utcnow() - timedelta(days=2)})
+    lead.next_follow_up = datetime.utcnow() + timedelta(hours=20)
+    db.session.commit()
+
+    assert check_follow_up_reminders() == 1
+    assert check_follow_up_reminders() == 0
@@ -0,0 +1,113 @@
+"""
+EXPLAIN checks for the list endpoints' hot filters
+Every SELECT a list endpoint issues is re-run under EXPLAIN QUERY PLAN and
+must reach the endpoint's table through an index (see the hot path and keyset
+index migrations), never by scanning it.
+"""
+
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from sqlalchemy import event, text
+from database import db, REPLICA_BIND
+from models import Activity, Favorite, Lead, Notification, PostSale, Property
+from conftest import auth_headers
+
+# Plan lines that read a table without any index, e.g. "SCAN leads"
+TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+@contextmanager
+def captured_selects():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    # The website feed reads from the replica; both have the same schema
+    engines = [db.engine, db.engines[REPLICA_BIND]]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+
+def table_scans(statements):
+    scans = set()
+    with db.engine.connect() as connection:
+        for statement, parameters in statements:
+            for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                match = TABLE_SCAN.match(row[-1])
+                if match:
+                    scans.add(match.group(1))
+    return scans
+
+
+@pytest.fixture
+def seeded(admin, agent):
+    now = datetime.utcnow()
+    properties = [
+        Property(title=f'Villa {i}', property_type='residential', location='Pune', price=Decimal(1000000 + i),
+                 status='available', is_website_visible=True, assigned_agent_id=agent.id,
+                 created_at=now - timedelta(hours=i))
+        for i in range(30)
+    ]
+    db.session.add_all(properties)
+    db.session.flush()
+    leads = [
+        Lead(name=f'Lead {i}', email=f'lead{i}@example.com', phone='1', source='website',
+             status='new', assigned_employee_id=agent.id, next_follow_up=now + timedelta(days=i),
+             created_at=now - timedelta(hours=i))
+        for i in range(30)
+    ]
+    db.session.add_all(leads)
+    db.session.flush()
+    db.session.add_all(
+        PostSale(lead_id=leads[i].id, property_id=properties[i].id, sale_price=Decimal(1000000), sale_date=now,
+                 created_at=now - timedelta(hours=i))
+        for i in range(10)
+    )
+    db.session.add_all(
+        Notification(user_id=user.id, title='t', message='m', type='lead', is_read=bool(i % 2),
+                     created_at=now - timedelta(hours=i))
+        for user in (admin, agent) for i in range(10)
+    )
+    db.session.add_all(
+        Activity(user_id=admin.id, activity_type='lead_added', description='d', created_at=now - timedelta(hours=i))
+        for i in range(30)
+    )
+    db.session.add_all(Favorite(user_id=agent.id, property_id=prop.id) for prop in properties[:10])
+    db.session.commit()
+
+
+LIST_ENDPOINTS = [
+    ('/api/leads/?stage=new', 'agent', 'leads'),
+    ('/api/leads/?after=', 'admin', 'leads'),
+    ('/api/properties/?status=available&type=residential', 'admin', 'properties'),
+    ('/api/properties/?min_price=1000005&max_price=1000010', 'admin', 'properties'),
+    ('/api/properties/?after=', 'admin', 'properties'),
+    ('/api/properties/website-visible', None, 'properties'),
+    ('/api/post-sales/?after=', 'admin', 'post_sales'),
+    ('/api/notifications/?unread_only=true', 'agent', 'notifications'),
+    ('/api/notifications/?after=', 'agent', 'notifications'),
+    ('/api/activities?type=lead_added', 'admin', 'activities'),
+    ('/api/activities?after=', 'admin', 'activities'),
+    ('/api/favorites?after=', 'agent', 'favorites'),
+]
+
+
+@pytest.mark.parametrize('url, role, table', LIST_ENDPOINTS)
+def test_list_endpoint_uses_an_index(client, seeded, admin, agent, url, role, table):
+    headers = auth_headers({'admin': admin, 'agent': agent}[role]) if role else {}
+    with captured_selects() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    touched = [s for s in statements if re.search(rf'\bFROM {table}\b', s[0])]
+    assert touched, f'{url} did not query {table}'
+    assert table not in table_scans(touched)
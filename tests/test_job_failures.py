@@ -0,0 +1,46 @@
+"""
+Queued jobs whose work fails are recorded as failed (or retried), not as
+succeeded with an empty result.
+"""
+
+import os
+from flask import current_app
+from database import db
+from models import ImportJob, Job, Lead
+from utils.jobs import enqueue
+from utils.property_import import start_import
+
+
+def run_jobs():
+    current_app.extensions['jobs'].run(burst=True)
+    db.session.expire_all()
+
+
+def test_a_failed_import_fails_its_job(app, admin):
+    import_job = ImportJob(entity='properties', format='ndjson', created_by=admin.id)
+    db.session.add(import_job)
+    db.session.commit()
+    # No upload file was written, so the import fails as soon as it reads
+    os.makedirs(current_app.config['IMPORT_DIR'], exist_ok=True)
+    job = start_import(import_job)
+    db.session.commit()
+
+    run_jobs()
+
+    assert db.session.get(ImportJob, import_job.id).status == 'failed'
+    job = db.session.get(Job, job.id)
+    assert job.status == 'failed'
+    assert 'RuntimeError' in job.last_error
+
+
+def test_a_failed_reminder_check_is_retried(app):
+    job = enqueue('follow_up_reminders')
+    db.session.commit()
+    Lead.__table__.drop(db.engine)
+
+    run_jobs()
+
+    job = db.session.get(Job, job.id)
+    assert job.status == 'queued'
+    assert job.attempts == 1
+    assert job.last_error
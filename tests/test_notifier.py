@@ -0,0 +1,42 @@
+"""
+Notification fan-out to cached or queued recipient lists that name a user
+deleted since (by another process, or before the queued job ran).
+"""
+
+from flask import current_app
+from sqlalchemy import delete
+from database import db
+from models import Job, Notification, User
+from utils.notifier import notify, notify_staff, recipients
+from conftest import make_user
+
+
+def delete_elsewhere(user):
+    # A delete committed by another process doesn't reach this process's cache
+    with db.engine.begin() as connection:
+        connection.execute(delete(User.__table__).where(User.__table__.c.id == user.id))
+
+
+def test_cached_recipients_skip_a_deleted_user(admin, foreign_keys):
+    manager = make_user('manager@example.com', 'manager')
+    assert recipients() == [admin.id, manager.id]
+    delete_elsewhere(manager)
+
+    created = notify_staff('New lead', 'A lead came in', 'lead', defer=False)
+    db.session.commit()
+
+    assert created == 1
+    assert [n.user_id for n in Notification.query] == [admin.id]
+
+
+def test_queued_notification_skips_a_deleted_user(admin, agent, foreign_keys):
+    notify([admin.id, agent.id], 'Payment due', 'A payment is due', 'payment', defer=True)
+    db.session.commit()
+    delete_elsewhere(agent)
+
+    current_app.extensions['jobs'].run(burst=True)
+
+    job = db.session.get(Job, Job.query.one().id)
+    assert job.status == 'succeeded', job.last_error
+    assert job.result == {'notifications_created': 1}
+    assert [n.user_id for n in Notification.query] == [admin.id]
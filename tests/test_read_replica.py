@@ -0,0 +1,71 @@
+"""
+Read-replica routing, with two SQLite files standing in for the primary and
+the replica: @read_only endpoints and use_replica() blocks read the replica,
+everything else (and every write) goes to the primary.
+"""
+
+from flask import Flask
+from sqlalchemy import insert, select
+from database import db, use_replica, REPLICA_BIND
+from models import Lead, Property, User
+from conftest import PRIMARY_DB, auth_headers
+
+
+def add_properties(engine, count, status='available'):
+    with engine.begin() as connection:
+        connection.execute(insert(Property.__table__), [
+            {'title': f'Villa {i}', 'property_type': 'residential', 'location': 'Pune', 'price': 1000000, 'status': status}
+            for i in range(count)
+        ])
+
+
+def copy_users_to_replica():
+    # The replica stand-in doesn't replicate, so mirror the accounts by hand
+    rows = [dict(row) for row in db.session.execute(select(User.__table__)).mappings()]
+    with db.engines[REPLICA_BIND].begin() as connection:
+        connection.execute(insert(User.__table__), rows)
+
+
+def test_read_only_endpoint_reads_the_replica(client, admin):
+    copy_users_to_replica()
+    add_properties(db.engine, 2)
+    add_properties(db.engines[REPLICA_BIND], 5)
+
+    response = client.get('/api/reports/dashboard', headers=auth_headers(admin))
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['stats']['inventory_available'] == 5
+
+
+def test_other_endpoints_read_the_primary(client, admin):
+    copy_users_to_replica()
+    add_properties(db.engine, 2)
+    add_properties(db.engines[REPLICA_BIND], 5)
+
+    response = client.get('/api/properties/?status=available', headers=auth_headers(admin))
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['total'] == 2
+
+
+def test_writes_inside_use_replica_go_to_the_primary(app, admin):
+    with use_replica():
+        db.session.add(Lead(name='Walk-in', phone='1', source='website'))
+        db.session.commit()
+        assert Lead.query.count() == 0  # read from the (empty) replica
+
+    assert Lead.query.count() == 1
+    with db.engines[REPLICA_BIND].connect() as connection:
+        assert connection.execute(select(Lead.__table__)).all() == []
+
+
+def test_without_a_replica_reads_fall_back_to_the_primary(app):
+    add_properties(db.engine, 3)
+    primary_only = Flask(__name__)
+    primary_only.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{PRIMARY_DB}'
+    db.init_app(primary_only)
+
+    with primary_only.app_context():
+        with use_replica():
+            assert Property.query.count() == 3
+        db.session.remove()
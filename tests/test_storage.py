@@ -0,0 +1,94 @@
+"""
+Upload storage backends: local file modes, and the direct-to-S3 upload flow
+against an in-memory bucket (needs moto; skipped without it)
+"""
+
+import hashlib
+import io
+import os
+import stat
+import pytest
+from PIL import Image
+from models import Job, StoredFile
+from utils.storage import FILE_MODE, LocalStorage, S3Storage
+from conftest import auth_headers
+
+
+def jpeg_bytes():
+    photo = io.BytesIO()
+    Image.new('RGB', (40, 30), 'blue').save(photo, 'JPEG')
+    return photo.getvalue()
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_local_files_get_the_umask_mode_not_mkstemps(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+
+    storage.save('card/a.webp', io.BytesIO(b'variant'))
+    with storage.stage() as staged:
+        staged.write(b'original')
+        saved = storage.store_staged(staged, 'jpg')
+
+    # Readable by a web server running as another user (x-accel/x-sendfile)
+    assert mode(storage.path('card/a.webp')) == FILE_MODE
+    assert mode(storage.path(saved.filename)) == FILE_MODE
+
+
+@pytest.fixture
+def s3_storage(app):
+    """An S3Storage on an in-memory bucket (moto) in place of the app's storage"""
+    moto = pytest.importorskip('moto')
+    import boto3
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='uploads')
+        storage = S3Storage('uploads', prefix='uploads/images/', client=client)
+        local = app.extensions['storage']
+        app.extensions['storage'] = storage
+        try:
+            yield storage
+        finally:
+            app.extensions['storage'] = local
+
+
+def direct_upload(client, headers, content, filename='photo.jpg'):
+    """presign -> PUT to the bucket -> complete, as the browser does it"""
+    import requests
+    sha256 = hashlib.sha256(content).hexdigest()
+    presigned = client.post('/api/upload/presign', headers=headers, json={
+        'filename': filename, 'content_type': 'image/jpeg', 'size': len(content), 'sha256': sha256
+    }).get_json()
+    upload = presigned['upload']
+    assert requests.put(upload['url'], data=content, headers=upload['headers']).status_code == 200
+    return presigned['key'], client.post('/api/upload/complete', headers=headers, json={'key': presigned['key']})
+
+
+def test_direct_upload_registers_the_object(client, admin, s3_storage):
+    headers = auth_headers(admin)
+    content = jpeg_bytes()
+
+    key, response = direct_upload(client, headers, content)
+
+    assert response.status_code == 200, response.get_json()
+    assert StoredFile.query.filter_by(filename=key).one().size == len(content)
+    assert Job.query.filter_by(name='image_variants').count() == 1
+    served = client.get(f'/uploads/images/{key}')
+    assert served.status_code == 302 and 'uploads/images/' + key in served.location
+
+    # The same content again needs no upload
+    again = client.post('/api/upload/presign', headers=headers, json={
+        'filename': 'copy.jpg', 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest()
+    })
+    assert again.get_json()['deduplicated'] is True
+
+
+def test_direct_upload_of_a_non_image_is_rejected(client, admin, s3_storage):
+    key, response = direct_upload(client, auth_headers(admin), b'<?php system($_GET[1]);')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'File is not a valid image'
+    assert not s3_storage.exists(key)
+    assert StoredFile.query.count() == 0
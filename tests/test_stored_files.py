@@ -0,0 +1,76 @@
+"""
+Reference counts of stored uploads: kept by bulk imports (including the
+row-by-row retry of a rejected chunk) and reconciled by garbage collection.
+"""
+
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from database import db
+from models import ImportJob, StoredFile
+from utils.property_import import run_import, upload_path
+from utils.storage import get_storage
+from utils.stored_files import collect_garbage, store_upload
+
+PHOTO_A = 'a' * 64 + '.jpg'
+PHOTO_B = 'b' * 64 + '.jpg'
+
+
+def store(name, ref_count=0, age=timedelta(0)):
+    stored = StoredFile(filename=name, sha256=name[:64], size=3, ref_count=ref_count,
+                        created_at=datetime.utcnow() - age, last_uploaded_at=datetime.utcnow() - age)
+    db.session.add(stored)
+    db.session.commit()
+    return stored
+
+
+def test_import_counts_references_once_after_a_rejected_chunk(app, admin, foreign_keys):
+    store(PHOTO_A)
+    store(PHOTO_B)
+    rows = [
+        {'title': 'Villa 1', 'property_type': 'residential', 'location': 'Pune', 'price': 1,
+         'images': [f'/uploads/images/{PHOTO_A}']},
+        {'title': 'Villa 2', 'property_type': 'residential', 'location': 'Pune', 'price': 2,
+         'images': [f'/uploads/images/{PHOTO_B}'], 'assigned_agent_id': 9999},
+        {'title': 'Villa 3', 'property_type': 'residential', 'location': 'Pune', 'price': 3,
+         'images': [f'/uploads/images/{PHOTO_A}']},
+    ]
+    job = ImportJob(entity='properties', format='ndjson', created_by=admin.id)
+    db.session.add(job)
+    db.session.commit()
+    os.makedirs(current_app.config['IMPORT_DIR'], exist_ok=True)
+    with open(upload_path(job), 'w', encoding='utf-8') as upload:
+        upload.writelines(json.dumps(row) + '\n' for row in rows)
+
+    result = run_import(job.id)
+
+    assert (result['inserted_rows'], result['rejected_rows']) == (2, 1)
+    db.session.expire_all()
+    assert db.session.get(StoredFile, 1).ref_count == 2
+    assert db.session.get(StoredFile, 2).ref_count == 0
+
+
+def test_gc_reclaims_files_with_an_inflated_count(app):
+    store(PHOTO_A, ref_count=3, age=timedelta(days=2))
+
+    result = collect_garbage(grace_hours=24)
+
+    assert (result['deleted'], result['corrected']) == (1, 1)
+    assert StoredFile.query.count() == 0
+
+
+def test_gc_keeps_an_orphan_that_was_just_uploaded_again(app):
+    stored, _ = store_upload(io.BytesIO(b'photo'), 'jpg')
+    stored.created_at = stored.last_uploaded_at = datetime.utcnow() - timedelta(days=2)
+    db.session.commit()
+
+    # Same content uploaded again for a property form that isn't saved yet
+    _, deduplicated = store_upload(io.BytesIO(b'photo'), 'jpg')
+    db.session.commit()
+    result = collect_garbage(grace_hours=24)
+
+    assert deduplicated
+    assert result['deleted'] == 0
+    assert get_storage().exists(stored.filename)
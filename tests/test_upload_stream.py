@@ -0,0 +1,47 @@
+"""
+POST /api/upload/stream: per-file results, and the body limit applied to both
+Content-Length and chunked (length-less) requests.
+"""
+
+import io
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import EnvironBuilder, encode_multipart, run_wsgi_app
+from conftest import auth_headers
+
+
+def jpeg(color):
+    photo = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(photo, 'JPEG')
+    photo.seek(0)
+    return photo
+
+
+def test_stream_upload_stores_each_file(client, admin):
+    response = client.post('/api/upload/stream', headers=auth_headers(admin), data={
+        'files': [(jpeg('red'), 'a.jpg'), (jpeg('red'), 'b.jpg'), (io.BytesIO(b'not an image'), 'c.jpg')]
+    })
+
+    assert response.status_code == 200, response.get_json()
+    statuses = [result['status'] for result in response.get_json()['files']]
+    assert statuses == ['uploaded', 'deduplicated', 'rejected']
+
+
+def test_chunked_body_over_the_limit_is_refused(app, admin):
+    app.config['UPLOAD_MAX_CONTENT_LENGTH'] = 1024
+    try:
+        boundary, body = encode_multipart({'files': FileStorage(io.BytesIO(b'x' * 4096), 'big.jpg')})
+        environ = EnvironBuilder(
+            path='/api/upload/stream', method='POST', headers=auth_headers(admin),
+            input_stream=io.BytesIO(body), content_type=f'multipart/form-data; boundary={boundary}'
+        ).get_environ()
+        # What a server that decodes Transfer-Encoding: chunked hands the app
+        environ.pop('CONTENT_LENGTH', None)
+        environ['wsgi.input_terminated'] = True
+
+        # The test client would rebuild the environ (and its Content-Length)
+        _, status, _ = run_wsgi_app(app, environ, buffered=True)
+    finally:
+        app.config['UPLOAD_MAX_CONTENT_LENGTH'] = 640 * 1024 * 1024
+
+    assert status.startswith('413')
@@ -1,11 +1,17 @@
+from flask import current_app
 from database import db
 from models import Activity
 from datetime import datetime
+from utils.activity_sink import activity_sink
 
 def log_activity(user_id, activity_type, description, entity_type=None, entity_id=None, metadata=None):
     """
     Log an activity for a user
     
+    With ACTIVITY_LOG_ASYNC enabled the activity is handed to the buffered
+    activity sink and written in a batch shortly after; otherwise it is
+    committed immediately.
+    
     Args:
         user_id (int): ID of the user performing the activity
         activity_type (str): Type of activity (e.g., 'profile_update', 'property_added')
@@ -13,8 +19,24 @@ def log_activity(user_id, activity_type, description, entity_type=None, entity_i
         entity_type (str, optional): Type of entity affected (e.g., 'user', 'property')
         entity_id (int, optional): ID of the entity affected
         metadata (dict, optional): Additional data about the activity
+    
+    Returns:
+        Activity: The saved activity (None when queued or on error)
     """
     try:
+        if current_app.config.get('ACTIVITY_LOG_ASYNC'):
+            # Stamp now so the row keeps the time of the action, not of the flush
+            activity_sink.enqueue({
+                'user_id': user_id,
+                'activity_type': activity_type,
+                'description': description,
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'activity_metadata': metadata or {},
+                'created_at': datetime.now()
+            })
+            return None
+        
         activity = Activity(
             user_id=user_id,
             activity_type=activity_type,
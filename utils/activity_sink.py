@@ -0,0 +1,250 @@
+"""
+Buffered, batched writer for the activity log
+Events are appended to a per-process spool file (the durable copy) and queued
+in memory; a background thread writes them with one multi-row INSERT when
+ACTIVITY_LOG_BATCH_SIZE events are waiting or every ACTIVITY_LOG_FLUSH_INTERVAL
+seconds, then deletes the spool segment. Segments left behind by a process
+that died before flushing are replayed by the next flush cycle of any live
+process, so delivery is at-least-once.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, DataError, IntegrityError, InterfaceError, OperationalError
+from database import db
+from models import Activity
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r'^activity-(\d+)-([0-9a-f]+)-(\d+)\.jsonl(?:\.replay-(\d+))?$')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _decode(line):
+    row = json.loads(line)
+    row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return row
+
+
+class ActivitySink:
+    """In-memory activity queue with a spool-file write-ahead log"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        # A lock held by another thread at fork time would stay held in the child
+        os.register_at_fork(after_in_child=self._reset_start_lock)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('ACTIVITY_LOG_BATCH_SIZE', 100)
+        self.interval = app.config.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0)
+        self.spool_dir = app.config.get('ACTIVITY_LOG_SPOOL_DIR') or os.path.join(app.instance_path, 'activity_spool')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        app.extensions['activity_sink'] = self
+        atexit.register(self.close)
+
+    def _reset_start_lock(self):
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._start()
+
+    def _start(self):
+        """(Re)initialise per-process state; runs lazily so forked workers get their own"""
+        self._token = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._buffer = []          # events appended to the open segment
+        self._batches = deque()    # (rows, segment path) waiting to be written
+        self._segment = None
+        self._stopping = False
+        self._flush_lock = threading.Lock()  # one flush (or close) at a time
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='activity-sink', daemon=True)
+        self._thread.start()
+        # Published last: other threads only skip _start once everything above exists
+        self._pid = os.getpid()
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f'activity-{os.getpid()}-{self._token}-{self._sequence}.jsonl'
+        self._segment_path = os.path.join(self.spool_dir, name)
+        self._segment = open(self._segment_path, 'a', encoding='utf-8')
+
+    def enqueue(self, row):
+        """
+        Queue one activity row (column name -> value) for insertion
+
+        The row is on disk when this returns; the database write happens on
+        the background thread.
+        """
+        self._ensure_started()
+        line = json.dumps(row, default=str)
+        # Queue exactly what a replay would read back (e.g. Decimals become strings)
+        row = _decode(line)
+        with self._condition:
+            self._segment.write(line + '\n')
+            self._segment.flush()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def pending(self):
+        """Number of queued events not yet written to the database"""
+        if self._pid != os.getpid():
+            return 0
+        with self._condition:
+            return len(self._buffer) + sum(len(rows) for rows, _ in self._batches)
+
+    def _rotate(self):
+        # Caller holds the lock: seal the open segment with its events
+        if self._buffer:
+            self._segment.close()
+            self._batches.append((self._buffer, self._segment_path))
+            self._buffer = []
+            self._open_segment()
+
+    def _write(self, rows):
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(insert(Activity.__table__).values(rows))
+
+    def _write_each(self, rows):
+        # A batch the database rejects (e.g. a deleted user's id) must not block
+        # the queue: write row by row and drop only the offending events
+        for row in rows:
+            try:
+                self._write([row])
+            except DBAPIError as e:
+                if e.connection_invalidated or isinstance(e, (OperationalError, InterfaceError)):
+                    raise
+                logger.error('Dropping activity %r: %s', row, e.orig)
+
+    def flush(self):
+        """Write every sealed batch; stops at the first failure and keeps the rest"""
+        if self._pid != os.getpid():
+            return True
+        with self._flush_lock:
+            with self._condition:
+                self._rotate()
+            while True:
+                with self._condition:
+                    if not self._batches:
+                        return True
+                    rows, path = self._batches[0]
+                try:
+                    try:
+                        self._write(rows)
+                    except (IntegrityError, DataError):
+                        self._write_each(rows)
+                except Exception as e:
+                    logger.warning('Activity flush failed, %d events kept in %s: %s', len(rows), path, getattr(e, 'orig', e))
+                    return False
+                with self._condition:
+                    self._batches.popleft()
+                os.remove(path)
+
+    def _replay_orphans(self):
+        try:
+            self.replay()
+        except Exception as e:
+            logger.warning('Activity spool replay failed: %s', getattr(e, 'orig', e))
+            return False
+        return True
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            # Retried every cycle: a failed replay, or a worker that died since, leaves segments behind
+            healthy = self._replay_orphans() and self.flush()
+            # Back off while the database is unavailable
+            delay = self.interval if healthy else min(delay * 2, 60)
+            with self._condition:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._condition.wait(delay)
+                if self._stopping:
+                    return
+
+    def replay(self):
+        """
+        Write events from spool segments whose process is gone
+
+        Segments are claimed by renaming them, so concurrent workers starting
+        together don't replay the same file twice.
+
+        Returns:
+            int: Number of events replayed
+        """
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'activity-*.jsonl*'))):
+            match = SEGMENT_PATTERN.match(os.path.basename(path))
+            if not match:
+                continue
+            pid, token, _, replayer = match.groups()
+            if replayer:
+                # A replay that was interrupted; take over once that process is gone
+                # (our own pid means an earlier attempt here failed part way)
+                if int(replayer) != os.getpid() and _pid_alive(int(replayer)):
+                    continue
+            elif int(pid) == os.getpid():
+                # Our own open segments (a different token means the pid was reused)
+                if token == getattr(self, '_token', None):
+                    continue
+            elif _pid_alive(int(pid)):
+                continue
+            claimed = re.sub(r'\.replay-\d+$', '', path) + f'.replay-{os.getpid()}'
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed, encoding='utf-8') as spool:
+                rows = [_decode(line) for line in spool if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                self._write(rows[start:start + self.batch_size])
+            os.remove(claimed)
+            replayed += len(rows)
+        return replayed
+
+    def close(self):
+        """Stop the background thread and write whatever is still queued"""
+        if self._pid != os.getpid():
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout=self.interval + 5)
+        self.flush()
+        # Waits out a flush still running on another thread before sealing the segment
+        with self._flush_lock, self._condition:
+            self._segment.close()
+            if os.path.exists(self._segment_path) and not os.path.getsize(self._segment_path):
+                os.remove(self._segment_path)
+
+
+activity_sink = ActivitySink()
@@ -8,21 +8,23 @@ from flask import current_app
 from flask_mail import Message
 import logging
 
-def send_employee_welcome_email(employee_email, employee_name, username, password, admin_name="Admin"):
+def send_employee_welcome_email(employee_email, employee_name, username, set_password_token, admin_name="Admin"):
     """
-    Send welcome email to new employee with login credentials
+    Send welcome email to new employee with a link to set their password
     
     Args:
         employee_email (str): Employee's email address
         employee_name (str): Employee's full name
         username (str): Employee's username/email for login
-        password (str): Employee's temporary password
+        set_password_token (str): One-time set-password token
         admin_name (str): Name of admin who created the account
     """
     try:
+        set_password_url = f"http://localhost:3000/set-password?token={set_password_token}"
+        
         # Create email message
         msg = Message(
-            subject="Welcome to Real Estate CRM - Your Account Details",
+            subject="Welcome to Real Estate CRM - Set Up Your Account",
             recipients=[employee_email],
             sender=current_app.config['MAIL_DEFAULT_SENDER']
         )
@@ -60,20 +62,22 @@ def send_employee_welcome_email(employee_email, employee_name, username, passwor
                     <p>Welcome to our Real Estate CRM system! Your account has been created by <strong>{admin_name}</strong> and you can now access the system.</p>
                     
                     <div class="credentials">
-                        <h3>🔐 Your Login Credentials</h3>
+                        <h3>🔐 Your Login</h3>
                         <div class="credential-item">
                             <span class="label">Email/Username:</span><br>
                             <span class="value">{username}</span>
                         </div>
-                        <div class="credential-item">
-                            <span class="label">Temporary Password:</span><br>
-                            <span class="value">{password}</span>
-                        </div>
+                    </div>
+                    
+                    <p>Choose your password to activate your login:</p>
+                    
+                    <div style="text-align: center;">
+                        <a href="{set_password_url}" class="button">Set Your Password</a>
                     </div>
                     
                     <div class="warning">
                         <strong>⚠️ Important Security Notice:</strong><br>
-                        • Please change your password after your first login<br>
+                        • The link works once and expires in 3 days; ask your administrator for a new one if it does<br>
                         • Keep your credentials secure and don't share them<br>
                         • Contact your administrator if you have any issues
                     </div>
@@ -0,0 +1,108 @@
+"""
+Grouped aggregation of per-employee lead and sales statistics
+One GROUP BY over leads and one over post_sales (joined to leads), both keyed
+by assigned_employee_id and LEFT JOINed onto users, so the number of queries
+does not grow with headcount. The employee filters are applied inside both
+GROUP BYs, so a single employee's stats only read that employee's leads.
+"""
+
+from sqlalchemy import func, case, and_, select, true
+from database import db
+from models import User, Lead, PostSale
+
+
+def _in_window(column, start_date, end_date):
+    conditions = []
+    if start_date:
+        conditions.append(column >= start_date)
+    if end_date:
+        conditions.append(column <= end_date)
+    return and_(*conditions) if conditions else true()
+
+
+def count_if(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END), 0 when there are no rows"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def employee_productivity(roles=None, employee_ids=None, start_date=None, end_date=None):
+    """
+    Compute lead and sales statistics for many employees in one round trip
+
+    Args:
+        roles (list, optional): Only include users with these roles
+        employee_ids (list, optional): Only include these user IDs
+        start_date (datetime, optional): Window start (inclusive)
+        end_date (datetime, optional): Window end (inclusive)
+
+    Returns:
+        list: One dict per employee with
+            total_leads    - leads assigned (all time)
+            leads_handled  - leads created within the window
+            conversions    - closed_won leads last updated within the window
+            closed_won / closed_lost - leads currently in those stages
+            sales_value    - sum of post-sale prices with sale_date in the window
+    """
+    # Restrict the aggregated leads to the selected employees (not just the outer rows)
+    employee_filters = []
+    if roles:
+        employee_filters.append(Lead.assigned_employee_id.in_(select(User.id).where(User.role.in_(roles))))
+    if employee_ids is not None:
+        employee_filters.append(Lead.assigned_employee_id.in_(employee_ids))
+
+    lead_stats = db.session.query(
+        Lead.assigned_employee_id.label('employee_id'),
+        func.count(Lead.id).label('total_leads'),
+        count_if(_in_window(Lead.created_at, start_date, end_date)).label('leads_handled'),
+        count_if(and_(Lead.status == 'closed_won', _in_window(Lead.updated_at, start_date, end_date))).label('conversions'),
+        count_if(Lead.status == 'closed_won').label('closed_won'),
+        count_if(Lead.status == 'closed_lost').label('closed_lost')
+    ).filter(
+        Lead.assigned_employee_id.isnot(None),
+        *employee_filters
+    ).group_by(Lead.assigned_employee_id).subquery()
+
+    sales_stats = db.session.query(
+        Lead.assigned_employee_id.label('employee_id'),
+        func.sum(PostSale.sale_price).label('sales_value')
+    ).join(
+        Lead, PostSale.lead_id == Lead.id
+    ).filter(
+        _in_window(PostSale.sale_date, start_date, end_date),
+        *employee_filters
+    ).group_by(Lead.assigned_employee_id).subquery()
+
+    query = db.session.query(
+        User.id,
+        User.first_name,
+        User.last_name,
+        func.coalesce(lead_stats.c.total_leads, 0).label('total_leads'),
+        func.coalesce(lead_stats.c.leads_handled, 0).label('leads_handled'),
+        func.coalesce(lead_stats.c.conversions, 0).label('conversions'),
+        func.coalesce(lead_stats.c.closed_won, 0).label('closed_won'),
+        func.coalesce(lead_stats.c.closed_lost, 0).label('closed_lost'),
+        func.coalesce(sales_stats.c.sales_value, 0).label('sales_value')
+    ).outerjoin(
+        lead_stats, lead_stats.c.employee_id == User.id
+    ).outerjoin(
+        sales_stats, sales_stats.c.employee_id == User.id
+    )
+
+    if roles:
+        query = query.filter(User.role.in_(roles))
+    if employee_ids is not None:
+        query = query.filter(User.id.in_(employee_ids))
+
+    return [
+        {
+            'employee_id': row.id,
+            'employee_name': f"{row.first_name} {row.last_name}",
+            'total_leads': int(row.total_leads),
+            'leads_handled': int(row.leads_handled),
+            'conversions': int(row.conversions),
+            'closed_won': int(row.closed_won),
+            'closed_lost': int(row.closed_lost),
+            'sales_value': float(row.sales_value)
+        }
+        for row in query.order_by(User.id).all()
+    ]
@@ -0,0 +1,118 @@
+"""
+Materialized cache for the public website property feed
+Serialized feed pages are kept in memory together with a strong ETag and
+rebuilt only when the properties table changes. At most FEED_CACHE_MAX_ENTRIES
+pages are kept; the least recently used ones are dropped first.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from flask import current_app
+from database import db
+from models import Property
+from utils.metrics import cache_requests
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_generation = 0
+
+
+class FeedEntry:
+    """A serialized feed page and the table state it was built from"""
+
+    def __init__(self, body, fingerprint, generation):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.fingerprint = fingerprint
+        self.generation = generation
+        self.checked_at = time.monotonic()
+
+
+def invalidate_property_feed():
+    """Drop every cached feed page (called after property writes commit)"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+
+
+def _table_fingerprint():
+    """
+    Cheap summary of the properties table used to detect writes made by
+    other worker processes (inserts, deletes and updates all move it)
+    """
+    count, max_id, last_update = db.session.query(
+        func.count(Property.id),
+        func.max(Property.id),
+        func.max(Property.updated_at)
+    ).one()
+    return (count, max_id, last_update.isoformat() if last_update else None)
+
+
+def get_feed_page(key, build):
+    """
+    Return the cached FeedEntry for key, rebuilding it when stale
+
+    Args:
+        key (tuple): Cache key (fields, page, per_page, ...)
+        build (callable): Returns the serialized JSON body as bytes
+
+    Within FEED_CACHE_TTL seconds an entry is served without touching the
+    database; after that the table fingerprint is re-checked and the body is
+    only rebuilt if it changed.
+    """
+    ttl = current_app.config.get('FEED_CACHE_TTL', 30)
+    generation = _generation
+    with _lock:
+        entry = _entries.get(key)
+        if entry:
+            _entries.move_to_end(key)
+
+    if entry and entry.generation == generation:
+        if time.monotonic() - entry.checked_at < ttl:
+            cache_requests.inc(cache='feed', result='hit')
+            return entry
+        fingerprint = _table_fingerprint()
+        if fingerprint == entry.fingerprint:
+            entry.checked_at = time.monotonic()
+            cache_requests.inc(cache='feed', result='hit')
+            return entry
+    else:
+        fingerprint = _table_fingerprint()
+
+    cache_requests.inc(cache='feed', result='miss')
+
+    entry = FeedEntry(build(), fingerprint, generation)
+    max_entries = current_app.config.get('FEED_CACHE_MAX_ENTRIES', 256)
+    with _lock:
+        if generation == _generation:
+            _entries[key] = entry
+            _entries.move_to_end(key)
+            while len(_entries) > max_entries:
+                _entries.popitem(last=False)
+    return entry
+
+
+# Invalidate on commit rather than flush so a concurrent rebuild can't
+# cache rows from a transaction that is later rolled back
+def _mark_dirty(mapper, connection, target):
+    Session.object_session(target).info['property_feed_dirty'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('property_feed_dirty', False):
+        invalidate_property_feed()
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('property_feed_dirty', None)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Property, _event_name, _mark_dirty)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
@@ -0,0 +1,140 @@
+"""
+Resized variants of uploaded images
+Each raster upload gets thumb, card and full variants in WebP (and JPEG, for
+clients that need it), scaled to fit a square bounding box with the EXIF
+orientation applied and all metadata stripped. Variants are written by an
+'image_variants' job after the upload, or on the first request for one that
+doesn't exist yet, and are named after their original:
+/uploads/images/<size>/<original name>.<webp|jpg>.
+"""
+
+import io
+from flask import current_app
+from PIL import Image, ImageOps
+from utils.jobs import job_handler
+from utils.storage import get_storage
+from utils.uploads import RASTER_EXTENSIONS, SIZES
+
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+MIMETYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+
+def _original(stem):
+    storage = get_storage()
+    for extension in RASTER_EXTENSIONS:
+        key = f'{stem}.{extension}'
+        if storage.exists(key):
+            return key
+    return None
+
+
+def render_variant(source, size, fmt, destination):
+    """Store the size/fmt variant of the image stored at key source under key destination"""
+    storage = get_storage()
+    edge = SIZES[size]
+    with storage.open(source) as source_file, Image.open(source_file) as original:
+        # Let the JPEG decoder scale down while decoding instead of afterwards
+        original.draft('RGB', (edge, edge))
+        image = ImageOps.exif_transpose(original)
+    image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    icc_profile = image.info.get('icc_profile')
+    if fmt == 'jpg' and has_alpha:
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    else:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    # Keep the colour profile, drop EXIF/XMP (camera, GPS location)
+    image.info = {}
+
+    options = {'quality': current_app.config.get('IMAGE_VARIANT_QUALITY', 80)}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if fmt == 'jpg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options['method'] = 4
+
+    output = io.BytesIO()
+    image.save(output, VARIANT_FORMATS[fmt], **options)
+    output.seek(0)
+    storage.save(destination, output, MIMETYPES[fmt])
+
+
+def verify_image(fileobj):
+    """
+    Check that a file is an image Pillow can read, without decoding it
+
+    Raises:
+        OSError: If it isn't (truncated, corrupt or another file type)
+        SyntaxError: For some malformed image headers
+        Image.DecompressionBombError: If its header claims more than twice
+            Image.MAX_IMAGE_PIXELS pixels
+    """
+    fileobj.seek(0)
+    with Image.open(fileobj) as image:
+        image.verify()
+
+
+def image_error(fileobj):
+    """Why a file can't be accepted as an image (see verify_image), or None if it can"""
+    try:
+        verify_image(fileobj)
+    except Image.DecompressionBombError:
+        return 'Image dimensions are too large'
+    except Exception:
+        # OSError/SyntaxError for corrupt files, anything else from a plugin
+        return 'File is not a valid image'
+    return None
+
+
+def variant_key(size, name):
+    """
+    Storage key of a variant, rendering the variant first if it doesn't exist yet
+
+    Args:
+        size (str): thumb, card or full
+        name (str): "<original name without extension>.<webp|jpg>"
+
+    Returns:
+        str: The variant's key ("<size>/<name>")
+
+    Raises:
+        LookupError: For an unknown size or format, or a missing original
+        OSError: If the original can't be read as an image
+    """
+    if size not in SIZES or '.' not in name:
+        raise LookupError(f'Unknown image variant: {size}/{name}')
+    stem, fmt = name.rsplit('.', 1)
+    if fmt not in VARIANT_FORMATS or not stem or '/' in stem or '\\' in stem or stem.startswith('.'):
+        raise LookupError(f'Unknown image variant: {size}/{name}')
+
+    key = f'{size}/{name}'
+    if not get_storage().exists(key):
+        source = _original(stem)
+        if source is None:
+            raise LookupError(f'Image not found: {stem}')
+        render_variant(source, size, fmt, key)
+    return key
+
+
+def delete_variants(filename):
+    """Remove every variant of an original (after the original is deleted)"""
+    storage = get_storage()
+    stem = filename.rsplit('.', 1)[0]
+    for size in SIZES:
+        for fmt in VARIANT_FORMATS:
+            storage.delete(f'{size}/{stem}.{fmt}')
+
+
+@job_handler('image_variants', max_attempts=2)
+def generate_variants(filename):
+    """Job handler: render the WebP variants of a new upload (JPEG ones are made on request)"""
+    if filename.rsplit('.', 1)[-1].lower() not in RASTER_EXTENSIONS:
+        return {'variants': 0}
+    stem = filename.rsplit('.', 1)[0]
+    for size in SIZES:
+        variant_key(size, f'{stem}.webp')
+    return {'variants': len(SIZES)}
@@ -0,0 +1,374 @@
+"""
+Database-backed background job queue
+enqueue() adds a row to the jobs table in the caller's transaction, so a job
+exists only once the work that scheduled it has committed. Workers (a daemon
+thread per web process with JOBS_IN_PROCESS, or `flask jobs worker`) claim due
+jobs with a conditional UPDATE, retry failures with exponential backoff and
+record the outcome on the row. A running job's lock is refreshed by a
+heartbeat, so only jobs whose worker died are claimed again. No broker is
+needed beyond the database.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, event, or_, update
+from sqlalchemy.orm import Session
+from database import db
+from models import Job
+from utils.metrics import job_duration, jobs_processed
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed')
+MAX_BACKOFF = 3600  # seconds
+REMOVED = '[removed]'
+
+JobHandler = namedtuple('JobHandler', 'func max_attempts sensitive')
+
+_handlers = {}
+
+
+def job_handler(name, max_attempts=None, sensitive=()):
+    """
+    Register the decorated function as the handler for jobs called name
+
+    Args:
+        name (str): Job name passed to enqueue()
+        max_attempts (int, optional): Runs before the job is marked failed
+            (default: JOB_MAX_ATTEMPTS); use 1 for work that is not safe to repeat
+        sensitive (tuple): Payload keys (e.g. passwords) blanked out once the
+            job has succeeded or failed for good
+
+    The handler is called with the payload as keyword arguments inside an app
+    context; its return value (anything JSON-serializable) is stored as the
+    job's result and any exception counts as a failed attempt.
+    """
+    def register(func):
+        _handlers[name] = JobHandler(func, max_attempts, tuple(sensitive))
+        return func
+    return register
+
+
+def enqueue(name, payload=None, delay=0, created_by=None):
+    """
+    Queue a job in the current session (committed with the caller's transaction)
+
+    Args:
+        name (str): A name registered with @job_handler
+        payload (dict, optional): JSON-serializable keyword arguments for the handler
+        delay (int, optional): Seconds before the job may run
+        created_by (int, optional): ID of the user who caused the job
+
+    Returns:
+        Job: The pending row (its id is set once the session flushes)
+
+    Raises:
+        ValueError: If no handler is registered under name
+    """
+    handler = _handlers.get(name)
+    if handler is None:
+        raise ValueError(f'Unknown job: {name}')
+    job = Job(
+        name=name,
+        payload=payload or {},
+        status='queued',
+        attempts=0,
+        max_attempts=handler.max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 5),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        created_by=created_by
+    )
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def retry(job):
+    """
+    Queue a failed job to run again now, with a fresh set of attempts
+
+    Raises:
+        ValueError: If the job has not failed, or its sensitive payload was removed
+    """
+    if job.status != 'failed':
+        raise ValueError('Only failed jobs can be retried')
+    handler = _handlers.get(job.name)
+    if handler and any((job.payload or {}).get(key) == REMOVED for key in handler.sensitive):
+        raise ValueError('This job cannot be retried: its sensitive payload was removed')
+    job.status = 'queued'
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = None
+    db.session.info['jobs_enqueued'] = True
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed attempts times"""
+    base = current_app.config.get('JOB_RETRY_BACKOFF', 30)
+    return min(base * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def _claim(worker_id):
+    """
+    Lock the next due job for worker_id, or return None
+
+    Candidates are read first and then taken with an UPDATE that only matches
+    while the row is still claimable, so concurrent workers never run the same
+    job. Running jobs whose heartbeat stopped for JOB_LOCK_TIMEOUT (a worker
+    died) are claimed again.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config.get('JOB_LOCK_TIMEOUT', 600))
+    claimable = or_(
+        and_(Job.status == 'queued', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_at < stale)
+    )
+    candidates = db.session.query(Job.id).filter(claimable).order_by(Job.run_at, Job.id).limit(10).all()
+    for (job_id,) in candidates:
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, claimable)
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            return db.session.get(Job, job_id)
+    return None
+
+
+class _Heartbeat:
+    """
+    Refreshes a running job's locked_at every JOB_HEARTBEAT_INTERVAL seconds
+
+    Runs in its own thread and connection while the handler works, so a long
+    job (an import, a slow SMTP server) is never mistaken for one whose worker
+    died, however long it takes.
+    """
+
+    def __init__(self, job):
+        self.app = current_app._get_current_object()
+        self.job_id = job.id
+        self.worker_id = job.locked_by
+        self.interval = self.app.config.get('JOB_HEARTBEAT_INTERVAL', 60)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f'job-heartbeat-{job.id}', daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context(), db.engine.begin() as connection:
+                    connection.execute(
+                        update(Job)
+                        .where(Job.id == self.job_id, Job.status == 'running', Job.locked_by == self.worker_id)
+                        .values(locked_at=datetime.utcnow())
+                    )
+            except Exception:
+                logger.exception('Heartbeat for job %s failed', self.job_id)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _scrub(job, handler):
+    if handler and handler.sensitive and job.payload:
+        job.payload = {key: REMOVED if key in handler.sensitive else value
+                       for key, value in job.payload.items()}
+
+
+def _execute(job):
+    """Run a claimed job and record its outcome (succeeded, queued for a retry, or failed)"""
+    job_id = job.id
+    handler = _handlers.get(job.name)
+    started = time.monotonic()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {job.name}')
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Gave up: the worker running the last attempt stopped')
+        with _Heartbeat(job):
+            result = handler.func(**(job.payload or {}))
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = f'{type(e).__name__}: {e}'
+        job.locked_by = None
+        job.locked_at = None
+        if handler is not None and job.attempts < job.max_attempts:
+            delay = backoff(job.attempts)
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+            outcome = 'retried'
+            logger.warning('Job %s (%s) attempt %d failed, retrying in %ds: %s',
+                           job_id, job.name, job.attempts, delay, e)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            _scrub(job, handler)
+            outcome = 'failed'
+            logger.error('Job %s (%s) failed after %d attempts: %s', job_id, job.name, job.attempts, e)
+    else:
+        job = db.session.get(Job, job_id)
+        job.status = 'succeeded'
+        job.result = result
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+        _scrub(job, handler)
+        outcome = 'succeeded'
+        logger.info('Job %s (%s) succeeded in %.2fs', job_id, job.name, time.monotonic() - started)
+    db.session.commit()
+
+    jobs_processed.inc(name=job.name, outcome=outcome)
+    job_duration.observe(time.monotonic() - started, name=job.name)
+    return outcome
+
+
+def prune():
+    """Delete jobs that succeeded more than JOB_RETENTION_DAYS ago (a scheduler job)"""
+    cutoff = datetime.utcnow() - timedelta(days=current_app.config.get('JOB_RETENTION_DAYS', 7))
+    deleted = db.session.execute(
+        delete(Job).where(Job.status == 'succeeded', Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+class Worker:
+    """Polls the jobs table; woken early when this process commits a new job"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pid = None
+        self._wake = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['jobs'] = self
+        if app.config.get('JOBS_IN_PROCESS'):
+            app.before_request(self._ensure_started)
+
+    def wake(self):
+        self._wake.set()
+
+    def run_once(self, worker_id):
+        """Claim and run one due job; False when there was none"""
+        with self.app.app_context():
+            try:
+                job = _claim(worker_id)
+                if job is None:
+                    return False
+                _execute(job)
+                return True
+            finally:
+                db.session.remove()
+
+    def run(self, burst=False):
+        """
+        Process jobs until stopped (or, with burst, until none are due)
+
+        Returns:
+            int: Number of jobs run
+        """
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        poll_interval = self.app.config.get('JOB_POLL_INTERVAL', 5)
+        count = 0
+        while True:
+            try:
+                ran = self.run_once(worker_id)
+            except Exception:
+                logger.exception('Job worker error')
+                ran = False
+            if ran:
+                count += 1
+                continue
+            if burst:
+                return count
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+
+    def _ensure_started(self):
+        # Started per process (after any fork) on the first request it serves
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self.run, name='job-worker', daemon=True).start()
+
+
+worker = Worker()
+
+
+# Wake this process's worker once a transaction that queued jobs commits
+def _after_commit(session):
+    if session.info.pop('jobs_enqueued', False):
+        worker.wake()
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('jobs_enqueued', None)
+
+
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Background job queue"""
+
+
+@jobs_cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once no jobs are due instead of polling')
+@with_appcontext
+def worker_command(burst):
+    """Run queued jobs in the foreground"""
+    click.echo(f"Handlers: {', '.join(sorted(_handlers))}")
+    count = worker.run(burst=burst)
+    click.echo(f'Ran {count} jobs')
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(STATUSES), help='Only jobs in this state')
+@click.option('--limit', default=20, show_default=True)
+@with_appcontext
+def list_command(status, limit):
+    """Show the most recent jobs"""
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    for job in query.order_by(Job.id.desc()).limit(limit):
+        line = f'#{job.id} {job.name} {job.status} attempts={job.attempts}/{job.max_attempts}'
+        if job.last_error:
+            line += f' error={job.last_error}'
+        click.echo(line)
+
+
+@jobs_cli.command('retry')
+@click.argument('job_id', type=int)
+@with_appcontext
+def retry_command(job_id):
+    """Queue a failed job again"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        raise click.ClickException(f'Job {job_id} not found')
+    try:
+        retry(job)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'Job {job_id} queued')
@@ -0,0 +1,65 @@
+"""
+Dashboard KPI computation
+Every counter is computed with conditional aggregation (SUM(CASE WHEN ...)),
+one query per table, instead of a separate COUNT/SUM query per KPI
+"""
+
+from datetime import datetime
+from sqlalchemy import func, select, and_, true
+from database import db
+from models import Property, Lead, PostSale, Payment, SupportTicket
+from utils.employee_stats import count_if
+
+
+def dashboard_kpis(current_user_id, role):
+    """
+    Compute the dashboard KPI block
+
+    Args:
+        current_user_id (int): ID of the requesting user
+        role (str): Role of the requesting user; anyone other than admin or
+            manager only sees their own leads and listings
+
+    Returns:
+        dict: total_leads, active_listings, inventory_sold, inventory_available,
+            revenue_this_month, pending_tasks, conversion_rate
+    """
+    scoped = role not in ['admin', 'manager']
+
+    # Leads: total, closed and won in one scan
+    lead_scope = Lead.assigned_employee_id == current_user_id if scoped else true()
+    total_leads, closed_leads, won_leads = db.session.query(
+        func.count(Lead.id),
+        count_if(Lead.status.in_(['closed_won', 'closed_lost'])),
+        count_if(Lead.status == 'closed_won')
+    ).filter(lead_scope).one()
+
+    # Properties: the user's active listings plus overall inventory in one scan
+    agent_scope = Property.assigned_agent_id == current_user_id if scoped else true()
+    active_listings, sold_properties, available_properties = db.session.query(
+        count_if(and_(Property.status == 'available', agent_scope)),
+        count_if(Property.status == 'sold'),
+        count_if(Property.status == 'available')
+    ).one()
+
+    # Revenue this month and pending post-sales tasks in one round trip
+    current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    revenue_this_month, pending_payments, open_support_tickets = db.session.query(
+        select(func.coalesce(func.sum(PostSale.sale_price), 0)).where(
+            PostSale.sale_date >= current_month_start
+        ).scalar_subquery(),
+        select(func.count(Payment.id)).where(Payment.status == 'pending').scalar_subquery(),
+        select(func.count(SupportTicket.id)).where(SupportTicket.status == 'open').scalar_subquery()
+    ).one()
+
+    conversion_rate = (won_leads / closed_leads * 100) if closed_leads else 0
+
+    return {
+        'total_leads': int(total_leads),
+        'active_listings': int(active_listings),
+        'inventory_sold': int(sold_properties),
+        'inventory_available': int(available_properties),
+        'revenue_this_month': float(revenue_this_month or 0),
+        'pending_tasks': int(pending_payments) + int(open_support_tickets),
+        'conversion_rate': round(conversion_rate, 2)
+    }
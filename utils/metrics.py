@@ -0,0 +1,240 @@
+"""
+In-process metrics in the Prometheus text format
+Counters, gauges and histograms are plain dicts behind a lock, updated from
+request hooks and from the caches, notifier, job worker and activity sink;
+GET /metrics renders them. Values are per process, so each gunicorn worker
+reports its own series (scrape every worker, or sum them in the query).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_started = time.time()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value, *extra in self.samples():
+            lines.append(f'{name}{_format_labels(self.labels, key, *extra)} {value}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with collect, read at scrape time instead"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, labels=(), collect=None):
+        super().__init__(name, description, labels)
+        self.collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            # collect() returns {label values tuple: value}; skip the series if it fails
+            try:
+                return [(self.name, key, value) for key, value in self.collect().items()]
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # one slot per bucket plus +Inf, then the running sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts)) for key, counts in self._values.items()]
+        samples = []
+        for key, counts in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key, cumulative, [('le', bound)]))
+            samples.append((f'{self.name}_count', key, cumulative))
+            samples.append((f'{self.name}_sum', key, round(counts[-1], 6)))
+        return samples
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Requests
+http_requests = Counter('http_requests_total', 'Requests served',
+                        ('blueprint', 'route', 'method', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', 'Request latency',
+                                  ('blueprint', 'route', 'method'))
+http_in_flight = Gauge('http_requests_in_flight', 'Requests currently being handled')
+
+# Caches (feed, user, notify_recipients)
+cache_requests = Counter('cache_requests_total', 'Cache lookups by result (hit or miss)', ('cache', 'result'))
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), count in cache_requests._values.copy().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == 'hit' else 0), lookups + count)
+    return {(cache,): round(hits / lookups, 4) for cache, (hits, lookups) in totals.items() if lookups}
+
+
+cache_hit_ratio = Gauge('cache_hit_ratio', 'Share of cache lookups served from the cache', ('cache',),
+                        collect=_cache_hit_ratios)
+
+# Notification fan-out
+notifications_created = Counter('notifications_created_total', 'Notification rows created', ('delivery',))
+notification_fanout = Histogram('notification_fanout_recipients', 'Recipients per notify() call',
+                                buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+# Background jobs (counted by the process that ran them)
+jobs_processed = Counter('jobs_processed_total', 'Job attempts by outcome (succeeded, retried, failed)',
+                         ('name', 'outcome'))
+job_duration = Histogram('job_duration_seconds', 'Time spent running a job attempt', ('name',),
+                         buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0))
+
+
+def _pool_stats():
+    from database import db
+    pool = db.engine.pool
+    stats = {}
+    for state, reader in (('size', 'size'), ('checked_out', 'checkedout'), ('overflow', 'overflow')):
+        if hasattr(pool, reader):
+            stats[(state,)] = getattr(pool, reader)()
+    return stats
+
+
+def _activity_queue():
+    from utils.activity_sink import activity_sink
+    return {(): activity_sink.pending()}
+
+
+# Capacity
+Gauge('db_pool_connections', 'SQLAlchemy connection pool state', ('state',), collect=_pool_stats)
+Gauge('activity_log_queue_depth', 'Activity events waiting to be written', collect=_activity_queue)
+Gauge('process_start_time_seconds', 'Start time of this worker', collect=lambda: {(): _started})
+Gauge('process_pid', 'PID of the worker that served this scrape', collect=lambda: {(): os.getpid()})
+
+
+class Metrics:
+    """Request instrumentation plus the /metrics endpoint"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.token = app.config.get('METRICS_TOKEN')
+        app.extensions['metrics'] = self
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self._endpoint)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_in_flight = True
+        http_in_flight.inc()
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is not None and request.endpoint != 'metrics':
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            blueprint = request.blueprint or ''
+            http_request_duration.observe(time.perf_counter() - started,
+                                          blueprint=blueprint, route=route, method=request.method)
+            http_requests.inc(blueprint=blueprint, route=route, method=request.method,
+                              status=response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        if g.pop('metrics_in_flight', False):
+            http_in_flight.dec()
+
+    def _endpoint(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
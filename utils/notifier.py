@@ -0,0 +1,184 @@
+"""
+Notification fan-out
+Recipients are cached per role, and a notification addressed to many users is
+written with a single INSERT ... SELECT over the users table, either in the
+caller's transaction or (NOTIFY_ASYNC) by a 'notify' job on the background
+queue after it commits
+"""
+
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, insert, inspect, literal, select
+from sqlalchemy.orm import Session
+from database import db
+from models import User, Notification
+from utils.jobs import enqueue, job_handler
+from utils.metrics import cache_requests, notification_fanout, notifications_created
+
+STAFF_ROLES = ('admin', 'manager')
+
+_lock = threading.Lock()
+_recipients = {}  # role -> (expires_at, [user ids])
+
+
+def invalidate_recipients():
+    """Forget every cached recipient set (called after user writes commit)"""
+    with _lock:
+        _recipients.clear()
+
+
+def recipients(roles=STAFF_ROLES):
+    """
+    IDs of the users holding any of roles, cached for NOTIFY_RECIPIENT_TTL seconds
+
+    Args:
+        roles (tuple): Role names
+
+    Returns:
+        list: User IDs, ascending
+    """
+    now = time.monotonic()
+    ids = set()
+    missing = []
+    for role in roles:
+        cached = _recipients.get(role)
+        if cached and cached[0] > now:
+            ids.update(cached[1])
+        else:
+            missing.append(role)
+    cache_requests.inc(len(roles) - len(missing), cache='notify_recipients', result='hit')
+    cache_requests.inc(len(missing), cache='notify_recipients', result='miss')
+
+    if missing:
+        found = {role: [] for role in missing}
+        for user_id, role in db.session.query(User.id, User.role).filter(User.role.in_(missing)):
+            found[role].append(user_id)
+        expires_at = now + current_app.config.get('NOTIFY_RECIPIENT_TTL', 300)
+        with _lock:
+            for role, user_ids in found.items():
+                _recipients[role] = (expires_at, user_ids)
+        for user_ids in found.values():
+            ids.update(user_ids)
+
+    return sorted(ids)
+
+
+def _insert(user_ids, title, message, notification_type, entity_type, entity_id, created_at):
+    """
+    Write the notification for those of user_ids that still exist
+
+    A cached recipient list (invalidated only in the process that changed the
+    users) or a queued job can name a user deleted since; selecting the
+    recipients from users skips them instead of failing the whole INSERT on
+    the user_id foreign key.
+
+    Returns:
+        int: Number of notifications written
+    """
+    values = {
+        'title': title,
+        'message': message,
+        'type': notification_type,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'is_read': False,
+        'created_at': created_at
+    }
+    columns = Notification.__table__.c
+    existing = select(
+        User.id, *[literal(value, columns[name].type) for name, value in values.items()]
+    ).where(User.id.in_(user_ids))
+    return db.session.execute(
+        insert(Notification).from_select(['user_id', *values], existing)
+    ).rowcount
+
+
+@job_handler('notify')
+def deliver(user_ids, title, message, notification_type, entity_type=None, entity_id=None, created_at=None):
+    """Job handler: write a deferred notify() call"""
+    created_at = datetime.fromisoformat(created_at) if created_at else datetime.utcnow()
+    created = _insert(user_ids, title, message, notification_type, entity_type, entity_id, created_at)
+    db.session.commit()
+    return {'notifications_created': created}
+
+
+def notify(user_ids, title, message, notification_type, entity_type=None, entity_id=None,
+           exclude=None, defer=None):
+    """
+    Create the same notification for many users with one INSERT ... SELECT
+
+    Args:
+        user_ids (iterable): Recipient user IDs
+        title (str): Notification title
+        message (str): Notification body
+        notification_type (str): lead, follow_up, property, payment, system, ...
+        entity_type (str, optional): Type of the related entity
+        entity_id (int, optional): ID of the related entity
+        exclude (int, optional): User ID to leave out (usually the actor)
+        defer (bool, optional): Queue a 'notify' job instead of writing the
+            rows in the current transaction (default: NOTIFY_ASYNC)
+
+    Returns:
+        int: Number of notifications created (or queued); users deleted
+            since their IDs were looked up are skipped
+
+    Either way nothing is written until the caller commits: the rows (or the
+    job that writes them) join the current session transaction.
+    """
+    created_at = datetime.utcnow()
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id is not None and user_id != exclude]
+    if not user_ids:
+        return 0
+
+    if defer is None:
+        defer = current_app.config.get('NOTIFY_ASYNC', False)
+    if defer:
+        enqueue('notify', {
+            'user_ids': user_ids,
+            'title': title,
+            'message': message,
+            'notification_type': notification_type,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'created_at': created_at.isoformat()
+        })
+        created = len(user_ids)
+    else:
+        created = _insert(user_ids, title, message, notification_type, entity_type, entity_id, created_at)
+    notification_fanout.observe(len(user_ids))
+    notifications_created.inc(created, delivery='deferred' if defer else 'inline')
+    return created
+
+
+def notify_staff(title, message, notification_type, entity_type=None, entity_id=None, exclude=None, defer=None):
+    """notify() every admin and manager"""
+    return notify(recipients(STAFF_ROLES), title, message, notification_type,
+                  entity_type, entity_id, exclude=exclude, defer=defer)
+
+
+# Drop cached recipients once a user insert, delete or role change commits
+def _mark_dirty(mapper, connection, target):
+    Session.object_session(target).info['notify_recipients_dirty'] = True
+
+
+def _role_changed(mapper, connection, target):
+    if inspect(target).attrs.role.history.has_changes():
+        _mark_dirty(mapper, connection, target)
+
+
+def _after_commit(session):
+    if session.info.pop('notify_recipients_dirty', False):
+        invalidate_recipients()
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('notify_recipients_dirty', None)
+
+
+event.listen(User, 'after_insert', _mark_dirty)
+event.listen(User, 'after_delete', _mark_dirty)
+event.listen(User, 'after_update', _role_changed)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
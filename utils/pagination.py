@@ -0,0 +1,151 @@
+"""
+Keyset (cursor) pagination for list endpoints
+Each page continues from the sort key of the previous page's last row
+(?after=<cursor>) instead of using OFFSET, so page 1000 costs the same as
+page 1. The total count is optional (?count=true) because it scans the whole
+filtered set.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import request
+from sqlalchemy import and_, or_, false, Date, DateTime, Numeric
+
+MAX_PER_PAGE = 200
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next one"""
+
+    def __init__(self, items, next_cursor, per_page, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_more = next_cursor is not None
+        self.per_page = per_page
+        self.total = total
+
+    def meta(self):
+        """Pagination fields for the JSON response"""
+        meta = {
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more,
+            'per_page': self.per_page
+        }
+        if self.total is not None:
+            meta['total'] = self.total
+        return meta
+
+
+def encode_cursor(values):
+    payload = json.dumps([value.isoformat() if isinstance(value, (date, datetime)) else value
+                          for value in values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor back into typed sort values; ValueError if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            if value is not None:
+                column_type = column.type
+                if isinstance(column_type, DateTime):
+                    value = datetime.fromisoformat(value)
+                elif isinstance(column_type, Date):
+                    value = date.fromisoformat(value)
+                elif isinstance(column_type, Numeric):
+                    value = Decimal(value)
+        except (TypeError, ArithmeticError):
+            raise ValueError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def _after(column, descending, value):
+    # Rows strictly past value in this column's sort order. NULLs sort first
+    # ascending and last descending (MySQL and SQLite).
+    if value is None:
+        return false() if descending else column.isnot(None)
+    if descending:
+        return or_(column < value, column.is_(None))
+    return column > value
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_filter(order, values):
+    """
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with > flipped for descending keys
+    """
+    clauses = []
+    for position, (column, descending) in enumerate(order):
+        equal_so_far = [_equal(order[i][0], values[i]) for i in range(position)]
+        clauses.append(and_(*equal_so_far, _after(column, descending, values[position])))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, order, after=None, per_page=20, with_total=False):
+    """
+    Fetch one page of query ordered by order, starting after a cursor
+
+    Args:
+        query: SQLAlchemy query (any ordering it has is replaced)
+        order (list): (column, descending) pairs; the last one must be unique
+            (normally the primary key). A column of a joined model is given as
+            (column, descending, getter), where getter(item) returns its value
+        after (str, optional): Cursor from the previous page; None or '' for
+            the first page
+        per_page (int): Page size (capped at MAX_PER_PAGE)
+        with_total (bool): Also count the full filtered result
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    keys = [(entry[0], entry[1]) for entry in order]
+    getters = [entry[2] if len(entry) > 2 else (lambda item, key=entry[0].key: getattr(item, key))
+               for entry in order]
+
+    total = query.order_by(None).count() if with_total else None
+
+    query = query.order_by(None).order_by(*[column.desc() if descending else column.asc()
+                                            for column, descending in keys])
+    if after:
+        query = query.filter(keyset_filter(keys, decode_cursor(after, [column for column, _ in keys])))
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor([getter(items[-1]) for getter in getters])
+
+    return KeysetPage(items, next_cursor, per_page, total)
+
+
+def keyset_requested():
+    """True when the client asked for cursor pagination (?after=, even empty)"""
+    return 'after' in request.args
+
+
+def keyset_page_from_request(query, order, default_per_page=20):
+    """keyset_paginate with after, per_page and count taken from the request"""
+    return keyset_paginate(
+        query, order,
+        after=request.args.get('after'),
+        per_page=request.args.get('per_page', default_per_page, type=int),
+        with_total=request.args.get('count', 'false').lower() == 'true'
+    )
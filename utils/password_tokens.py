@@ -0,0 +1,45 @@
+"""
+One-time set-password tokens
+A token is signed with SECRET_KEY and carries a fingerprint of the user's
+current password hash, so it stops working as soon as it has been used to
+set a password (or the password changes any other way) and after
+SET_PASSWORD_TOKEN_MAX_AGE seconds. Nothing is stored server-side.
+"""
+
+import hashlib
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from database import db
+from models import User
+
+SALT = 'set-password'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def _fingerprint(user):
+    return hashlib.sha256(user.password_hash.encode()).hexdigest()[:16]
+
+
+def make_set_password_token(user):
+    """Signed token letting user choose a new password once"""
+    return _serializer().dumps({'id': user.id, 'pw': _fingerprint(user)})
+
+
+def load_set_password_token(token):
+    """
+    User a set-password token was issued for
+
+    Returns:
+        User: The user, or None if the token is invalid, expired or already used
+    """
+    try:
+        data = _serializer().loads(token, max_age=current_app.config.get('SET_PASSWORD_TOKEN_MAX_AGE', 259200))
+    except BadSignature:  # also raised for expired tokens
+        return None
+    user = db.session.get(User, data.get('id'))
+    if user is None or not user.is_active or _fingerprint(user) != data.get('pw'):
+        return None
+    return user
@@ -0,0 +1,247 @@
+"""
+Streaming bulk import of property listings from CSV or NDJSON files
+The upload is saved to IMPORT_DIR and read back one row at a time; valid rows
+are inserted IMPORT_CHUNK_SIZE at a time with one multi-row INSERT and the
+job's progress is committed with each chunk. Invalid rows are written to a
+reject file (row number, error, original data) instead of failing the import.
+"""
+
+import csv
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from flask import current_app
+from sqlalchemy import Boolean, Date, DateTime, Integer, JSON, Numeric, String, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from database import db
+from models import ImportJob, Property
+from utils.feed_cache import invalidate_property_feed
+from utils.jobs import enqueue, job_handler
+from utils.stored_files import adjust_references, count_references
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+REQUIRED_FIELDS = ('title', 'property_type', 'location', 'price')
+SKIPPED_COLUMNS = ('id', 'created_at', 'updated_at')
+TRUE_VALUES = ('true', '1', 'yes', 'y')
+FALSE_VALUES = ('false', '0', 'no', 'n')
+
+
+def _convert(column, value):
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ValueError(f'{column.name} must be true or false')
+    if isinstance(column_type, Integer):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column.name} must be a whole number')
+    if isinstance(column_type, Numeric):
+        try:
+            return Decimal(str(value).replace(',', ''))
+        except InvalidOperation:
+            raise ValueError(f'{column.name} must be a number')
+    if isinstance(column_type, DateTime):
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f'{column.name} must be a date and time (YYYY-MM-DDTHH:MM:SS)')
+    if isinstance(column_type, Date):
+        try:
+            return date.fromisoformat(str(value)[:10])
+        except ValueError:
+            raise ValueError(f'{column.name} must be a date (YYYY-MM-DD)')
+    if isinstance(column_type, JSON):
+        if isinstance(value, (list, dict)):
+            return value
+        text = str(value).strip()
+        if text.startswith('['):
+            try:
+                return json.loads(text)
+            except ValueError:
+                raise ValueError(f'{column.name} is not a valid JSON list')
+        # CSV cells may hold a pipe-separated list instead
+        return [item.strip() for item in text.split('|') if item.strip()]
+    if isinstance(column_type, String) and column_type.length and len(str(value)) > column_type.length:
+        raise ValueError(f'{column.name} is longer than {column_type.length} characters')
+    return str(value)
+
+
+def property_row(data):
+    """
+    Validate one property and convert it to column values
+
+    Args:
+        data (dict): Field name -> value (strings from CSV, or JSON values)
+
+    Returns:
+        dict: Values for an INSERT into properties (columns left out get
+        their defaults)
+
+    Raises:
+        ValueError: Describing every invalid field of the row
+    """
+    errors = [f'{field} is required' for field in REQUIRED_FIELDS if data.get(field) in (None, '')]
+    row = {}
+    for column in Property.__table__.columns:
+        value = data.get(column.name)
+        if column.name in SKIPPED_COLUMNS or value is None or value == '':
+            continue
+        try:
+            row[column.name] = _convert(column, value)
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise ValueError('; '.join(dict.fromkeys(errors)))
+    return row
+
+
+def read_rows(path, fmt):
+    """
+    Yield (line number, raw row, parse error or None) from an upload, one row at a time
+    """
+    with open(path, newline='', encoding='utf-8-sig') as upload:
+        if fmt == 'csv':
+            reader = csv.DictReader(upload)
+            for raw in reader:
+                yield reader.line_num, raw, None
+        else:
+            for line_number, line in enumerate(upload, 1):
+                if not line.strip():
+                    continue
+                try:
+                    raw = json.loads(line)
+                except ValueError as e:
+                    yield line_number, {'line': line.rstrip('\n')}, f'Invalid JSON: {e}'
+                    continue
+                if not isinstance(raw, dict):
+                    yield line_number, {'line': line.rstrip('\n')}, 'Each line must be a JSON object'
+                    continue
+                yield line_number, raw, None
+
+
+def upload_path(job):
+    return os.path.join(current_app.config['IMPORT_DIR'], f'import-{job.id}.{job.format}')
+
+
+def reject_path(job):
+    return os.path.join(current_app.config['IMPORT_DIR'], f'import-{job.id}-rejects.csv')
+
+
+class _Progress:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.rejected = 0
+
+    def save(self, job):
+        job.processed_rows = self.processed
+        job.inserted_rows = self.inserted
+        job.rejected_rows = self.rejected
+
+
+def _insert_chunk(job_id, chunk, progress, rejects):
+    """Insert one chunk with a single statement, then commit it with the job's progress"""
+    if chunk:
+        try:
+            db.session.execute(insert(Property), [row for _, row, _ in chunk])
+            # Bulk inserts skip the mapper events that count image references
+            adjust_references(db.session, count_references(row for _, row, _ in chunk))
+            progress.inserted += len(chunk)
+        except (IntegrityError, DataError):
+            # Something the validator can't see (e.g. an unknown agent id):
+            # redo the chunk row by row so only the offending rows are rejected
+            db.session.rollback()
+            for line_number, row, raw in chunk:
+                try:
+                    db.session.execute(insert(Property), [row])
+                    adjust_references(db.session, count_references([row]))
+                    db.session.commit()
+                    progress.inserted += 1
+                except (IntegrityError, DataError) as e:
+                    db.session.rollback()
+                    progress.rejected += 1
+                    rejects.writerow([line_number, str(e.orig), json.dumps(raw, default=str)])
+    progress.save(db.session.get(ImportJob, job_id))
+    db.session.commit()
+
+
+def run_import(job_id):
+    """
+    Import the uploaded file of an ImportJob (runs in an app context)
+
+    Returns:
+        dict: The final job state
+    """
+    job = db.session.get(ImportJob, job_id)
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    chunk_size = current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    progress = _Progress()
+    try:
+        with open(reject_path(job), 'w', newline='', encoding='utf-8') as reject_file:
+            rejects = csv.writer(reject_file)
+            rejects.writerow(['row', 'error', 'data'])
+
+            chunk = []
+            for line_number, raw, error in read_rows(upload_path(job), job.format):
+                progress.processed += 1
+                if error is None:
+                    try:
+                        chunk.append((line_number, property_row(raw), raw))
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    progress.rejected += 1
+                    rejects.writerow([line_number, error, json.dumps(raw, default=str)])
+
+                if len(chunk) >= chunk_size:
+                    _insert_chunk(job_id, chunk, progress, rejects)
+                    reject_file.flush()
+                    chunk = []
+            _insert_chunk(job_id, chunk, progress, rejects)
+
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception('Import %s failed', job_id)
+        db.session.rollback()
+        job = db.session.get(ImportJob, job_id)
+        progress.save(job)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    # Bulk inserts skip the mapper events that normally invalidate the feed
+    if progress.inserted:
+        invalidate_property_feed()
+    return job.to_dict()
+
+
+@job_handler('property_import', max_attempts=1)
+def import_job(import_job_id):
+    """Job handler: not retried, since chunks committed before a failure stay imported"""
+    result = run_import(import_job_id)
+    # run_import records the failure on the ImportJob; fail the queued job too
+    if result['status'] == 'failed':
+        raise RuntimeError(f"Import {import_job_id} failed: {result['error']}")
+    return result
+
+
+def start_import(job):
+    """Queue the import on the background job queue (committed by the caller)"""
+    return enqueue('property_import', {'import_job_id': job.id}, created_by=job.created_by)
@@ -0,0 +1,194 @@
+"""
+Per-request SQL profiling
+Cursor-execute events record how many statements a request issued, the time
+spent in the database and its slowest statements. Debug builds (or
+QUERY_PROFILE_HEADERS) return the totals as X-DB-* response headers, and a
+sample of requests is aggregated per route for GET /api/debug/profile.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_KEPT = 5
+UNMATCHED_ROUTE = '<unmatched>'  # one key for every 404, so scanned URLs can't grow the stats
+
+_active = ContextVar('query_profile', default=None)
+
+
+class QueryProfile:
+    """Statements executed while this profile is active (also counted in parent)"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []  # (ms, statement), longest first
+
+    def record(self, statement, ms):
+        self.count += 1
+        self.total_ms += ms
+        if len(self.slowest) < SLOWEST_KEPT or ms > self.slowest[-1][0]:
+            self.slowest.append((ms, statement))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+        if self.parent is not None:
+            self.parent.record(statement, ms)
+
+    def to_dict(self):
+        return {
+            'queries': self.count,
+            'db_time_ms': round(self.total_ms, 2),
+            'slowest': [{'ms': round(ms, 2), 'statement': statement} for ms, statement in self.slowest]
+        }
+
+
+def current_profile():
+    """The QueryProfile of the running request (or capture block), if any"""
+    return _active.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    started = conn.info.get('query_started')
+    if profile is None or not started:
+        return
+    ms = (time.perf_counter() - started.pop()) * 1000
+    profile.record(statement, ms)
+    if ms >= profiler.slow_query_ms:
+        logger.warning('Slow query (%.1f ms)', ms, extra={'duration_ms': round(ms, 1), 'statement': statement})
+
+
+@contextmanager
+def capture_queries():
+    """
+    Profile the statements run inside the block
+
+    Yields:
+        QueryProfile
+    """
+    profile = QueryProfile(parent=_active.get())
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fail if the block issues more than limit statements, e.g.
+
+        with assert_max_queries(4):
+            client.get('/api/dashboard/overview', headers=headers)
+
+    Raises:
+        AssertionError: Listing the statements that were run
+    """
+    with capture_queries() as profile:
+        yield profile
+    if profile.count > limit:
+        statements = '\n'.join(statement for _, statement in profile.slowest)
+        raise AssertionError(f'{profile.count} queries issued, expected at most {limit}. Slowest:\n{statements}')
+
+
+class QueryProfiler:
+    def __init__(self, app=None):
+        self.app = None
+        self.slow_query_ms = 500
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._recent = deque(maxlen=100)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.headers = app.config.get('QUERY_PROFILE_HEADERS', False)
+        self.sample_rate = app.config.get('QUERY_PROFILE_SAMPLE_RATE', 0.1)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', 500)
+        app.extensions['query_profiler'] = self
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        request.environ['query_profile.token'] = _active.set(QueryProfile(parent=_active.get()))
+
+    def _after_request(self, response):
+        profile = _active.get()
+        if profile is None:
+            return response
+        if self.headers or self.app.debug:
+            response.headers['X-DB-Queries'] = str(profile.count)
+            response.headers['X-DB-Time-Ms'] = f'{profile.total_ms:.1f}'
+        if self.sample_rate and random.random() < self.sample_rate:
+            self._sample(request.method, request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE,
+                         response.status_code, profile)
+        return response
+
+    def _teardown_request(self, exc):
+        token = request.environ.pop('query_profile.token', None)
+        if token is not None:
+            _active.reset(token)
+
+    def _sample(self, method, route, status, profile):
+        key = f'{method} {route}'
+        with self._lock:
+            stats = self._routes.setdefault(key, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time_ms': 0.0, 'slowest': []
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile.count
+            stats['max_queries'] = max(stats['max_queries'], profile.count)
+            stats['db_time_ms'] += profile.total_ms
+            stats['slowest'] = sorted(stats['slowest'] + profile.slowest,
+                                      key=lambda entry: entry[0], reverse=True)[:SLOWEST_KEPT]
+            self._recent.append({'route': key, 'status': status, **profile.to_dict()})
+
+    def report(self, route=None):
+        """Sampled per-route totals, heaviest routes first, plus the latest samples"""
+        with self._lock:
+            routes = []
+            for key, stats in self._routes.items():
+                if route and route not in key:
+                    continue
+                routes.append({
+                    'route': key,
+                    'requests': stats['requests'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_time_ms': round(stats['db_time_ms'] / stats['requests'], 2),
+                    'slowest': [{'ms': round(ms, 2), 'statement': statement} for ms, statement in stats['slowest']]
+                })
+            recent = [sample for sample in self._recent if not route or route in sample['route']]
+        routes.sort(key=lambda entry: entry['avg_queries'], reverse=True)
+        return {'sample_rate': self.sample_rate, 'routes': routes, 'recent': recent}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._recent.clear()
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,123 @@
+"""
+Structured, non-blocking application logging
+Log records are handed to a QueueHandler and written as one JSON object per
+line by a QueueListener thread, so request threads never wait on stdout. Each
+request is summarised in a single `request` record (route, status, latency,
+DB queries and time from utils.query_profiler); fast successful requests are
+sampled with LOG_SAMPLE_RATE, while errors and requests slower than
+LOG_SLOW_REQUEST_MS are always logged.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from flask import g, request
+from utils.query_profiler import current_profile
+
+logger = logging.getLogger('request')
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra={...}` keys become top-level fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestLog:
+    def __init__(self, app=None):
+        self.app = None
+        self._handler = None
+        self._listener = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.sample_rate = app.config.get('LOG_SAMPLE_RATE', 1.0)
+        self.slow_ms = app.config.get('LOG_SLOW_REQUEST_MS', 1000)
+        app.extensions['request_log'] = self
+
+        root = logging.getLogger()
+        root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+        if self._handler is None:
+            self._handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+            root.handlers = [self._handler]
+            atexit.register(self.close)
+        self._start_listener()
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _start_listener(self):
+        # One writer thread per process; a forked worker replaces the inherited
+        # queue and starts its own
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self._handler.queue = queue.SimpleQueue()
+        self._pid = os.getpid()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        self._listener = logging.handlers.QueueListener(self._handler.queue, stream)
+        self._listener.start()
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+    def _before_request(self):
+        self._start_listener()
+        g.request_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        duration_ms = (time.perf_counter() - started) * 1000
+        status = response.status_code
+        profile = current_profile()
+        if status < 500 and duration_ms < self.slow_ms and random.random() >= self.sample_rate:
+            return response
+
+        logger.log(
+            logging.ERROR if status >= 500 else logging.WARNING if duration_ms >= self.slow_ms else logging.INFO,
+            '%s %s %s', request.method, request.path, status,
+            extra={
+                'method': request.method,
+                'route': request.url_rule.rule if request.url_rule else None,
+                'path': request.path,
+                'status': status,
+                'duration_ms': round(duration_ms, 1),
+                'db_queries': profile.count if profile else None,
+                'db_time_ms': round(profile.total_ms, 1) if profile else None,
+                'sampled': status < 500 and duration_ms < self.slow_ms
+            }
+        )
+        return response
+
+
+request_log = RequestLog()
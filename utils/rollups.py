@@ -0,0 +1,325 @@
+"""
+Daily rollup tables for the sales, lead and activity time-series charts
+A compactor pre-aggregates whole days (per employee, source, status, property
+type or activity type) and records how far it got in rollup_watermarks.
+Readers take compacted days from the rollup and GROUP BY only the rows written
+since, so a 12-24 month chart costs O(days) instead of O(rows). A write to an
+already compacted day marks just that day dirty (rollup_dirty_days): readers
+serve it from the source table until the next compaction recomputes it.
+
+Run `flask rollups compact` periodically (and `--full` to rebuild from scratch).
+"""
+
+import click
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, event, func, select, insert, delete, inspect, or_
+from flask import current_app
+from flask.cli import with_appcontext
+from database import db
+from models import (
+    Property, Lead, PostSale, Activity,
+    DailySalesRollup, DailyLeadRollup, DailyActivityRollup, RollupWatermark, RollupDirtyDay
+)
+
+
+class Rollup:
+    """
+    A rollup table and the source rows it aggregates
+
+    Args:
+        model: Rollup model; every rollup has a `day` column
+        timestamp: Source column whose date is the rollup day
+        dimensions (dict): Rollup column name -> source expression
+        measures (dict): Rollup column name -> aggregate over the source rows
+        joins (callable): Adds the source FROM clause to a select
+        watch (tuple): Source attributes (besides timestamp) whose change
+            alters an already compacted day
+        now (callable): Clock the source timestamps are written with
+    """
+
+    def __init__(self, model, timestamp, dimensions, measures, joins, watch=(), now=datetime.utcnow):
+        self.model = model
+        self.timestamp = timestamp
+        self.dimensions = dimensions
+        self.measures = measures
+        self.joins = joins
+        self.watch = watch
+        self.now = now
+
+    def source(self, columns, start_day=None, end_day=None):
+        """Select columns from the source rows written on [start_day, end_day]"""
+        stmt = self.joins(select(*columns))
+        if start_day is not None:
+            stmt = stmt.where(self.timestamp >= datetime.combine(start_day, time.min))
+        if end_day is not None:
+            stmt = stmt.where(self.timestamp < datetime.combine(end_day + timedelta(days=1), time.min))
+        return stmt
+
+    def on_days(self, days):
+        """Condition matching source rows written on any of days"""
+        return or_(*[
+            and_(self.timestamp >= datetime.combine(day, time.min),
+                 self.timestamp < datetime.combine(day + timedelta(days=1), time.min))
+            for day in sorted(days)
+        ])
+
+
+def _sales_from(stmt):
+    return stmt.select_from(PostSale).outerjoin(
+        Lead, PostSale.lead_id == Lead.id
+    ).outerjoin(
+        Property, PostSale.property_id == Property.id
+    )
+
+
+ROLLUPS = {
+    'sales': Rollup(
+        DailySalesRollup, PostSale.sale_date,
+        dimensions={'employee_id': Lead.assigned_employee_id, 'property_type': Property.property_type},
+        measures={'sales_count': func.count(PostSale.id), 'revenue': func.coalesce(func.sum(PostSale.sale_price), 0)},
+        joins=_sales_from,
+        watch=('sale_price', 'lead_id', 'property_id')
+    ),
+    'leads': Rollup(
+        DailyLeadRollup, Lead.created_at,
+        dimensions={'employee_id': Lead.assigned_employee_id, 'source': Lead.source, 'status': Lead.status},
+        measures={'lead_count': func.count(Lead.id)},
+        joins=lambda stmt: stmt.select_from(Lead),
+        # Status moves every time a lead progresses; re-opening old days for
+        # that would keep the chart on the raw table, so per-status counts are
+        # as of the last compaction (refreshed within the lookback window)
+        watch=('assigned_employee_id', 'source')
+    ),
+    'activities': Rollup(
+        DailyActivityRollup, Activity.created_at,
+        dimensions={'user_id': Activity.user_id, 'activity_type': Activity.activity_type},
+        measures={'activity_count': func.count(Activity.id)},
+        joins=lambda stmt: stmt.select_from(Activity),
+        now=datetime.now  # activities are stamped with local time
+    )
+}
+
+
+def _as_date(value):
+    # DATE() comes back as a string on SQLite
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _conditions(columns, filters):
+    return [columns[name] == value for name, value in filters.items()]
+
+
+def watermark(name):
+    """Last day compacted into rollup `name`, or None if it has never run"""
+    return db.session.query(RollupWatermark.through_day).filter(RollupWatermark.name == name).scalar()
+
+
+def dirty_days(name, start_day=None, end_day=None):
+    """Compacted days of rollup `name` written to since they were compacted"""
+    query = db.session.query(RollupDirtyDay.day).filter(RollupDirtyDay.name == name)
+    if start_day is not None:
+        query = query.filter(RollupDirtyDay.day >= start_day)
+    if end_day is not None:
+        query = query.filter(RollupDirtyDay.day <= end_day)
+    return {_as_date(day) for (day,) in query.distinct()}
+
+
+def daily_totals(name, start, end=None, **filters):
+    """
+    Per-day measure totals for a rollup
+
+    Args:
+        name (str): Key of ROLLUPS
+        start (datetime|date): First day of the window (the whole day is included)
+        end (datetime|date, optional): Last day of the window
+        **filters: Dimension equality filters, e.g. employee_id=5
+
+    Returns:
+        list: (day, {measure: value}) tuples ordered by day
+    """
+    spec = ROLLUPS[name]
+    start_day = _as_date(start)
+    end_day = _as_date(end) if end else None
+    through_day = watermark(name)
+    totals = {}
+
+    # Compacted days (dirty ones are read from the source table below)
+    if through_day and through_day >= start_day:
+        compacted_end = min(through_day, end_day) if end_day else through_day
+        dirty = dirty_days(name, start_day, compacted_end)
+        rollup_columns = {column: getattr(spec.model, column) for column in spec.dimensions}
+        stmt = select(
+            spec.model.day,
+            *[func.sum(getattr(spec.model, measure)).label(measure) for measure in spec.measures]
+        ).where(
+            spec.model.day >= start_day,
+            spec.model.day <= compacted_end,
+            *_conditions(rollup_columns, filters)
+        ).group_by(spec.model.day)
+        if dirty:
+            stmt = stmt.where(spec.model.day.notin_(dirty))
+        for row in db.session.execute(stmt):
+            totals[_as_date(row.day)] = {measure: row._mapping[measure] for measure in spec.measures}
+
+        if dirty:
+            day = func.date(spec.timestamp)
+            stmt = spec.source(
+                [day.label('day'), *[expression.label(measure) for measure, expression in spec.measures.items()]]
+            ).where(spec.on_days(dirty), *_conditions(spec.dimensions, filters)).group_by(day)
+            for row in db.session.execute(stmt):
+                totals[_as_date(row.day)] = {measure: row._mapping[measure] for measure in spec.measures}
+
+    # Days written since the last compaction
+    live_start = max(start_day, through_day + timedelta(days=1)) if through_day else start_day
+    if end_day is None or live_start <= end_day:
+        day = func.date(spec.timestamp)
+        stmt = spec.source(
+            [day.label('day'), *[expression.label(measure) for measure, expression in spec.measures.items()]],
+            live_start, end_day
+        ).where(*_conditions(spec.dimensions, filters)).group_by(day)
+        for row in db.session.execute(stmt):
+            totals[_as_date(row.day)] = {measure: row._mapping[measure] for measure in spec.measures}
+
+    return sorted(totals.items())
+
+
+def monthly_totals(name, start, end=None, **filters):
+    """
+    daily_totals bucketed by calendar month
+
+    Returns:
+        list: ((year, month), {measure: value}) tuples ordered by month
+    """
+    months = {}
+    for day, measures in daily_totals(name, start, end, **filters):
+        bucket = months.setdefault((day.year, day.month), dict.fromkeys(measures, 0))
+        for measure, value in measures.items():
+            bucket[measure] += value or 0
+    return sorted(months.items())
+
+
+def compact(names=None, full=False):
+    """
+    Aggregate source rows into the rollup tables up to and including yesterday
+
+    Days from the previous watermark (minus ROLLUP_LOOKBACK_DAYS, to absorb
+    late or bulk writes that bypass the ORM) and older days marked dirty are
+    deleted and recomputed with an INSERT ... SELECT ... GROUP BY each.
+
+    Args:
+        names (list, optional): Rollups to compact (default: all)
+        full (bool): Rebuild every day from scratch
+
+    Returns:
+        dict: name -> (first recomputed day or None for all, last day,
+        number of older dirty days recomputed)
+    """
+    lookback = timedelta(days=current_app.config.get('ROLLUP_LOOKBACK_DAYS', 3))
+    compacted = {}
+
+    for name in names or list(ROLLUPS):
+        spec = ROLLUPS[name]
+        through_day = spec.now().date() - timedelta(days=1)
+        mark = db.session.get(RollupWatermark, name)
+        from_day = None if full or mark is None else mark.through_day + timedelta(days=1) - lookback
+
+        # Markers written while this runs stay for the next compaction
+        last_marker = db.session.query(func.max(RollupDirtyDay.id)).filter(RollupDirtyDay.name == name).scalar()
+        dirty = dirty_days(name, end_day=from_day - timedelta(days=1)) if from_day else set()
+
+        clear = delete(spec.model)
+        if from_day:
+            clear = clear.where(or_(spec.model.day >= from_day, spec.model.day.in_(dirty)))
+        db.session.execute(clear)
+
+        day = func.date(spec.timestamp)
+        dimensions = list(spec.dimensions.values())
+        columns = [day, *dimensions, *spec.measures.values()]
+        recompute = [spec.source(columns, from_day, through_day)]
+        if dirty:
+            recompute.append(spec.source(columns).where(spec.on_days(dirty)))
+        for stmt in recompute:
+            db.session.execute(insert(spec.model).from_select(
+                ['day', *spec.dimensions, *spec.measures], stmt.group_by(day, *dimensions)
+            ))
+
+        if last_marker is not None:
+            db.session.execute(delete(RollupDirtyDay).where(
+                RollupDirtyDay.name == name, RollupDirtyDay.id <= last_marker
+            ))
+        if mark is None:
+            db.session.add(RollupWatermark(name=name, through_day=through_day))
+        else:
+            mark.through_day = through_day
+        db.session.commit()
+        compacted[name] = (from_day, through_day, len(dirty))
+
+    return compacted
+
+
+# Writes that land on already compacted days mark those days dirty (in the
+# write's transaction), so readers serve them from the source table until the
+# next compaction recomputes them
+def _reopen(connection, name, days):
+    days = {_as_date(day) for day in days if day is not None}
+    if not days:
+        return
+    through_day = connection.execute(
+        select(RollupWatermark.through_day).where(RollupWatermark.name == name)
+    ).scalar()
+    if through_day is None:
+        return
+    days = {day for day in days if day <= _as_date(through_day)}
+    if days:
+        marked = {_as_date(day) for day in connection.execute(
+            select(RollupDirtyDay.day).where(RollupDirtyDay.name == name, RollupDirtyDay.day.in_(days))
+        ).scalars()}
+        # Concurrent writers may both add a marker; readers and compact() treat them as a set
+        if days - marked:
+            connection.execute(insert(RollupDirtyDay), [
+                {'name': name, 'day': day, 'marked_at': datetime.utcnow()} for day in sorted(days - marked)
+            ])
+
+
+def _listeners(name, spec):
+    key = spec.timestamp.key
+
+    def after_insert_or_delete(mapper, connection, target):
+        _reopen(connection, name, [getattr(target, key)])
+
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        moved = state.attrs[key].history
+        if not moved.has_changes() and not any(state.attrs[attr].history.has_changes() for attr in spec.watch):
+            return
+        _reopen(connection, name, [getattr(target, key), *(moved.deleted or ())])
+
+    return after_insert_or_delete, after_update
+
+
+for _name, _spec in ROLLUPS.items():
+    _on_insert_or_delete, _on_update = _listeners(_name, _spec)
+    event.listen(_spec.timestamp.class_, 'after_insert', _on_insert_or_delete)
+    event.listen(_spec.timestamp.class_, 'after_delete', _on_insert_or_delete)
+    event.listen(_spec.timestamp.class_, 'after_update', _on_update)
+
+
+@click.group('rollups')
+def rollups_cli():
+    """Daily rollup table commands"""
+
+
+@rollups_cli.command('compact')
+@click.option('--rollup', 'names', multiple=True, type=click.Choice(list(ROLLUPS)),
+              help='Only compact this rollup (repeatable)')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of the recent ones')
+@with_appcontext
+def compact_command(names, full):
+    """Aggregate recent source rows into the daily rollup tables"""
+    for name, (from_day, through_day, dirty) in compact(list(names) or None, full).items():
+        click.echo(f"Compacted {name} from {from_day or 'the beginning'} through {through_day}"
+                   + (f" (and {dirty} older days written to since)" if dirty else ''))
@@ -0,0 +1,142 @@
+"""
+Minimal in-process scheduler for periodic maintenance jobs
+With SCHEDULER_ENABLED the jobs run on a daemon thread started by the first
+request; `flask scheduler run` runs them in a dedicated process instead. Only
+one process per host runs jobs at a time (an exclusive lock on a file in the
+instance folder), so several web workers don't all fire the same job.
+"""
+
+import logging
+import os
+import threading
+import time
+import click
+from flask.cli import with_appcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run in every process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A function called every `interval` seconds inside an app context"""
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run = time.monotonic() + interval
+        self.last_result = None
+
+
+class Scheduler:
+    def __init__(self, app=None):
+        self.app = None
+        self.jobs = {}
+        self._pid = None
+        self._lock_file = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['scheduler'] = self
+        if app.config.get('SCHEDULER_ENABLED'):
+            app.before_request(self._ensure_started)
+
+    def add_job(self, name, func, interval):
+        """
+        Register func to run every interval seconds
+
+        Args:
+            name (str): Unique job name (used by `flask scheduler run --job`)
+            func (callable): Called without arguments inside an app context
+            interval (int): Seconds between runs; 0 or less disables the job
+        """
+        if interval and interval > 0:
+            self.jobs[name] = Job(name, func, interval)
+
+    def run_job(self, job):
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                job.last_result = job.func()
+            logger.info('Job %s finished in %.2fs: %r', job.name, time.monotonic() - started, job.last_result)
+        except Exception:
+            logger.exception('Job %s failed', job.name)
+        job.next_run = time.monotonic() + job.interval
+
+    def _acquire(self):
+        """Take the per-host scheduler lock; False if another process holds it"""
+        if fcntl is None:
+            return True
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        self._lock_file = open(os.path.join(self.app.instance_path, 'scheduler.lock'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def run_forever(self):
+        while True:
+            job = min(self.jobs.values(), key=lambda job: job.next_run, default=None)
+            if job is None:
+                return
+            delay = job.next_run - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.run_job(job)
+
+    def _ensure_started(self):
+        # Started per process (after any fork) on the first request it serves
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        if self.jobs and self._acquire():
+            threading.Thread(target=self.run_forever, name='scheduler', daemon=True).start()
+
+
+scheduler = Scheduler()
+
+
+@click.group('scheduler')
+def scheduler_cli():
+    """Periodic maintenance jobs"""
+
+
+@scheduler_cli.command('list')
+@with_appcontext
+def list_command():
+    """Show the registered jobs"""
+    for job in scheduler.jobs.values():
+        click.echo(f'{job.name}: every {job.interval}s')
+
+
+@scheduler_cli.command('run')
+@click.option('--job', 'names', multiple=True, help='Only run this job (repeatable)')
+@click.option('--once', is_flag=True, help='Run the jobs once and exit instead of looping')
+@with_appcontext
+def run_command(names, once):
+    """Run the periodic jobs in the foreground"""
+    unknown = set(names) - set(scheduler.jobs)
+    if unknown:
+        raise click.BadParameter(f"Unknown job(s): {', '.join(sorted(unknown))}", param_hint='--job')
+    if names:
+        scheduler.jobs = {name: scheduler.jobs[name] for name in names}
+
+    if once:
+        for job in scheduler.jobs.values():
+            scheduler.run_job(job)
+            click.echo(f'{job.name}: {job.last_result!r}')
+        return
+
+    if not scheduler._acquire():
+        raise click.ClickException('Another process on this host is already running the scheduler')
+    click.echo(f"Running {', '.join(scheduler.jobs)}")
+    scheduler.run_forever()
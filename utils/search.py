@@ -0,0 +1,207 @@
+"""
+Pluggable text search for properties, leads and activities
+
+Backends (SEARCH_BACKEND):
+    like      - ILIKE '%term%' over the searchable columns (default, no index needed)
+    fulltext  - MySQL FULLTEXT (MATCH ... AGAINST in boolean mode) or SQLite FTS5,
+                picked from the database dialect; results are ranked by relevance
+                and every word is prefix-matched
+
+Run `flask search reindex` to create/rebuild the full-text indexes before
+switching SEARCH_BACKEND to 'fulltext'.
+"""
+
+import re
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text, Integer, Float, or_
+from database import db
+
+# Searchable columns per table; the full-text index covers exactly these
+SEARCH_INDEXES = {
+    'properties': ('title', 'location', 'description'),
+    'leads': ('name', 'email', 'notes'),
+    'activities': ('description',)
+}
+
+# Shortest word MySQL indexes with the default innodb_ft_min_token_size
+MYSQL_MIN_TOKEN_LENGTH = 3
+
+PHONE_PATTERN = re.compile(r'^[\d\s+()-]+$')
+
+
+def _tokens(term):
+    return [token for token in re.split(r'\W+', term) if token]
+
+
+def _backend():
+    if current_app.config.get('SEARCH_BACKEND', 'like') != 'fulltext':
+        return 'like'
+    dialect = db.engine.dialect.name
+    if dialect in ('mysql', 'sqlite'):
+        return dialect
+    return 'like'
+
+
+def _like_condition(model, term, columns):
+    pattern = f'%{term}%'
+    return or_(*[getattr(model, column).ilike(pattern) for column in columns])
+
+
+def _match_query(tokens):
+    """FTS5 query string: every token must match, as a prefix"""
+    return ' '.join('"{}"*'.format(token.replace('"', '')) for token in tokens)
+
+
+def _mysql_match(model, columns, tokens):
+    from sqlalchemy.dialects.mysql import match
+    against = ' '.join(f'+{token}*' for token in tokens)
+    return match(*[getattr(model, column) for column in columns], against=against).in_boolean_mode()
+
+
+def _prepare(model, term):
+    backend = _backend()
+    tokens = _tokens(term)
+    if backend == 'mysql':
+        tokens = [token for token in tokens if len(token) >= MYSQL_MIN_TOKEN_LENGTH]
+    if not tokens:
+        # Nothing the index can match on (e.g. only very short words)
+        backend = 'like'
+    return backend, SEARCH_INDEXES[model.__tablename__], tokens
+
+
+def apply_search(query, model, term, rank=True):
+    """
+    Restrict query to rows of model matching term
+
+    Args:
+        query: Query selecting (or joined to) model
+        model: Model class registered in SEARCH_INDEXES
+        term (str): Raw search input
+        rank (bool): Order results by relevance (full-text backends only);
+            pass False when the caller applies its own ordering
+    """
+    backend, columns, tokens = _prepare(model, term)
+
+    if backend == 'like':
+        return query.filter(_like_condition(model, term, columns))
+
+    if backend == 'mysql':
+        expression = _mysql_match(model, columns, tokens)
+        query = query.filter(expression)
+        if rank:
+            query = query.order_by(expression.desc())
+        return query
+
+    # SQLite FTS5: join the external-content index on rowid
+    table = model.__tablename__
+    matches = text(
+        f'SELECT rowid AS id, bm25({table}_fts) AS rank FROM {table}_fts WHERE {table}_fts MATCH :against'
+    ).bindparams(against=_match_query(tokens)).columns(id=Integer, rank=Float).subquery()
+    query = query.join(matches, matches.c.id == model.id)
+    if rank:
+        query = query.order_by(matches.c.rank)
+    return query
+
+
+def search_condition(model, term):
+    """
+    Boolean clause matching rows of model against term, for callers that
+    need to OR the search with other conditions (no ranking)
+    """
+    backend, columns, tokens = _prepare(model, term)
+
+    if backend == 'like':
+        return _like_condition(model, term, columns)
+    if backend == 'mysql':
+        return _mysql_match(model, columns, tokens)
+
+    table = model.__tablename__
+    return model.id.in_(
+        text(f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :against').bindparams(against=_match_query(tokens))
+    )
+
+
+def apply_lead_search(query, model, term):
+    """
+    Lead search: phone numbers use an indexable prefix match and text goes
+    through the full-text index; the like backend keeps the old behaviour
+    of matching name, email, phone and notes
+    """
+    if _backend() == 'like':
+        return query.filter(_like_condition(model, term, ('name', 'email', 'phone', 'notes')))
+    if PHONE_PATTERN.match(term.strip()):
+        return query.filter(model.phone.like(f'{term.strip()}%'))
+    return apply_search(query, model, term)
+
+
+def reindex(tables=None):
+    """
+    Create (if missing) and rebuild the full-text index for each table
+
+    Returns:
+        list: Names of the tables that were reindexed
+    """
+    dialect = db.engine.dialect.name
+    tables = tables or list(SEARCH_INDEXES)
+
+    with db.engine.begin() as connection:
+        for table in tables:
+            columns = SEARCH_INDEXES[table]
+            column_list = ', '.join(columns)
+
+            if dialect == 'mysql':
+                index_name = f'ft_{table}_search'
+                exists = connection.execute(text(
+                    'SELECT COUNT(*) FROM information_schema.statistics '
+                    'WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index'
+                ), {'table': table, 'index': index_name}).scalar()
+                if exists:
+                    connection.execute(text(f'OPTIMIZE TABLE {table}'))
+                else:
+                    connection.execute(text(f'ALTER TABLE {table} ADD FULLTEXT INDEX {index_name} ({column_list})'))
+
+            elif dialect == 'sqlite':
+                fts = f'{table}_fts'
+                new_values = ', '.join(f'new.{column}' for column in columns)
+                old_values = ', '.join(f'old.{column}' for column in columns)
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column_list}, "
+                    f"content='{table}', content_rowid='id', prefix='2 3')"
+                ))
+                # Keep the index in sync with writes, including Core bulk inserts
+                connection.execute(text(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+                    f'INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+                ))
+                connection.execute(text(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+                    f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+                ))
+                connection.execute(text(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN '
+                    f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+                    f'INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END'
+                ))
+                connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+            else:
+                raise RuntimeError(f'Full-text search is not supported on {dialect}')
+
+    return tables
+
+
+@click.group('search')
+def search_cli():
+    """Full-text search index commands"""
+
+
+@search_cli.command('reindex')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(list(SEARCH_INDEXES)),
+              help='Only reindex this table (repeatable)')
+@with_appcontext
+def reindex_command(tables):
+    """Create and rebuild the full-text search indexes"""
+    for table in reindex(list(tables) or None):
+        click.echo(f'Reindexed {table}')
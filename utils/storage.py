@@ -0,0 +1,441 @@
+"""
+Pluggable blob storage for uploaded images
+Keys are paths relative to the image root ("<sha256>.jpg", "card/<sha256>.webp").
+LocalStorage keeps them on disk and can hand serving off to nginx
+(X-Accel-Redirect) or Apache/lighttpd (X-Sendfile); S3Storage keeps them in an
+S3-compatible bucket (AWS, MinIO, R2, ...) and supports presigned direct
+uploads, so image bytes never pass through a Flask worker. Pick one with
+UPLOAD_STORAGE=local|s3. A key's content never changes (names are content
+hashes), so responses are cacheable forever and the key is a strong ETag.
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from flask import current_app, redirect, request, send_file
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for UPLOAD_STORAGE=s3
+    boto3 = None
+    ClientError = None
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024  # bytes kept in memory before spooling to disk
+
+
+def _umask():
+    # Read once at import: os.umask() can only be read by setting it, which
+    # would race with files created by other threads later on
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Mode of stored files, as open() would create them: mkstemp's 0600 would hide
+# them from an nginx/Apache worker serving them (x-accel/x-sendfile)
+FILE_MODE = 0o666 & ~_umask()
+
+SavedUpload = namedtuple('SavedUpload', 'filename sha256 size deduplicated')
+
+IMMUTABLE = 'public, max-age={}, immutable'
+
+
+def cache_max_age():
+    return current_app.config.get('UPLOAD_CACHE_MAX_AGE', 31536000)
+
+
+def etag_for(key):
+    """Strong ETag of a stored key ("<sha256>.jpg", "card/<sha256>.webp")"""
+    return key.replace('/', '-')
+
+
+def cache_forever(response):
+    """Mark a response for a stored key as cacheable for UPLOAD_CACHE_MAX_AGE, never revalidated"""
+    response.cache_control.public = True
+    response.cache_control.max_age = cache_max_age()
+    response.cache_control.immutable = True
+    return response
+
+
+class StagedFile:
+    """
+    Temporary file an upload is written to before it is stored
+
+    Content is hashed as it is written, so the final key (<sha256>.<ext>) is
+    known without reading the file again. Create one with Storage.stage().
+    """
+
+    def __init__(self, file, path=None):
+        self.file = file
+        self.path = path
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def close(self):
+        """Drop the staged content (a no-op once it has been stored)"""
+        self.file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def copy_hashing(source, destination=None):
+    """
+    Copy a stream in chunks while computing its SHA-256 (destination=None only hashes it)
+
+    Returns:
+        tuple: (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        if destination is not None:
+            destination.write(chunk)
+    return digest.hexdigest(), size
+
+
+class Storage:
+    """Interface shared by the storage backends"""
+
+    supports_presigned_uploads = False
+
+    def save(self, key, fileobj, content_type=None):
+        """Store the content of fileobj (read from its current position) under key"""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Seekable binary file object for key (the caller closes it)"""
+        raise NotImplementedError
+
+    def size(self, key):
+        """Size of key in bytes, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        return self.size(key) is not None
+
+    def delete(self, key):
+        """Remove key (missing keys are ignored)"""
+        raise NotImplementedError
+
+    def list(self):
+        """Keys at the top level of the image root (originals, not variants)"""
+        raise NotImplementedError
+
+    def send(self, key, mimetype=None):
+        """Flask response serving key"""
+        raise NotImplementedError
+
+    def presign_upload(self, key, content_type, size, sha256):
+        """
+        Presigned request a client can use to upload key directly
+
+        Returns:
+            dict: url, method and headers the client must send
+        """
+        raise NotImplementedError('Direct uploads need S3 storage')
+
+    def stage(self):
+        """StagedFile to write an upload into before store_staged()"""
+        return StagedFile(tempfile.SpooledTemporaryFile(SPOOL_SIZE))
+
+    def store_staged(self, staged, extension, content_type=None):
+        """
+        Store a staged upload under the SHA-256 of its content
+
+        Nothing is stored when a file with the same content exists already.
+
+        Returns:
+            SavedUpload
+        """
+        filename = f'{staged.sha256}.{extension}'
+        deduplicated = self.exists(filename)
+        if not deduplicated:
+            staged.file.seek(0)
+            self.save(filename, staged.file, content_type)
+        return SavedUpload(filename, staged.sha256, staged.size, deduplicated)
+
+    def save_hashed(self, stream, extension, content_type=None):
+        """
+        Store an upload under the SHA-256 of its content
+
+        The stream is hashed while it is staged and only stored when no file
+        with the same content exists yet.
+
+        Returns:
+            SavedUpload
+        """
+        with self.stage() as staged:
+            shutil.copyfileobj(stream, staged, CHUNK_SIZE)
+            return self.store_staged(staged, extension, content_type)
+
+
+class LocalStorage(Storage):
+    """
+    Files under a directory on local disk
+
+    Args:
+        root (str): Directory holding the keys
+        serve_mode (str, optional): 'x-accel' to answer with an
+            X-Accel-Redirect to accel_prefix + key for nginx to serve,
+            'x-sendfile' for an X-Sendfile header with the file path, or
+            None to stream the file from Flask
+        accel_prefix (str): nginx internal location mapped to root
+    """
+
+    def __init__(self, root, serve_mode=None, accel_prefix='/protected-uploads/'):
+        self.root = root
+        self.serve_mode = serve_mode
+        self.accel_prefix = accel_prefix
+
+    def path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+
+    def _staging_file(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.mkstemp(dir=directory, suffix='.part')
+
+    def _publish(self, temp_path, path):
+        os.chmod(temp_path, FILE_MODE)
+        # Readers never see a partly written file
+        os.replace(temp_path, path)
+
+    def save(self, key, fileobj, content_type=None):
+        path = self.path(key)
+        fd, temp_path = self._staging_file(os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as destination:
+                shutil.copyfileobj(fileobj, destination, CHUNK_SIZE)
+            self._publish(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def stage(self):
+        # Stage next to the destination so storing is a rename, not a second copy
+        fd, temp_path = self._staging_file(self.root)
+        return StagedFile(os.fdopen(fd, 'w+b'), temp_path)
+
+    def store_staged(self, staged, extension, content_type=None):
+        filename = f'{staged.sha256}.{extension}'
+        deduplicated = self.exists(filename)
+        if not deduplicated:
+            staged.file.close()
+            self._publish(staged.path, self.path(filename))
+        return SavedUpload(filename, staged.sha256, staged.size, deduplicated)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def size(self, key):
+        try:
+            path = self.path(key)
+        except ValueError:
+            return None
+        return os.path.getsize(path) if os.path.isfile(path) else None
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def list(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [entry.name for entry in os.scandir(self.root)
+                if entry.is_file() and not entry.name.endswith('.part')]
+
+    def send(self, key, mimetype=None):
+        path = self.path(key)
+        if self.serve_mode in ('x-accel', 'x-sendfile'):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(key)
+            # The web server sends the body (and handles Range); answer
+            # If-None-Match here so a revalidation never reaches it
+            response = current_app.response_class(mimetype=mimetype)
+            if self.serve_mode == 'x-accel':
+                response.headers['X-Accel-Redirect'] = self.accel_prefix + key
+            else:
+                response.headers['X-Sendfile'] = path
+            response.set_etag(etag_for(key))
+            return cache_forever(response).make_conditional(request)
+        # send_file answers If-None-Match with 304 and Range with 206
+        response = send_file(path, mimetype=mimetype, etag=etag_for(key), max_age=cache_max_age(),
+                             conditional=True)
+        return cache_forever(response)
+
+
+class S3Storage(Storage):
+    """
+    Objects in an S3-compatible bucket
+
+    Args:
+        bucket (str): Bucket name
+        prefix (str): Key prefix inside the bucket
+        client: boto3 S3 client (built from endpoint_url/region/credentials
+            when not given, e.g. to point at MinIO in development)
+        public_url (str, optional): Base URL the bucket prefix is publicly
+            served from (a CDN or public bucket); without it reads are
+            redirected to presigned GET URLs
+        expires_in (int): Lifetime of presigned URLs in seconds
+    """
+
+    supports_presigned_uploads = True
+
+    def __init__(self, bucket, prefix='', client=None, endpoint_url=None, region=None,
+                 access_key_id=None, secret_access_key=None, public_url=None, expires_in=900):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError('UPLOAD_STORAGE=s3 needs boto3 (pip install boto3)')
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip('/') + '/' if public_url else None
+        self.expires_in = expires_in
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def save(self, key, fileobj, content_type=None):
+        # Served straight from the bucket/CDN, so the object carries its own caching policy
+        extra = {'CacheControl': IMMUTABLE.format(cache_max_age())}
+        if content_type:
+            extra['ContentType'] = content_type
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(key), ExtraArgs=extra)
+
+    def open(self, key):
+        # Pillow and hashing need a seekable file; large objects spool to disk
+        spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        self.client.download_fileobj(self.bucket, self._key(key), spool)
+        spool.seek(0)
+        return spool
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self):
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix, Delimiter='/'):
+            keys.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+        return keys
+
+    def url(self, key):
+        if self.public_url:
+            return self.public_url + key
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._key(key)}, ExpiresIn=self.expires_in
+        )
+
+    def send(self, key, mimetype=None):
+        response = redirect(self.url(key))
+        if self.public_url:
+            return cache_forever(response)
+        # A presigned URL stops working when it expires: cache the redirect for less
+        response.cache_control.private = True
+        response.cache_control.max_age = max(self.expires_in - 60, 0)
+        return response
+
+    def presign_upload(self, key, content_type, size, sha256):
+        # The checksum is part of the signature: S3 rejects a body with any other content
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self.client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self._key(key),
+                'ContentType': content_type,
+                'ContentLength': size,
+                'ChecksumSHA256': checksum,
+                'CacheControl': IMMUTABLE.format(cache_max_age())
+            },
+            ExpiresIn=self.expires_in
+        )
+        return {
+            'url': url,
+            'method': 'PUT',
+            'headers': {
+                'Content-Type': content_type,
+                'Content-Length': str(size),
+                'x-amz-checksum-sha256': checksum,
+                'Cache-Control': IMMUTABLE.format(cache_max_age())
+            },
+            'expires_in': self.expires_in
+        }
+
+
+def create_storage(config, root_path):
+    """Build the backend selected by UPLOAD_STORAGE from app config"""
+    backend = config.get('UPLOAD_STORAGE', 'local')
+    if backend == 'local':
+        return LocalStorage(
+            config.get('UPLOAD_LOCAL_DIR') or os.path.join(root_path, 'uploads', 'images'),
+            serve_mode=config.get('UPLOAD_SERVE_MODE') or None,
+            accel_prefix=config.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+        )
+    if backend == 's3':
+        if not config.get('S3_BUCKET'):
+            raise RuntimeError('UPLOAD_STORAGE=s3 needs S3_BUCKET')
+        return S3Storage(
+            config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX', 'uploads/images/'),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key_id=config.get('S3_ACCESS_KEY_ID'),
+            secret_access_key=config.get('S3_SECRET_ACCESS_KEY'),
+            public_url=config.get('S3_PUBLIC_URL'),
+            expires_in=config.get('S3_PRESIGN_EXPIRES', 900)
+        )
+    raise RuntimeError(f'Unknown UPLOAD_STORAGE: {backend}')
+
+
+def init_storage(app):
+    app.extensions['storage'] = create_storage(app.config, app.root_path)
+
+
+def get_storage():
+    """The configured storage backend of the current app"""
+    return current_app.extensions['storage']
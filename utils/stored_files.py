@@ -0,0 +1,271 @@
+"""
+Reference-counted records of stored uploads
+Every stored image has a StoredFile row whose ref_count is the number of
+properties listing it in images or floor_plans, kept up to date by mapper
+events in the same transaction as the property write. `flask uploads gc`
+deletes files nobody references any more; `flask uploads recount` rebuilds
+the counts (and registers stored files this table doesn't know yet).
+"""
+
+import mimetypes
+from collections import Counter
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import Property, StoredFile
+from utils.images import delete_variants
+from utils.storage import copy_hashing, get_storage
+from utils.uploads import URL_PREFIX, save_upload
+
+REFERENCE_COLUMNS = ('images', 'floor_plans')
+
+
+def register_file(filename, sha256, size, content_type=None, created_by=None):
+    """
+    StoredFile row for a stored file, created if it doesn't exist yet
+
+    An existing row (a deduplicated upload) gets a new last_uploaded_at, so
+    gc's grace period starts over for the form that just received its URL.
+    The row is added to the session and committed with the caller's transaction.
+    """
+    stored = StoredFile.query.filter_by(filename=filename).first()
+    if stored is not None:
+        stored.last_uploaded_at = datetime.utcnow()
+    else:
+        try:
+            with db.session.begin_nested():
+                stored = StoredFile(
+                    filename=filename,
+                    sha256=sha256,
+                    size=size,
+                    content_type=content_type,
+                    ref_count=0,
+                    created_by=created_by
+                )
+                db.session.add(stored)
+        except IntegrityError:
+            # The same file was registered by a concurrent upload
+            stored = StoredFile.query.filter_by(filename=filename).one()
+            stored.last_uploaded_at = datetime.utcnow()
+    return stored
+
+
+def store_upload(stream, extension, content_type=None, created_by=None):
+    """
+    Save an upload (see utils.uploads.save_upload) and register it
+
+    Args:
+        stream: File-like object to read the upload from
+        extension (str): File extension to store it with (lower case)
+        content_type (str, optional): MIME type reported by the client
+        created_by (int, optional): ID of the uploading user
+
+    Returns:
+        tuple: (StoredFile, deduplicated) where deduplicated is True when the
+        same content was already stored
+    """
+    content_type = content_type or mimetypes.guess_type(f'upload.{extension}')[0]
+    saved = save_upload(stream, extension, content_type)
+    stored = register_file(saved.filename, saved.sha256, saved.size, content_type, created_by)
+    return stored, saved.deduplicated
+
+
+def referenced_files(values):
+    """
+    Stored file names referenced by image URL lists
+
+    Args:
+        values (iterable): Lists of URLs (e.g. a property's images and floor_plans)
+
+    Returns:
+        set: File names under uploads/images ("<sha256>.<ext>")
+    """
+    names = set()
+    for urls in values:
+        for url in urls or []:
+            if isinstance(url, str) and url.startswith(URL_PREFIX):
+                name = url[len(URL_PREFIX):]
+                if name and '/' not in name:
+                    names.add(name)
+    return names
+
+
+def adjust_references(connection, counts):
+    """
+    Add to the ref_count of stored files
+
+    Args:
+        connection: Connection (or session) to run the UPDATEs on
+        counts (dict): File name -> amount to add (negative to release)
+    """
+    by_amount = {}
+    for name, amount in counts.items():
+        if amount:
+            by_amount.setdefault(amount, []).append(name)
+    table = StoredFile.__table__
+    for amount, names in by_amount.items():
+        connection.execute(
+            update(table).where(table.c.filename.in_(sorted(names))).values(ref_count=table.c.ref_count + amount)
+        )
+
+
+def count_references(rows):
+    """Counter of file name -> number of rows (property value dicts) referencing it"""
+    counts = Counter()
+    for row in rows:
+        counts.update(referenced_files(row.get(column) for column in REFERENCE_COLUMNS))
+    return counts
+
+
+# Keep ref_count in step with property writes (in the flush's transaction)
+def _stored_references(connection, property_id):
+    row = connection.execute(
+        select(*[Property.__table__.c[column] for column in REFERENCE_COLUMNS])
+        .where(Property.__table__.c.id == property_id)
+    ).first()
+    return dict(zip(REFERENCE_COLUMNS, row)) if row else {}
+
+
+def _after_insert(mapper, connection, target):
+    names = referenced_files(getattr(target, column) for column in REFERENCE_COLUMNS)
+    adjust_references(connection, dict.fromkeys(names, 1))
+
+
+def _before_update(mapper, connection, target):
+    state = inspect(target)
+    changed = [column for column in REFERENCE_COLUMNS if state.attrs[column].history.has_changes()]
+    if not changed:
+        return
+    # Compare with the row as stored (the old value may never have been loaded)
+    stored = _stored_references(connection, target.id)
+    old = referenced_files(stored.values())
+    new = referenced_files(getattr(target, column) if column in changed else stored.get(column)
+                           for column in REFERENCE_COLUMNS)
+    counts = dict.fromkeys(new - old, 1)
+    counts.update(dict.fromkeys(old - new, -1))
+    adjust_references(connection, counts)
+
+
+def _before_delete(mapper, connection, target):
+    names = referenced_files(_stored_references(connection, target.id).values())
+    adjust_references(connection, dict.fromkeys(names, -1))
+
+
+event.listen(Property, 'after_insert', _after_insert)
+event.listen(Property, 'before_update', _before_update)
+event.listen(Property, 'before_delete', _before_delete)
+
+
+def _scan_references():
+    """Counter of file name -> properties referencing it, read from the properties table"""
+    counts = Counter()
+    query = db.session.query(*[getattr(Property, column) for column in REFERENCE_COLUMNS])
+    for values in query.yield_per(1000):
+        counts.update(referenced_files(values))
+    return counts
+
+
+def _correct_counts(references):
+    """Set every ref_count to the references counted from the properties table; returns how many changed"""
+    corrected = 0
+    for stored in StoredFile.query.yield_per(1000):
+        count = references.get(stored.filename, 0)
+        if stored.ref_count != count:
+            stored.ref_count = count
+            corrected += 1
+    return corrected
+
+
+def recount():
+    """
+    Register unrecorded files in storage and recompute every ref_count
+
+    Returns:
+        dict: Files registered and counts corrected
+    """
+    storage = get_storage()
+    known = {name for (name,) in db.session.query(StoredFile.filename)}
+    registered = 0
+    for key in storage.list():
+        if key in known:
+            continue
+        with storage.open(key) as stored_file:
+            sha256, size = copy_hashing(stored_file)
+        db.session.add(StoredFile(
+            filename=key,
+            sha256=sha256,
+            size=size,
+            content_type=mimetypes.guess_type(key)[0],
+            ref_count=0
+        ))
+        registered += 1
+    db.session.flush()
+
+    corrected = _correct_counts(_scan_references())
+    db.session.commit()
+    return {'registered': registered, 'corrected': corrected}
+
+
+def collect_garbage(grace_hours=None, dry_run=False):
+    """
+    Delete stored files (and their variants) that no property references
+
+    Files uploaded (or re-uploaded) less than grace_hours ago are kept: they
+    may belong to a property form that hasn't been saved yet. Every ref_count is first recomputed from
+    the properties table, so a drifted count neither deletes a file in use
+    nor keeps an unused one forever.
+
+    Returns:
+        dict: Files deleted, bytes freed and reference counts corrected
+    """
+    if grace_hours is None:
+        grace_hours = current_app.config.get('UPLOAD_GC_GRACE_HOURS', 24)
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    corrected = _correct_counts(_scan_references())
+    db.session.flush()
+    candidates = StoredFile.query.filter(StoredFile.ref_count <= 0, StoredFile.last_uploaded_at < cutoff).all()
+
+    storage = get_storage()
+    deleted = []
+    for stored in candidates:
+        deleted.append(stored)
+        if not dry_run:
+            storage.delete(stored.filename)
+            delete_variants(stored.filename)
+            db.session.delete(stored)
+
+    freed = sum(stored.size for stored in deleted)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return {'deleted': len(deleted), 'bytes': freed, 'corrected': corrected}
+
+
+@click.group('uploads')
+def uploads_cli():
+    """Stored upload maintenance"""
+
+
+@uploads_cli.command('recount')
+@with_appcontext
+def recount_command():
+    """Register unrecorded files and recompute reference counts"""
+    result = recount()
+    click.echo(f"Registered {result['registered']} files, corrected {result['corrected']} reference counts")
+
+
+@uploads_cli.command('gc')
+@click.option('--grace-hours', type=int, help='Keep unreferenced files younger than this (default: UPLOAD_GC_GRACE_HOURS)')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+@with_appcontext
+def gc_command(grace_hours, dry_run):
+    """Delete uploaded files no property references"""
+    result = collect_garbage(grace_hours, dry_run)
+    verb = 'Would delete' if dry_run else 'Deleted'
+    click.echo(f"{verb} {result['deleted']} files ({result['bytes']} bytes), "
+               f"corrected {result['corrected']} reference counts")
@@ -0,0 +1,108 @@
+"""
+Streaming multi-file uploads
+The multipart body is parsed as it arrives and each file is written chunk by
+chunk to a staging file of the storage backend, instead of Werkzeug buffering
+the whole form first. Finished files are checked (size, image verification)
+and stored in a thread pool while the next one is still being received.
+"""
+
+import logging
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask import current_app
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+from utils.images import image_error
+from utils.storage import CHUNK_SIZE
+from utils.uploads import ALLOWED_EXTENSIONS, MAX_UPLOAD_SIZE, RASTER_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# saved is a SavedUpload for stored files; error explains why a file was rejected
+ReceivedFile = namedtuple('ReceivedFile', 'filename content_type saved error')
+
+FIELD_MEMORY_SIZE = 500 * 1024  # most unparsed data buffered at once (Werkzeug's default)
+
+
+def _rejected(filename, error):
+    future = Future()
+    future.set_result(ReceivedFile(filename, None, None, error))
+    return future
+
+
+def _finish(app, storage, staged, filename, extension, content_type):
+    """Check a received file and store it (runs in the thread pool)"""
+    with staged:
+        if staged.size == 0:
+            return ReceivedFile(filename, content_type, None, 'File is empty')
+        if extension in RASTER_EXTENSIONS:
+            error = image_error(staged.file)
+            if error:
+                return ReceivedFile(filename, content_type, None, error)
+        try:
+            with app.app_context():
+                saved = storage.store_staged(staged, extension, content_type)
+        except Exception:
+            logger.exception('Storing upload %s failed', filename)
+            return ReceivedFile(filename, content_type, None, 'File could not be stored')
+        return ReceivedFile(filename, content_type, saved, None)
+
+
+def receive_files(stream, boundary, storage, field='files', max_files=None, workers=4):
+    """
+    Receive the files of a multipart/form-data body and store them
+
+    Args:
+        stream: The request body (request.stream)
+        boundary (str): Multipart boundary from the Content-Type header
+        storage: Storage backend to stage and store the files in
+        field (str): Form field holding the files (other parts are ignored)
+        max_files (int, optional): Most parts accepted in one body
+        workers (int): Threads checking and storing finished files
+
+    Returns:
+        list: ReceivedFile per file part, in upload order
+
+    Raises:
+        ValueError: If the body is not valid multipart data
+        RequestEntityTooLarge: If it has more than max_files parts
+    """
+    app = current_app._get_current_object()
+    decoder = MultipartDecoder(boundary.encode(), FIELD_MEMORY_SIZE, max_parts=max_files)
+    results = []
+    staged = part = None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload') as pool:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+                event = decoder.next_event()
+                while not isinstance(event, (Epilogue, NeedData)):
+                    if isinstance(event, File):
+                        part = None
+                        if event.name == field and event.filename:
+                            filename = event.filename
+                            extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+                            if extension in ALLOWED_EXTENSIONS:
+                                staged = storage.stage()
+                                part = (filename, extension, event.headers.get('content-type'))
+                            else:
+                                results.append(_rejected(filename, 'File type not allowed'))
+                    elif isinstance(event, Data) and part is not None:
+                        if staged is not None and staged.size + len(event.data) > MAX_UPLOAD_SIZE:
+                            # Drop what was received and skip the rest of the part
+                            staged.close()
+                            staged = None
+                            results.append(_rejected(part[0], 'File too large. Maximum size is 10MB'))
+                        elif staged is not None:
+                            staged.write(event.data)
+                        if not event.more_data:
+                            if staged is not None:
+                                results.append(pool.submit(_finish, app, storage, staged, *part))
+                            staged = part = None
+                    event = decoder.next_event()
+                if not chunk or isinstance(event, Epilogue):
+                    break
+        finally:
+            if staged is not None:
+                staged.close()
+    return [future.result() for future in results]
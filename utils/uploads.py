@@ -0,0 +1,75 @@
+"""
+Image upload naming
+Uploads are hashed (SHA-256) while they are streamed to storage and stored as
+<hash>.<ext>, so a stored file's name identifies its content, identical
+uploads share one file, and its URL (and the URLs of its variants) never
+point at anything else. Backends live in utils/storage.py, variants are
+rendered by utils/images.py and reference counts are kept by
+utils/stored_files.py.
+"""
+
+from utils.storage import get_storage
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'svg'}
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+URL_PREFIX = '/uploads/images/'
+
+# size name -> longest edge in pixels (smaller originals are not enlarged)
+SIZES = {'thumb': 320, 'card': 800, 'full': 1920}
+RASTER_EXTENSIONS = ('jpg', 'jpeg', 'png', 'webp', 'gif')
+
+
+def variant_url(url, size, fmt='webp'):
+    """
+    URL of a variant of an uploaded image
+
+    Args:
+        url (str): Image URL as stored on a property ("/uploads/images/<name>")
+        size (str): thumb, card or full
+        fmt (str): webp or jpg
+
+    Returns:
+        str: The variant URL, or url itself for external and SVG images
+    """
+    if not url or not url.startswith(URL_PREFIX):
+        return url
+    name = url[len(URL_PREFIX):]
+    if '/' in name or '.' not in name:
+        return url
+    stem, extension = name.rsplit('.', 1)
+    if extension.lower() not in RASTER_EXTENSIONS:
+        return url
+    return f'{URL_PREFIX}{size}/{stem}.{fmt}'
+
+
+def image_variants(url):
+    """{size: WebP variant URL} for one image URL"""
+    return {size: variant_url(url, size) for size in SIZES}
+
+
+def cover_image(images):
+    """Variant URLs of a property's first image (None without images)"""
+    return image_variants(images[0]) if images else None
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def save_upload(stream, extension, content_type=None):
+    """
+    Store an upload under the SHA-256 of its content
+
+    The upload is hashed while it is copied; if a file with the same content
+    is already stored, the copy is dropped and the existing file is reused.
+
+    Args:
+        stream: File-like object to read the upload from
+        extension (str): File extension to store it with (lower case)
+        content_type (str, optional): MIME type to store it with
+
+    Returns:
+        SavedUpload: filename ("<sha256>.<extension>"), sha256, size, and
+        whether an identical file was already stored (deduplicated)
+    """
+    return get_storage().save_hashed(stream, extension, content_type)
@@ -0,0 +1,89 @@
+"""
+Per-process cache of the authenticated user
+Handlers mostly load the current user only to check its role, so a read-only
+snapshot is kept for USER_CACHE_TTL seconds and dropped as soon as a write to
+that user commits in this process (other processes catch up within the TTL)
+"""
+
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from models import User
+from utils.metrics import cache_requests
+
+CachedUser = namedtuple('CachedUser', 'id email first_name last_name role permissions is_active')
+
+_lock = threading.Lock()
+_users = {}  # user id -> (expires_at, CachedUser or None)
+
+
+def invalidate_user(user_id=None):
+    """Forget one cached user, or all of them when user_id is None"""
+    with _lock:
+        if user_id is None:
+            _users.clear()
+        else:
+            _users.pop(user_id, None)
+
+
+def get_user(user_id):
+    """
+    Read-only snapshot of a user, cached for USER_CACHE_TTL seconds
+
+    Args:
+        user_id (int): User ID
+
+    Returns:
+        CachedUser: Snapshot (None if the user does not exist)
+
+    Use User.query.get() instead when the user is going to be modified or
+    attached to another object.
+    """
+    now = time.monotonic()
+    cached = _users.get(user_id)
+    if cached and cached[0] > now:
+        cache_requests.inc(cache='user', result='hit')
+        return cached[1]
+    cache_requests.inc(cache='user', result='miss')
+
+    row = db.session.query(
+        User.id, User.email, User.first_name, User.last_name, User.role, User.permissions, User.is_active
+    ).filter(User.id == user_id).first()
+    user = CachedUser(*row) if row else None
+
+    ttl = current_app.config.get('USER_CACHE_TTL', 60)
+    if ttl > 0:
+        with _lock:
+            _users[user_id] = (now + ttl, user)
+    return user
+
+
+def get_current_user():
+    """Snapshot of the user identified by the request's JWT"""
+    return get_user(int(get_jwt_identity()))
+
+
+# Drop a cached user once an insert, update or delete of that user commits
+def _mark_dirty(mapper, connection, target):
+    Session.object_session(target).info.setdefault('dirty_user_ids', set()).add(target.id)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop('dirty_user_ids', ()):
+        invalidate_user(user_id)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('dirty_user_ids', None)
+
+
+event.listen(User, 'after_insert', _mark_dirty)
+event.listen(User, 'after_update', _mark_dirty)
+event.listen(User, 'after_delete', _mark_dirty)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_soft_rollback', _after_soft_rollback)